@@ -0,0 +1,411 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+from collections import namedtuple
+
+import numpy as np
+
+# Stand-ins for MediaPipe landmark and gesture category objects
+Landmark = namedtuple("Landmark", ["x", "y", "z"])
+Category = namedtuple("Category", ["category_name", "score"])
+
+# Normalized landmarks of an open hand, used as base for synthetic landmark sets
+HAND_SHAPE = np.array([
+  [0.50, 0.80], [0.42, 0.74], [0.37, 0.66], [0.34, 0.59], [0.31, 0.53],
+  [0.44, 0.58], [0.42, 0.48], [0.41, 0.42], [0.40, 0.37],
+  [0.50, 0.57], [0.50, 0.46], [0.50, 0.39], [0.50, 0.33],
+  [0.56, 0.58], [0.57, 0.48], [0.58, 0.42], [0.58, 0.37],
+  [0.61, 0.61], [0.64, 0.53], [0.66, 0.48], [0.67, 0.44]
+])
+
+# Path for benchmark results
+dirname = os.path.dirname(__file__)
+results_path = os.path.join(dirname, "./benchmarks")
+
+def peak_rss_mb() -> float:
+  # Peak resident set size of this process in MiB
+  if sys.platform == "win32":
+    import ctypes
+    from ctypes import wintypes
+
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+      _fields_ = [
+        ("cb", wintypes.DWORD),
+        ("PageFaultCount", wintypes.DWORD),
+        ("PeakWorkingSetSize", ctypes.c_size_t),
+        ("WorkingSetSize", ctypes.c_size_t),
+        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+        ("QuotaPagedPoolUsage", ctypes.c_size_t),
+        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+        ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+        ("PagefileUsage", ctypes.c_size_t),
+        ("PeakPagefileUsage", ctypes.c_size_t)
+      ]
+
+    counters = PROCESS_MEMORY_COUNTERS()
+    counters.cb = ctypes.sizeof(counters)
+    handle = ctypes.windll.kernel32.GetCurrentProcess()
+    ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb)
+
+    return counters.PeakWorkingSetSize / 2**20
+
+  import resource
+  peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+  # Linux reports KiB, macOS reports bytes
+  if sys.platform == "darwin":
+    return peak / 2**20
+
+  return peak / 2**10
+
+def git_revision() -> str:
+  try:
+    return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=dirname, stderr=subprocess.DEVNULL, text=True).strip()
+  except (OSError, subprocess.CalledProcessError):
+    return "unknown"
+
+def summarize(latencies) -> dict:
+  latencies = np.asarray(latencies) * 1000
+
+  return {
+    "frames": int(latencies.size),
+    "fps": float(1000 * latencies.size / latencies.sum()) if latencies.sum() > 0 else None,
+    "mean_ms": float(latencies.mean()),
+    "p50_ms": float(np.percentile(latencies, 50)),
+    "p95_ms": float(np.percentile(latencies, 95)),
+    "p99_ms": float(np.percentile(latencies, 99))
+  }
+
+def time_stage(function, inputs):
+  # Latency of every call in seconds
+  latencies = np.empty(len(inputs))
+
+  for i, args in enumerate(inputs):
+    start = time.perf_counter()
+    function(*args)
+    latencies[i] = time.perf_counter() - start
+
+  return latencies
+
+def load_frames(source, frames: int, frame_width: int, frame_height: int):
+  # Read the recorded frames as fast as possible, timing the capture stage
+  if source is None:
+    rng = np.random.default_rng(0)
+    frames_0 = [rng.integers(0, 256, (frame_height, frame_width, 3), dtype=np.uint8) for _ in range(frames)]
+    frames_1 = [rng.integers(0, 256, (frame_height, frame_width, 3), dtype=np.uint8) for _ in range(frames)]
+
+    return frames_0, frames_1, None
+
+  from utils.frame_source import create_frame_source
+
+  capture = create_frame_source(source, realtime=False)
+  capture.start()
+
+  frames_0 = []
+  frames_1 = []
+  latencies = []
+
+  while len(frames_0) < frames:
+    start = time.perf_counter()
+    ret, frame_0, frame_1 = capture.read()
+    latency = time.perf_counter() - start
+
+    if not ret:
+      break
+
+    frames_0.append(frame_0)
+    frames_1.append(frame_1)
+    latencies.append(latency)
+
+  capture.release()
+
+  return frames_0, frames_1, latencies
+
+def synthetic_landmarks(frames: int):
+  # Slowly moving hand seen by both cameras, with a small amount of noise
+  rng = np.random.default_rng(1)
+  landmarks_0 = []
+  landmarks_1 = []
+
+  for i in range(frames):
+    offset = 0.05 * np.array([np.sin(i / 30), np.cos(i / 45)])
+    points_0 = HAND_SHAPE + offset + rng.normal(0, 0.002, HAND_SHAPE.shape)
+    points_1 = points_0 - [0.08, 0.0]
+
+    landmarks_0.append([Landmark(x, y, 0.0) for x, y in points_0])
+    landmarks_1.append([Landmark(x, y, 0.0) for x, y in points_1])
+
+  return landmarks_0, landmarks_1
+
+def synthetic_triangulator(frame_width: int, frame_height: int):
+  from utils.dlt import Triangulator
+  from utils.calibration import Calibration, build_calibration
+
+  # Two pinhole cameras 10 units apart looking the same way
+  K = np.array([[frame_width, 0, frame_width / 2], [0, frame_width, frame_height / 2], [0, 0, 1]])
+  R = [np.eye(3), np.eye(3)]
+  T = [np.zeros((3, 1)), np.array([[-10.0], [0.0], [0.0]])]
+
+  # A full calibration, so hand association and lens correction run as they do in hand tracking
+  calibration = Calibration(build_calibration([K, K], [np.zeros(5), np.zeros(5)], R, T, (frame_width, frame_height)))
+
+  return Triangulator(calibration.P, calibration, rectified=True)
+
+def create_recognizer():
+  # MediaPipe and the model are optional for the benchmark
+  try:
+    import mediapipe as mp
+  except ImportError:
+    return None, "mediapipe is not installed"
+
+  model_path = os.path.join(dirname, "./models/gesture_recognizer.task")
+  if not os.path.exists(model_path):
+    return None, "gesture recognizer model not found"
+
+  from utils.config import get_config
+  config = get_config()
+
+  options = mp.tasks.vision.GestureRecognizerOptions(
+    base_options = mp.tasks.BaseOptions(model_asset_path = model_path),
+    running_mode = mp.tasks.vision.RunningMode.VIDEO,
+    num_hands = 1,
+    min_hand_detection_confidence = config["MIN_HAND_DETECTION_CONFIDENCE"],
+    min_hand_presence_confidence = config["MIN_HAND_PRESENCE_CONFIDENCE"],
+    min_tracking_confidence = config["MIN_TRACKING_CONFIDENCE"]
+  )
+
+  return mp.tasks.vision.GestureRecognizer.create_from_options(options), None
+
+def benchmark(source=None, frames: int = 300, ik: bool = False) -> dict:
+  from utils.dlt import load_triangulator
+  from utils.draw_landmarks import draw_landmarks
+  from utils.write_gesture import write_gesture
+  from utils.hand_orientation import hand_orientation
+  from utils.landmarks_to_points import landmarks_to_points
+  from utils.config import get_config
+  from utils.hand_association import HandTracks
+  from hand_tracking import hand_poses
+
+  # Load settings
+  FRAME_WIDTH, FRAME_HEIGHT = get_config().frame_size()
+
+  stages = {}
+  skipped = {}
+
+  # Capture
+  frames_0, frames_1, capture_latencies = load_frames(source, frames, FRAME_WIDTH, FRAME_HEIGHT)
+  if len(frames_0) == 0:
+    print("Could not read any frame from source")
+    return
+
+  if capture_latencies is not None:
+    stages["capture"] = summarize(capture_latencies)
+  else:
+    skipped["capture"] = "no recorded source given, using synthetic frames"
+
+  frames = len(frames_0)
+  frame_height, frame_width = frames_0[0].shape[:2]
+
+  landmarks_0, landmarks_1 = synthetic_landmarks(frames)
+  gesture = [Category("Open_Palm", 0.9)]
+
+  # Triangulation uses the calibrated rig when it can be loaded
+  triangulator = load_triangulator()
+  if triangulator is None:
+    triangulator = synthetic_triangulator(frame_width, frame_height)
+
+  # MediaPipe
+  recognizer, reason = create_recognizer()
+  if recognizer is not None:
+    import mediapipe as mp
+
+    stages["mp_image"] = summarize(time_stage(lambda frame: mp.Image(image_format = mp.ImageFormat.SRGB, data = frame), [(frame,) for frame in frames_0]))
+
+    images = [mp.Image(image_format = mp.ImageFormat.SRGB, data = frame) for frame in frames_0]
+    stages["recognize"] = summarize(time_stage(recognizer.recognize_for_video, [(image, i + 1) for i, image in enumerate(images)]))
+
+    recognizer.close()
+  else:
+    skipped["mp_image"] = reason
+    skipped["recognize"] = reason
+
+  # Rendering works on copies so every frame is drawn from scratch
+  copies = [(frame.copy(), frame_width, frame_height, landmarks) for frame, landmarks in zip(frames_0, landmarks_0)]
+  stages["draw_landmarks"] = summarize(time_stage(draw_landmarks, copies))
+  stages["write_gesture"] = summarize(time_stage(write_gesture, [(frame.copy(), gesture) for frame in frames_0]))
+
+  # Triangulation of all landmarks and the center of the hand
+  points = [(landmarks_to_points(landmarks_0[i], frame_width, frame_height), landmarks_to_points(landmarks_1[i], frame_width, frame_height)) for i in range(frames)]
+  stages["triangulate"] = summarize(time_stage(triangulator.triangulate, points))
+
+  coords = [triangulator.triangulate(points_0, points_1) for points_0, points_1 in points]
+
+  # Pose of every hand as hand tracking computes it, with association across cameras and lens correction
+  hands = [[[landmarks_0[i]], [landmarks_1[i]]] for i in range(frames)]
+  stages["hand_poses"] = summarize(time_stage(hand_poses, [(hands[i], frame_width, frame_height, triangulator) for i in range(frames)]))
+  stages["hand_orientation"] = summarize(time_stage(hand_orientation, [(c[0, [2, 1]], c[9, [2, 1]]) for c in coords]))
+
+  # Solving joint angles is pure, so it is always measured
+  from utils.inverse_kinematics import solve_inverse_kinematics
+  stages["ik_solve"] = summarize(time_stage(solve_inverse_kinematics, [(c[21], [0.0, 0.0, 0.0]) for c in coords]))
+
+  # Recording only queues references on the tracking thread, the writer thread does the rest
+  import tempfile
+  from utils.recorder import SessionRecorder
+  from utils.result_store import RecognitionResult
+
+  results = [(RecognitionResult(i, 0.0, 0.0, [landmarks_0[i]], [gesture]), RecognitionResult(i, 0.0, 0.0, [landmarks_1[i]], [gesture])) for i in range(frames)]
+  with tempfile.TemporaryDirectory() as directory:
+    recorder = SessionRecorder(directory, segment_records=frames)
+    recorder.start()
+    stages["record"] = summarize(time_stage(recorder.append, [(i / 30, results[i], (c[None, 21], np.zeros((1, 3)), c[None, :21]), [0], np.zeros(6)) for i, c in enumerate(coords)]))
+    recorder.stop()
+
+  # Inverse kinematics talks to CoppeliaSim, only run it when asked to
+  inverse_kinematics = None
+  if ik:
+    from utils.inverse_kinematics import inverse_kinematics, stop_joint_sender
+    from utils.simulator import get_simulator
+
+    # Commands are sent from a background thread, this only times computing and queueing them
+    stages["inverse_kinematics"] = summarize(time_stage(inverse_kinematics, [(c[21], [0.0, 0.0, 0.0]) for c in coords]))
+
+    # Batched round-trip to the simulator, timed on its own once the sender thread is done with the connection
+    stop_joint_sender()
+    stages["joint_command"] = summarize(time_stage(get_simulator().set_joint_targets, [(np.full(6, i * 1e-3),) for i in range(frames)]))
+  else:
+    skipped["inverse_kinematics"] = "disabled, pass --ik to include CoppeliaSim round-trips"
+    skipped["joint_command"] = "disabled, pass --ik to include CoppeliaSim round-trips"
+
+  # End to end over the same inputs, one frame pair at a time
+  def process_frame(i):
+    frame_0 = frames_0[i].copy()
+    frame_1 = frames_1[i].copy()
+
+    if recognizer is not None:
+      recognizer_e2e.recognize_for_video(mp.Image(image_format = mp.ImageFormat.SRGB, data = frame_0), i + 1)
+      recognizer_e2e_1.recognize_for_video(mp.Image(image_format = mp.ImageFormat.SRGB, data = frame_1), i + 1)
+
+    draw_landmarks(frame_0, frame_width, frame_height, landmarks_0[i])
+    write_gesture(frame_0, gesture)
+    draw_landmarks(frame_1, frame_width, frame_height, landmarks_1[i])
+    write_gesture(frame_1, gesture)
+
+    # Same steps as the tracking loop, frames are 1/30 s apart
+    hands_coords, hands_rotation, _, _ = hand_poses(hands[i], frame_width, frame_height, triangulator)
+    hand_ids = tracks.update(hands_coords, i / 30)
+
+    if inverse_kinematics is not None and len(hand_ids) > 0:
+      inverse_kinematics(hands_coords[0], list(hands_rotation[0]))
+
+  # Persistent hand ids across the frames of the end to end run
+  tracks = HandTracks()
+
+  if recognizer is not None:
+    recognizer_e2e, _ = create_recognizer()
+    recognizer_e2e_1, _ = create_recognizer()
+
+  end_to_end = summarize(time_stage(process_frame, [(i,) for i in range(frames)]))
+
+  if recognizer is not None:
+    recognizer_e2e.close()
+    recognizer_e2e_1.close()
+
+  return {
+    "revision": git_revision(),
+    "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    "platform": platform.platform(),
+    "python": platform.python_version(),
+    "source": str(source) if source is not None else "synthetic",
+    "frame_width": frame_width,
+    "frame_height": frame_height,
+    "stages": stages,
+    "skipped": skipped,
+    "end_to_end": end_to_end,
+    "peak_rss_mb": peak_rss_mb()
+  }
+
+def print_results(results: dict):
+  print(f"{'stage':<20}{'fps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+
+  rows = list(results["stages"].items()) + [("end_to_end", results["end_to_end"])]
+  for stage, summary in rows:
+    print(f"{stage:<20}{summary['fps']:>10.1f}{summary['p50_ms']:>10.3f}{summary['p95_ms']:>10.3f}{summary['p99_ms']:>10.3f}")
+
+  for stage, reason in results["skipped"].items():
+    print(f"{stage:<20}skipped: {reason}")
+
+  print(f"Peak RSS: {results['peak_rss_mb']:.1f} MiB")
+
+def save_results(results: dict, output: str = None) -> str:
+  if output is None:
+    if not os.path.exists(results_path):
+      os.makedirs(results_path)
+
+    output = os.path.join(results_path, f"{time.strftime('%Y%m%d_%H%M%S')}_{results['revision']}.json")
+
+  with open(output, "w") as file:
+    json.dump(results, file, indent=2)
+
+  return output
+
+def compare_results(baseline: dict, results: dict, threshold: float = 0.1) -> bool:
+  # Returns True when any stage got slower than the threshold allows
+  regression = False
+
+  baseline_rows = dict(baseline["stages"], end_to_end=baseline["end_to_end"])
+  rows = dict(results["stages"], end_to_end=results["end_to_end"])
+
+  print(f"Comparing against {baseline['revision']} ({baseline['time']})")
+  print(f"{'stage':<20}{'base p50':>10}{'p50':>10}{'change':>10}")
+
+  for stage, summary in rows.items():
+    if stage not in baseline_rows:
+      continue
+
+    base = baseline_rows[stage]["p50_ms"]
+    change = (summary["p50_ms"] - base) / base if base > 0 else 0.0
+    flag = ""
+
+    if change > threshold:
+      regression = True
+      flag = "  REGRESSION"
+
+    print(f"{stage:<20}{base:>10.3f}{summary['p50_ms']:>10.3f}{change:>+10.1%}{flag}")
+
+  return regression
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Benchmark the hand tracking pipeline")
+  parser.add_argument("--images", help="directory with camera_0 and camera_1 image sequences")
+  parser.add_argument("--videos", nargs=2, metavar=("VIDEO_0", "VIDEO_1"), help="pair of synchronized video files")
+  parser.add_argument("--frames", type=int, default=300, help="maximum number of frames to benchmark")
+  parser.add_argument("--ik", action="store_true", help="include inverse kinematics, requires CoppeliaSim")
+  parser.add_argument("--output", help="path of the JSON results file")
+  parser.add_argument("--compare", help="JSON results of a previous revision to compare against")
+  parser.add_argument("--threshold", type=float, default=0.1, help="allowed p50 slowdown before flagging a regression")
+  args = parser.parse_args()
+
+  source = args.images or args.videos
+
+  print("========== Running Benchmark ==========")
+
+  results = benchmark(source, args.frames, args.ik)
+  if results is None:
+    sys.exit(1)
+
+  print_results(results)
+  print(f"Results saved to {save_results(results, args.output)}")
+
+  regression = False
+  if args.compare:
+    with open(args.compare) as file:
+      regression = compare_results(json.load(file), results, args.threshold)
+
+  print("========== Exiting Benchmark ==========")
+
+  sys.exit(1 if regression else 0)
\ No newline at end of file
@@ -1,195 +1,271 @@
-import os
-
-import dotenv
 import cv2 as cv
 import numpy as np
 
-# Captured images lists
-images_0 = []
-images_1 = []
-
-def camera_calibration():
+from utils.dlt import reset_triangulator
+from utils.config import get_config
+from utils.calibration import load_calibration, save_calibration
+from utils.frame_source import create_frame_source, camera_ids
+from utils.chessboard import chessboard_points, CornerCollector
+
+# Views with a reprojection error above this many times the median are dropped
+OUTLIER_FACTOR = 2.0
+# Views with a reprojection error below this many pixels are never dropped
+OUTLIER_MIN_ERROR = 0.5
+# Minimum number of views for a calibration
+MIN_VIEWS = 10
+# Views kept for incremental calibration, the ones that reproject worst are evicted first
+MAX_VIEWS = 100
+
+def camera_calibration(source=None, spill_directory: str = None, incremental: bool = False, max_views: int = MAX_VIEWS, stop_event=None):
+  # incremental adds the captured views to the stored ones and starts from the saved calibration
   print("========== Running Camera Calibration ==========")
 
-  # Load .env file
-  dotenv_file = dotenv.find_dotenv()
-  dotenv.load_dotenv(dotenv_file)
-
-  capture_frames()
-  stereo_calibration()
+  # Load settings
+  config = get_config()
+  CHESSBOARD_ROWS = config["CHESSBOARD_ROWS"]
+  CHESSBOARD_COLUMNS = config["CHESSBOARD_COLUMNS"]
+
+  previous = None
+  if incremental:
+    previous = load_previous_calibration()
+
+    if previous is None:
+      print("No previous calibration with stored views, running a full calibration")
+
+  # Live cameras are checked against the stored views before capture, so enough sets are asked for
+  # Recorded sources are only checked once their frames were read
+  if previous is not None and source is None:
+    if previous["image_size"] != config.frame_size():
+      print("Frame size changed since the previous calibration, running a full calibration")
+      previous = None
+    elif previous["cameras"] != len(camera_ids()):
+      print("Number of cameras changed since the previous calibration, running a full calibration")
+      previous = None
+
+  # Stored views count towards the minimum number of views
+  min_views = MIN_VIEWS if previous is None else max(1, MIN_VIEWS - len(previous["corners"]))
+
+  collector = capture_frames(source, (CHESSBOARD_ROWS, CHESSBOARD_COLUMNS), spill_directory, min_views, stop_event)
+
+  # Stopping from the GUI before enough sets were taken leaves the saved calibration untouched
+  if stop_event is not None and stop_event.is_set() and len(collector.views) < min_views:
+    print("Camera calibration stopped before enough image sets were taken")
+    print("========== Exiting Camera Calibration ==========")
+    return
+
+  if previous is not None and previous["image_size"] != collector.image_size:
+    print("Frame size changed since the previous calibration, running a full calibration")
+    previous = None
+
+  if previous is not None and previous["cameras"] != collector.cameras:
+    print("Number of cameras changed since the previous calibration, running a full calibration")
+    previous = None
+
+  if previous is None:
+    stereo_calibration(collector.views, collector.image_size, max_views=max_views)
+  else:
+    print(f"Adding {len(collector.views)} image sets to {len(previous['corners'])} stored ones")
+    stereo_calibration(previous["corners"] + collector.views, collector.image_size, previous["guess"], max_views)
   print("========== Exiting Camera Calibration ==========")
 
-def capture_frames():
-  # Load environment variables
-  CAMERA_0_ID = int(os.getenv("CAMERA_0_ID"))
-  CAMERA_1_ID = int(os.getenv("CAMERA_1_ID"))
-  FRAME_WIDTH = int(os.getenv("FRAME_WIDTH"))
-  FRAME_HEIGHT = int(os.getenv("FRAME_HEIGHT"))
-
-  # Set webcam capture
-  capture_0 = cv.VideoCapture(CAMERA_0_ID, cv.CAP_DSHOW)
-  capture_1 = cv.VideoCapture(CAMERA_1_ID, cv.CAP_DSHOW)
-
-  # Set frame width and height
-  capture_0.set(cv.CAP_PROP_FRAME_WIDTH, FRAME_WIDTH)
-  capture_0.set(cv.CAP_PROP_FRAME_HEIGHT, FRAME_HEIGHT)
-  capture_1.set(cv.CAP_PROP_FRAME_WIDTH, FRAME_WIDTH)
-  capture_1.set(cv.CAP_PROP_FRAME_HEIGHT, FRAME_HEIGHT)
-
-  # If either of the cameras is not detected, terminate program
-  if not capture_0.isOpened():
-    print("Can't open camera 0")
-    exit()
-  if not capture_1.isOpened():
-    print("Can't open camera 1")
-    exit()
-
-  print("Camera 0 is working")
-  print("Camera 1 is working")
+def capture_frames(source=None, pattern_size=None, spill_directory: str = None, min_views: int = MIN_VIEWS, stop_event=None) -> CornerCollector:
+  # Open frame source, live cameras from the .env file by default
+  capture = create_frame_source(source)
 
-  while True:
-    # Capture frame
-    ret_0, frame_0 = capture_0.read()
-    ret_1, frame_1 = capture_1.read()
+  # If any of the cameras is not detected, terminate program
+  for camera in range(capture.cameras):
+    if not capture.isOpened(camera):
+      print(f"Can't open camera {camera}")
+      capture.release()
+      exit()
 
-    # If a frame is not read correctly, terminate program
-    if not ret_0:
-      print("Can't receive frame from camera 0")
-      break
-    if not ret_1:
-      print("Can't receive frame from camera 1")
-      break
+  for camera in range(capture.cameras):
+    print(f"Camera {camera} is working")
 
-    # Show frames
-    cv.imshow("Camera 0", frame_0)
-    cv.imshow("Camera 1", frame_1)
+  # Captured sets are checked in the background, only their chessboard corners are kept
+  collector = CornerCollector(pattern_size, spill_directory)
 
-    # Get pressed key
-    pressed_key = cv.waitKey(1) & 0xFF
+  # Start grabbing frames
+  capture.start()
 
-    # Condition to exit loop or save frame when SPACE is pressed
-    if pressed_key == ord('q') or pressed_key == ord('Q'):
-      if len(images_0) < 10:
-        print("To achieve proper calibration you must take at least 10 calibration images")
-      else:
+  # Cameras and windows are released even when the loop raises
+  try:
+    # stop_event ends the loop when run from the GUI
+    while stop_event is None or not stop_event.is_set():
+      # Capture closest in time set of frames
+      ret, frames = capture.read_all()
+
+      # If a frame is not read correctly, terminate program
+      if not ret:
+        print(capture.error)
         break
-    elif pressed_key == 32:
-      # Save frames
-      images_0.append(frame_0)
-      images_1.append(frame_1)
-
-      print("Image saved")
-
-  # Release captures and destroy windows
-  capture_0.release()
-  capture_1.release()
-  cv.destroyAllWindows()
-
-def stereo_calibration():
-  # Path for camera parameters
-  dirname = os.path.dirname(__file__)
-  camera_parameters_path = os.path.join(dirname, "./camera_parameters")
-
-  # Load environment variables
-  CHESSBOARD_ROWS = int(os.getenv("CHESSBOARD_ROWS"))
-  CHESSBOARD_COLUMNS = int(os.getenv("CHESSBOARD_COLUMNS"))
-  CHESSBOARD_SQUARE_SIZE = float(os.getenv("CHESSBOARD_SQUARE_SIZE"))
-
-  # Termination criteria
-  criteria = (cv.TERM_CRITERIA_EPS + cv.TERM_CRITERIA_MAX_ITER, 30, 0.001)   
+
+      # Show frames
+      for camera, frame in enumerate(frames):
+        cv.imshow(f"Camera {camera}", frame)
+
+      # Get pressed key
+      pressed_key = cv.waitKey(1) & 0xFF
+
+      # Report sets checked since the last frame
+      finished = collector.poll()
+      for index, accepted in finished:
+        print(f"Image set {index} {'accepted' if accepted else 'rejected, chess board not found in camera 0 and another camera'}")
+
+      # Condition to exit loop or save frame when SPACE is pressed
+      if pressed_key == ord('q') or pressed_key == ord('Q'):
+        if len(collector.views) + len(collector.pending) < min_views:
+          print(f"To achieve proper calibration you must take at least {min_views} calibration images with the chess board visible in camera 0 and another camera")
+        else:
+          break
+      elif pressed_key == 32:
+        # Send frames to be checked
+        index = collector.submit(frames)
+
+        print(f"Image set {index} saved")
+
+      # Window titles show how many sets are usable so far
+      if finished or pressed_key == 32:
+        for camera in range(capture.cameras):
+          cv.setWindowTitle(f"Camera {camera}", f"Camera {camera} - {collector.status()}")
+  except BaseException:
+    # Sets still being checked are of no use once the capture failed
+    collector.pool.shutdown(cancel_futures=True)
+    raise
+  finally:
+    # Release captures and destroy windows
+    capture.release()
+    cv.destroyAllWindows()
+
+  # Wait for the last sets to be checked
+  for index, accepted in collector.close():
+    print(f"Image set {index} {'accepted' if accepted else 'rejected, chess board not found in camera 0 and another camera'}")
+
+  return collector
+
+def load_previous_calibration():
+  # Saved parameters and stored views, or None if there are none
+  calibration = load_calibration()
+
+  if calibration is None or len(calibration.corners) == 0:
+    return None
+
+  guess = (calibration.mtx, calibration.dist, calibration.rotations, calibration.translations)
+
+  return {"guess": guess, "corners": calibration.corners, "image_size": calibration.image_size, "cameras": calibration.cameras}
+
+def calibrate_views(obj_point, corners, image_size, guess=None):
+  # corners holds (corners_0, corners_1, ...) of every view, None where a camera missed the board
+  # guess is (mtx, dist, R, T) of a previous calibration to start from, with R and T relative to camera 0
   # Stereo calibration criteria
   stereo_criteria = (cv.TERM_CRITERIA_EPS + cv.TERM_CRITERIA_MAX_ITER, 100, 0.0001)
 
-  # Prepare object points
-  obj_point = np.zeros((CHESSBOARD_ROWS * CHESSBOARD_COLUMNS, 3), np.float32)
-  obj_point[:,:2] = np.mgrid[0:CHESSBOARD_ROWS, 0:CHESSBOARD_COLUMNS].T.reshape(-1, 2)
-  # Multiply obj_point by chess board square size in mm
-  obj_point = obj_point * CHESSBOARD_SQUARE_SIZE
-
-  # Arrays to store object points and image points
-  obj_points = [] # 3D points in real world space
-  img_points_0 = [] # 2D points in image plane from camera 0
-  img_points_1 = [] # 2D points in image plane from camera 1
-
-  # Calibrated frames counter
-  calibrated_frames_counter = 0
-
-  # Iterate through each of the captured frames
-  for frame_0, frame_1 in zip(images_0, images_1):
-    # Convert frame to gray scale
-    gray_0 = cv.cvtColor(frame_0, cv.COLOR_BGR2GRAY)
-    gray_1 = cv.cvtColor(frame_1, cv.COLOR_BGR2GRAY)
-
-    # Find chess board corners
-    ret_0, corners_0 = cv.findChessboardCorners(gray_0, (CHESSBOARD_ROWS, CHESSBOARD_COLUMNS), None)
-    ret_1, corners_1 = cv.findChessboardCorners(gray_1, (CHESSBOARD_ROWS, CHESSBOARD_COLUMNS), None)
-
-    # If found, draw chess board corners into frame
-    if ret_0 == True and ret_1 == True:
-      # Increment counter
-      calibrated_frames_counter += 1
-
-      # Refine chessboard corners
-      corners_r_0 = cv.cornerSubPix(gray_0, corners_0, (11, 11), (-1, -1), criteria)
-      corners_r_1 = cv.cornerSubPix(gray_1, corners_1, (11, 11), (-1 ,-1), criteria)
-
-      # Add object points and image points
-      obj_points.append(obj_point)
-      img_points_0.append(corners_r_0)
-      img_points_1.append(corners_r_1)
-
-      # Draw and display chess board corners
-      cv.drawChessboardCorners(frame_0, (CHESSBOARD_ROWS, CHESSBOARD_COLUMNS), corners_r_0, ret_0)
-      cv.imshow("Chess Board 0", frame_0)
-      cv.drawChessboardCorners(frame_1, (CHESSBOARD_ROWS, CHESSBOARD_COLUMNS), corners_r_1, ret_1)
-      cv.imshow("Chess Board 1", frame_1)
-
-      cv.waitKey(1000)
-
-      # Calibrate camera 0
-      ret_0, mtx_0, dist_0, rvecs_0, tvecs_0 = cv.calibrateCamera(obj_points, img_points_0, gray_0.shape[::-1], None, None)
-      # Calibrate camera 1
-      ret_1, mtx_1, dist_1, rvecs_1, tvecs_1 = cv.calibrateCamera(obj_points, img_points_1, gray_1.shape[::-1], None, None)
-      # Stereo calibration
-      ret_stereo, CM_0, dist_0_stereo, CM_1, dist_1_stereo, R, T, E, F = cv.stereoCalibrate(obj_points, img_points_0, img_points_1, mtx_0, dist_0, mtx_1, dist_1, gray_0.shape[::-1], criteria=stereo_criteria, flags=cv.CALIB_FIX_INTRINSIC)
-
-  if calibrated_frames_counter >= 10:
-    # Print RMSE
-    print("Successfull calibration")
-    print("RMSE: ", ret_stereo)
-
-    # Save calibration parameters
-    if not os.path.exists(camera_parameters_path):
-      os.makedirs(camera_parameters_path)
-    else:
-      np.save(f"{camera_parameters_path}/mtx_0.npy", mtx_0)
-      np.save(f"{camera_parameters_path}/dist_0.npy", dist_0)
-      np.save(f"{camera_parameters_path}/mtx_1.npy", mtx_1)
-      np.save(f"{camera_parameters_path}/dist_1.npy", dist_1)
-      np.save(f"{camera_parameters_path}/R.npy", R)
-      np.save(f"{camera_parameters_path}/T.npy", T)
-
-    # Obtain projection matrices
-    projection_matrix(mtx_0, mtx_1, R, T)
+  cameras = len(corners[0])
+
+  if guess is None:
+    mtx = [None] * cameras
+    dist = [None] * cameras
+    R = [None] * cameras
+    T = [None] * cameras
+    intrinsic_flags = 0
+    stereo_flags = cv.CALIB_FIX_INTRINSIC
   else:
+    mtx, dist, R, T = ([np.array(value, dtype=np.float64) for value in values] for values in guess)
+    intrinsic_flags = cv.CALIB_USE_INTRINSIC_GUESS
+    stereo_flags = cv.CALIB_FIX_INTRINSIC + cv.CALIB_USE_EXTRINSIC_GUESS
+
+  # Calibrate each camera once over every view it saw the board in
+  for camera in range(cameras):
+    img_points = [view[camera] for view in corners if view[camera] is not None]
+
+    if len(img_points) < MIN_VIEWS:
+      print(f"Camera {camera} saw the chess board in {len(img_points)} images, at least {MIN_VIEWS} are needed")
+      return None
+
+    _, mtx[camera], dist[camera], _, _, _, _, _ = cv.calibrateCameraExtended([obj_point] * len(img_points), img_points, image_size, mtx[camera], dist[camera], flags=intrinsic_flags)
+
+  # Camera 0 is the reference, every other camera is calibrated against it with the views both share
+  R[0] = np.eye(3)
+  T[0] = np.zeros((3, 1))
+  rmse = []
+  errors = np.zeros(len(corners))
+
+  for camera in range(1, cameras):
+    shared = [i for i, view in enumerate(corners) if view[camera] is not None]
+
+    if len(shared) == 0:
+      print(f"Camera {camera} never saw the chess board together with camera 0")
+      return None
+
+    img_points_0 = [corners[i][0] for i in shared]
+    img_points_k = [corners[i][camera] for i in shared]
+
+    # Stereo calibration with fixed intrinsics, OpenCV 4.8 added rvecs and tvecs before the per view errors
+    stereo = cv.stereoCalibrateExtended([obj_point] * len(shared), img_points_0, img_points_k, mtx[0], dist[0], mtx[camera], dist[camera], image_size, R[camera], T[camera], criteria=stereo_criteria, flags=stereo_flags)
+    rmse.append(stereo[0])
+    R[camera], T[camera] = stereo[5], stereo[6]
+
+    # Per view errors are (views, 2), a view is as bad as its worst camera
+    errors[shared] = np.maximum(errors[shared], stereo[-1].max(axis=1))
+
+  return rmse, mtx, dist, R, T, errors
+
+def stereo_calibration(corners, image_size, guess=None, max_views: int = MAX_VIEWS):
+  # corners holds (corners_0, corners_1, ...) of every set where camera 0 and another camera found the board
+  # Load settings
+  config = get_config()
+  CHESSBOARD_ROWS = config["CHESSBOARD_ROWS"]
+  CHESSBOARD_COLUMNS = config["CHESSBOARD_COLUMNS"]
+  CHESSBOARD_SQUARE_SIZE = float(config["CHESSBOARD_SQUARE_SIZE"])
+
+  # Prepare object points in mm
+  obj_point = chessboard_points(CHESSBOARD_ROWS, CHESSBOARD_COLUMNS, CHESSBOARD_SQUARE_SIZE)
+
+  views = list(range(len(corners)))
+  print(f"Calibrating with {len(views)} image sets")
+
+  if len(views) < MIN_VIEWS:
     print("Bad calibration, try again")
+    return
+
+  while True:
+    result = calibrate_views(obj_point, [corners[i] for i in views], image_size, guess)
 
-  cv.destroyAllWindows()
+    if result is None:
+      print("Bad calibration, try again")
+      return
+
+    rmse, mtx, dist, R, T, errors = result
+
+    # Reprojection error of each view, the worst of its cameras
+    for i, error in zip(views, errors):
+      print(f"Image set {i}: {error:.3f} px")
+
+    # Drop outlier views and solve again while enough views remain
+    threshold = max(OUTLIER_FACTOR * np.median(errors), OUTLIER_MIN_ERROR)
+    inliers = [i for i, error in zip(views, errors) if error <= threshold]
+
+    if len(inliers) < MIN_VIEWS:
+      break
+
+    # Only the max_views views that reproject best are kept
+    if len(inliers) > max_views:
+      best = sorted(zip(errors, views))[:max_views]
+      inliers = sorted(i for _, i in best)
+
+    if len(inliers) == len(views):
+      break
 
-def projection_matrix(mtx_0, mtx_1, R, T):
-    # Path for camera parameters
-    dirname = os.path.dirname(__file__)
-    camera_parameters_path = os.path.join(dirname, "./camera_parameters")    
+    print(f"Dropping image sets {[i for i in views if i not in inliers]}")
+    views = inliers
 
-    # RT matrix for camera_0
-    RT_0 = np.concatenate([np.eye(3), [[0], [0], [0]]], axis = -1)
-    # Projection matrix for camera_0
-    P_0 = mtx_0 @ RT_0
+  # Print RMSE of every camera against camera 0
+  print("Successfull calibration")
+  for camera, error in enumerate(rmse, start=1):
+    print(f"RMSE camera {camera}: ", error)
 
-    # RT matrix for camera_1
-    RT_1 = np.concatenate([R, T], axis = -1)
-    P_1 = mtx_1 @ RT_1  
+  # Save calibration parameters and the views used, an incremental calibration starts from them
+  save_calibration(mtx, dist, R, T, image_size, [corners[i] for i in views])
 
-    # Save projection matrices
-    np.save(f"{camera_parameters_path}/P_0.npy", P_0)
-    np.save(f"{camera_parameters_path}/P_1.npy", P_1)
\ No newline at end of file
+  # Make sure the next session triangulates with the new calibration
+  reset_triangulator()
\ No newline at end of file
@@ -1,14 +1,14 @@
 import os
+import time
+import threading
 
-import dotenv
 import tkinter as tk
 from tkinter import messagebox
 
-from utils.validate_input import validate_input
-
-# Load .env file
-dotenv_file = dotenv.find_dotenv()
-dotenv.load_dotenv(dotenv_file)
+from utils.config import get_config, THRESHOLD_SETTINGS
+from utils.startup import timed_import, record_startup, startup_report
+from utils.metrics import dashboard_text
+from utils.pipeline_session import PipelineSession
 
 class GUI():
   def __init__(self):
@@ -16,17 +16,112 @@ class GUI():
     self.root.title(string="Hand Tracking")
     self.root.resizable(width=0, height=0)
 
+    # Pipeline running in the background, the menu stays responsive while it runs
+    self.session = None
+
+    # Recognizers follow new confidence thresholds, a running session rebuilds its own
+    get_config().subscribe(self.on_settings_changed)
+
     self.main_menu_view()
 
+    # Heavy modules and recognizers load once the menu is shown
+    self.root.after_idle(self.prewarm)
+
     self.root.protocol(name="WM_DELETE_WINDOW", func=self.on_close)
     self.root.mainloop()
 
-  def main_menu_view(self):
-    # Load utility functions
-    from hand_tracking import hand_tracking
-    from camera_calibration import camera_calibration
-    from test_cameras import test_cameras
+  def prewarm(self):
+    # Import, calibration and recognizer loading happen in the background while the menu is idle
+    def run():
+      try:
+        from utils.dlt import load_triangulator
+        from utils.calibration import camera_parameters_path
+        from utils.frame_source import camera_ids
+        from utils.recognizer_pool import get_recognizer_pool
+
+        hand_tracking = timed_import("hand_tracking")
+        timed_import("camera_calibration")
+        timed_import("test_cameras")
+
+        if os.path.exists(camera_parameters_path):
+          start = time.perf_counter()
+          load_triangulator()
+          record_startup("calibration", time.perf_counter() - start)
+
+        # Recognizers are only rebuilt when their settings changed since the last time
+        options = hand_tracking.recognizer_options()
+        if os.path.exists(options["model_path"]):
+          get_recognizer_pool().prepare(options, len(camera_ids()))
+
+        print(startup_report())
+      except Exception as error:
+        print(f"Can't prepare hand tracking: {error}")
+
+    threading.Thread(target=run, name="prewarm", daemon=True).start()
+
+  def run_hand_tracking(self):
+    self.start_session("Hand Tracking", timed_import("hand_tracking").hand_tracking, with_metrics=True)
+
+  def run_camera_calibration(self):
+    self.start_session("Camera Calibration", timed_import("camera_calibration").camera_calibration)
+
+  def run_test_cameras(self):
+    self.start_session("Test Cameras", timed_import("test_cameras").test_cameras)
+
+  def start_session(self, name: str, function, with_metrics: bool = False):
+    # Only one pipeline at a time, they share the cameras
+    if self.session is not None and self.session.is_running():
+      return
+
+    self.session = PipelineSession(name, function, with_metrics=with_metrics)
+    self.session.start()
+
+    self.set_menu_state("disabled")
+    self.poll_session()
+
+  def stop_session(self):
+    if self.session is not None:
+      self.session.stop()
+
+  def poll_session(self):
+    # Refresh the dashboard from the latest published metrics, nothing here waits on the pipeline
+    if self.session is None or not self.root.winfo_exists():
+      return
+
+    if self.session.is_running():
+      text = f"{self.session.name} running"
+      if self.session.metrics is not None:
+        text += "\n\n" + dashboard_text(self.session.metrics.latest())
+
+      self.show_status(text)
+      self.root.after(250, self.poll_session)
+      return
+
+    if self.session.error is not None:
+      self.show_status(f"{self.session.name} stopped: {self.session.error}")
+    else:
+      self.show_status(f"{self.session.name} finished")
 
+    self.session = None
+    self.set_menu_state("normal")
+
+  def show_status(self, text: str):
+    # The status label only exists while the main menu is shown
+    if hasattr(self, "status_label") and self.status_label.winfo_exists():
+      self.status_label.config(text=text)
+
+  def set_menu_state(self, state: str):
+    # Pipeline buttons are disabled while a session runs, Stop is enabled instead
+    # Settings stay available, a running hand tracking session applies them right away
+    if not hasattr(self, "button_stop") or not self.button_stop.winfo_exists():
+      return
+
+    for button in [self.button_hand_tracking, self.button_camera_calibration, self.button_test_cameras]:
+      button.config(state=state)
+
+    self.button_stop.config(state="normal" if state == "disabled" else "disabled")
+
+  def main_menu_view(self):
     # Destroy all widgets
     for i in self.root.winfo_children():
       i.destroy()
@@ -35,25 +130,37 @@ class GUI():
     self.view_title.pack(padx=(42, 42), pady=(42, 0))
 
     self.pixel_hand_tracking = tk.PhotoImage(width=1, height=1)
-    self.button_hand_tracking = tk.Button(master=self.root, text="Hand Tracking", font=("TkDefaultFont", 12), image=self.pixel_hand_tracking, width=160, height=40, compound="c", command=hand_tracking)
+    self.button_hand_tracking = tk.Button(master=self.root, text="Hand Tracking", font=("TkDefaultFont", 12), image=self.pixel_hand_tracking, width=160, height=40, compound="c", command=self.run_hand_tracking)
     self.button_hand_tracking.pack(pady=(42, 0))
 
     self.pixel_camera_calibration = tk.PhotoImage(width=1, height=1)
-    self.button_camera_calibration = tk.Button(master=self.root, text="Camera Calibration", font=("TkDefaultFont", 12), image=self.pixel_camera_calibration, width=160, height=40, compound="c", command=camera_calibration)
+    self.button_camera_calibration = tk.Button(master=self.root, text="Camera Calibration", font=("TkDefaultFont", 12), image=self.pixel_camera_calibration, width=160, height=40, compound="c", command=self.run_camera_calibration)
     self.button_camera_calibration.pack(pady=(32, 0))
 
     self.pixel_test_cameras = tk.PhotoImage(width=1, height=1)
-    self.button_test_cameras = tk.Button(master=self.root, text="Test Cameras", font=("TkDefaultFont", 12), image=self.pixel_test_cameras, width=160, height=40, compound="c", command=test_cameras)
+    self.button_test_cameras = tk.Button(master=self.root, text="Test Cameras", font=("TkDefaultFont", 12), image=self.pixel_test_cameras, width=160, height=40, compound="c", command=self.run_test_cameras)
     self.button_test_cameras.pack(pady=(32, 0))
 
     self.pixel_settings = tk.PhotoImage(width=1, height=1)
     self.button_settings = tk.Button(master=self.root, text="Settings", font=("TkDefaultFont", 12), image=self.pixel_settings, width=160, height=40, compound="c", command=self.settings_view)
     self.button_settings.pack(pady=(32, 0))
 
+    self.pixel_stop = tk.PhotoImage(width=1, height=1)
+    self.button_stop = tk.Button(master=self.root, text="Stop", font=("TkDefaultFont", 12), image=self.pixel_stop, width=160, height=40, compound="c", command=self.stop_session, state="disabled")
+    self.button_stop.pack(pady=(32, 0))
+
+    # Live performance of the running session
+    self.status_label = tk.Label(master=self.root, text="", font=("TkFixedFont", 10), justify="left", anchor="w")
+    self.status_label.pack(padx=(42, 42), pady=(32, 0), fill="x")
+
     self.pixel_quit = tk.PhotoImage(width=1, height=1)
     self.button_quit = tk.Button(master=self.root, text="Quit", font=("TkDefaultFont", 12), image=self.pixel_quit, width=160, height=40, compound="c", command=self.on_close)
     self.button_quit.pack(pady=(32, 42))
 
+    # Coming back from the settings while a session runs
+    if self.session is not None:
+      self.set_menu_state("disabled")
+
   def settings_view(self):
     # Destroy all widgets
     for i in self.root.winfo_children():
@@ -131,6 +238,14 @@ class GUI():
     self.min_tracking_confidence_entry = tk.Entry(master=self.right_column_frame, font=("TkDefaultFont", 12), width=12)
     self.min_tracking_confidence_entry.pack()
 
+    self.camera_ids_label = tk.Label(master=self.root, text="Camera IDs, for more than two cameras", font=("TkDefaultFont", 12))
+    self.camera_ids_label.pack(pady=(16, 4))
+
+    # Camera 0 and 1 IDs are replaced by the list while it is set
+    self.camera_ids_entry = tk.Entry(master=self.root, font=("TkDefaultFont", 12), width=26)
+    self.camera_ids_entry.bind("<KeyRelease>", lambda event: self.update_camera_entries())
+    self.camera_ids_entry.pack()
+
     self.pixel_save = tk.PhotoImage(width=1, height=1)
     self.button_save = tk.Button(master=self.root, text="Save", font=("TkDefaultFont", 12), image=self.pixel_save, width=160, height=40, compound="c", command=self.save_settings)
     self.button_save.pack(pady=(42, 0))
@@ -143,27 +258,46 @@ class GUI():
 
   def on_close(self):
     if messagebox.askyesno(title="Quit?", message="Do you really want to quit?"):
+      # Let a running pipeline release its cameras and windows before quitting
+      if self.session is not None:
+        self.session.stop()
+        self.session.join(timeout=5.0)
+
+      from utils.recognizer_pool import close_recognizer_pool
+      close_recognizer_pool()
+
       self.root.destroy()
 
   def load_settings(self):
-    self.camera_0_entry.insert(0, os.environ["CAMERA_0_ID"])
-    self.camera_1_entry.insert(0, os.environ["CAMERA_1_ID"])
+    config = get_config()
+
+    self.camera_0_entry.insert(0, config.strings["CAMERA_0_ID"])
+    self.camera_1_entry.insert(0, config.strings["CAMERA_1_ID"])
+    self.camera_ids_entry.insert(0, config.strings.get("CAMERA_IDS", ""))
+    self.update_camera_entries()
     
-    self.width_entry.insert(0, os.environ["FRAME_WIDTH"])
-    self.height_entry.insert(0, os.environ["FRAME_HEIGHT"])
+    self.width_entry.insert(0, config.strings["FRAME_WIDTH"])
+    self.height_entry.insert(0, config.strings["FRAME_HEIGHT"])
     
-    self.chessboard_rows_entry.insert(0, os.environ["CHESSBOARD_ROWS"])
-    self.chessboard_columns_entry.insert(0, os.environ["CHESSBOARD_COLUMNS"])
-    self.chessboard_square_size_entry.insert(0, os.environ["CHESSBOARD_SQUARE_SIZE"])
+    self.chessboard_rows_entry.insert(0, config.strings["CHESSBOARD_ROWS"])
+    self.chessboard_columns_entry.insert(0, config.strings["CHESSBOARD_COLUMNS"])
+    self.chessboard_square_size_entry.insert(0, config.strings["CHESSBOARD_SQUARE_SIZE"])
+
+    self.min_hand_detection_confidence_entry.insert(0, config.strings["MIN_HAND_DETECTION_CONFIDENCE"])
+    self.min_hand_presence_confidence_entry.insert(0, config.strings["MIN_HAND_PRESENCE_CONFIDENCE"])
+    self.min_tracking_confidence_entry.insert(0, config.strings["MIN_TRACKING_CONFIDENCE"])
+
+  def update_camera_entries(self):
+    state = "disabled" if self.camera_ids_entry.get().strip() else "normal"
 
-    self.min_hand_detection_confidence_entry.insert(0, os.environ["MIN_HAND_DETECTION_CONFIDENCE"])
-    self.min_hand_presence_confidence_entry.insert(0, os.environ["MIN_HAND_PRESENCE_CONFIDENCE"])
-    self.min_tracking_confidence_entry.insert(0, os.environ["MIN_TRACKING_CONFIDENCE"])
+    self.camera_0_entry.configure(state=state)
+    self.camera_1_entry.configure(state=state)
 
   def save_settings(self):
     settings_state = {
       "CAMERA_0_ID": self.camera_0_entry.get(),
       "CAMERA_1_ID": self.camera_1_entry.get(),
+      "CAMERA_IDS": self.camera_ids_entry.get().strip(),
       "FRAME_WIDTH": self.width_entry.get(),
       "FRAME_HEIGHT": self.height_entry.get(),
       "CHESSBOARD_ROWS": self.chessboard_rows_entry.get(),
@@ -174,44 +308,23 @@ class GUI():
       "MIN_TRACKING_CONFIDENCE": self.min_tracking_confidence_entry.get()   
     }
 
-    error_state = {
-      "CAMERA_0_ID": False,
-      "CAMERA_1_ID": False,
-      "FRAME_WIDTH": False,
-      "FRAME_HEIGHT": False,
-      "CHESSBOARD_ROWS": False,
-      "CHESSBOARD_COLUMNS": False,
-      "CHESSBOARD_SQUARE_SIZE": False,
-      "MIN_HAND_DETECTION_CONFIDENCE": False,
-      "MIN_HAND_PRESENCE_CONFIDENCE": False,
-      "MIN_TRACKING_CONFIDENCE": False
-    }
-
-    has_error = False;
-
-    for key, value in settings_state.items():
-      type = "float"
-      in_range = False
-      if key in ["CAMERA_0_ID", "CAMERA_1_ID", "FRAME_WIDTH", "FRAME_HEIGHT", "CHESSBOARD_ROWS", "CHESSBOARD_COLUMNS", "CHESSBOARD_SQUARE_SIZE"]:
-        type = "int"
-      if key in ["MIN_HAND_DETECTION_CONFIDENCE", "MIN_HAND_PRESENCE_CONFIDENCE", "MIN_TRACKING_CONFIDENCE"]:
-        in_range = True
+    # Valid settings are written to the .env file at once, the others are reported
+    error_keys = get_config().update(settings_state)
 
-      if validate_input(input=value, type=type, range=in_range):
-        os.environ[key] = value
-        dotenv.set_key(dotenv_path=dotenv_file, key_to_set=key, value_to_set=os.environ[key])
-      else:
-        has_error = True
-        error_state[key] = True
-
-    if has_error:
+    if len(error_keys) > 0:
       error_message = ""
-      for key, value in error_state.items():
-        if value == True:
-          error_message += f"Error in {key} input\n"
+      for key in error_keys:
+        error_message += f"Error in {key} input\n"
 
       messagebox.showerror(title="Error", message=error_message)
     else:
       messagebox.showinfo(title="Success", message="Settings saved successfully")
 
-GUI()
\ No newline at end of file
+  def on_settings_changed(self, changed: set):
+    # Called from the thread that changed the settings, a running session rebuilds its own recognizers
+    if changed & THRESHOLD_SETTINGS and (self.session is None or not self.session.is_running()):
+      self.prewarm()
+
+# Worker processes import this module again when spawned
+if __name__ == "__main__":
+  GUI()
\ No newline at end of file
@@ -1,211 +1,625 @@
 import os
+import time
+import queue
+from collections import OrderedDict
 
-import dotenv
 import cv2 as cv
-import mediapipe as mp
+import numpy as np
 
-def hand_tracking():
-  # Import utility functions
-  from utils.draw_landmarks import draw_landmarks
-  from utils.write_gesture import write_gesture
-  from utils.hand_orientation import hand_orientation
-  from utils.inverse_kinematics import inverse_kinematics
-  from utils.dlt import DLT
-
-  # Load .env file
-  dotenv_file = dotenv.find_dotenv()
-  dotenv.load_dotenv(dotenv_file)
-
-  # Load environment variables
-  CAMERA_0_ID = int(os.getenv("CAMERA_0_ID"))
-  CAMERA_1_ID = int(os.getenv("CAMERA_1_ID"))
-  FRAME_WIDTH = int(os.getenv("FRAME_WIDTH"))
-  FRAME_HEIGHT = int(os.getenv("FRAME_HEIGHT"))
-  MIN_HAND_DETECTION_CONFIDENCE = float(os.getenv("MIN_HAND_DETECTION_CONFIDENCE"))
-  MIN_HAND_PRESENCE_CONFIDENCE = float(os.getenv("MIN_HAND_PRESENCE_CONFIDENCE"))
-  MIN_TRACKING_CONFIDENCE = float(os.getenv("MIN_TRACKING_CONFIDENCE"))
+def recognizer_options(num_hands: int = 1, roi: bool = True) -> dict:
+  # Recognizer options from the settings, everything but the model also keys cached results
+  from utils.config import get_config
+  config = get_config()
 
   # Model path
   dirname = os.path.dirname(__file__)
   model_path = os.path.join(dirname, "./models/gesture_recognizer.task")
 
+  return {
+    "model_path": model_path,
+    "num_hands": num_hands,
+    "min_hand_detection_confidence": config["MIN_HAND_DETECTION_CONFIDENCE"],
+    "min_hand_presence_confidence": config["MIN_HAND_PRESENCE_CONFIDENCE"],
+    "min_tracking_confidence": config["MIN_TRACKING_CONFIDENCE"],
+    "roi": roi
+  }
+
+def hand_poses(hands, frame_width: int, frame_height: int, triangulator, max_cost: float = 25.0):
+  # Pose of every hand seen by at least two cameras, hands is the list of hands of every camera
+  # Hands are matched to the camera that sees the most of them by epipolar distance
+  from utils.draw_landmarks import hands_to_array
+  from utils.hand_association import associate_hands
+
+  # Pixel coordinates of the landmarks of every hand of every camera, (H, 21, 2) each
+  pixels = [hands_to_array(camera_hands) * (frame_width, frame_height) for camera_hands in hands]
+  cameras = len(pixels)
+  reference = int(np.argmax([len(camera_pixels) for camera_pixels in pixels]))
+
+  # Index of every hand of the reference camera in each camera, -1 where that camera did not see it
+  matches = np.full((cameras, len(pixels[reference])), -1)
+  matches[reference] = np.arange(len(pixels[reference]))
+
+  # Without calibration hands are paired in detection order
+  calibration = triangulator.calibration
+  for camera in range(cameras):
+    if camera == reference:
+      continue
+
+    if calibration is None:
+      pairs = [(i, i) for i in range(min(len(pixels[reference]), len(pixels[camera])))]
+    else:
+      pairs = associate_hands(calibration.undistort_points(reference, pixels[reference]), calibration.undistort_points(camera, pixels[camera]), calibration.fundamental(reference, camera), max_cost)
+
+    for index_reference, index in pairs:
+      matches[camera, index_reference] = index
+
+  # Only hands seen by two cameras or more have depth
+  seen = matches >= 0
+  index_reference = np.flatnonzero(seen.sum(axis=0) >= 2)
+
+  if len(index_reference) == 0:
+    return np.empty((0, 3)), np.empty((0, 3)), np.empty((0, 21, 3)), np.empty(0, dtype=int)
+
+  matches = matches[:, index_reference]
+  seen = seen[:, index_reference]
+
+  # Landmarks of every hand in every camera, NaN where a camera did not see the hand, (V, M, 21, 2)
+  points = np.full((cameras, len(index_reference), 21, 2), np.nan)
+  for camera in range(cameras):
+    points[camera, seen[camera]] = pixels[camera][matches[camera, seen[camera]]]
+
+  # Center of each hand goes after its landmarks
+  points = np.concatenate([points, (points[:, :, [0]] + points[:, :, [9]]) / 2], axis=2)
+
+  if cameras == 2:
+    # Both cameras saw every remaining hand, rectified triangulation applies
+    points_coords = triangulator.triangulate(points[0], points[1])
+  else:
+    # Landmarks MediaPipe placed outside of a frame are guesses, their views are left out
+    inside = (points >= 0).all(axis=-1) & (points < (frame_width, frame_height)).all(axis=-1)
+    mask = seen[..., None] & inside
+
+    # Landmarks inside less than two frames fall back to every camera that saw the hand
+    weak = mask.sum(axis=0) < 2
+    mask[:, weak] = np.broadcast_to(seen[..., None], mask.shape)[:, weak]
+
+    # Triangulate all landmarks and center points of all hands over all cameras in a single solve
+    points_coords = triangulator.triangulate_views(points, mask)
+
+  landmarks_coords = points_coords[:, :21]
+  hand_coords = points_coords[:, 21]
+
+  # Get rotation of hands in Z coordinate, always in the image plane of camera 0 so it does not jump
+  # between cameras, from the triangulated landmarks (camera 0 frame) for hands camera 0 did not see
+  z_rotation_image = np.arctan2(points[0, :, 9, 1] - points[0, :, 0, 1], points[0, :, 9, 0] - points[0, :, 0, 0])
+  z_rotation_space = np.arctan2(landmarks_coords[:, 9, 1] - landmarks_coords[:, 0, 1], landmarks_coords[:, 9, 0] - landmarks_coords[:, 0, 0])
+  z_rotation = np.where(seen[0], z_rotation_image, z_rotation_space)
+
+  # Get rotation of hands in Y coordinate, atan2(X, Z)
+  y_rotation = np.arctan2(landmarks_coords[:, 17, 0] - landmarks_coords[:, 5, 0], landmarks_coords[:, 17, 2] - landmarks_coords[:, 5, 2])
+
+  # Get rotation of hands in X coordinate, atan2(Y, Z)
+  x_rotation = np.arctan2(landmarks_coords[:, 9, 1] - landmarks_coords[:, 0, 1], landmarks_coords[:, 9, 2] - landmarks_coords[:, 0, 2])
+
+  return hand_coords, np.stack([x_rotation, y_rotation, z_rotation], axis=1), landmarks_coords, index_reference
+
+def hand_tracking(source=None, mode: str = "thread", display: str = "window", preview_fps: float = 15.0, preview_scale: float = 0.5, stop_event=None, metrics=None, metrics_export: str = None, stale_after: float = 0.1, match_tolerance: float = None, roi: bool = True, inference_stride: int = 1, filter_pose: bool = True, joint_deadband: float = 0.005, rectified: bool = True, num_hands: int = 1, record: str = None, inference_cache: str = None, realtime: bool = True):
+  # mode is "thread" to capture and recognize both cameras in this process, or "process" to run
+  # capture and recognition of each camera in its own worker process
+  # display is "window" to draw and show full frames in the loop, "preview" to show them from
+  # a rate limited thread, or "headless" to skip rendering entirely
+  # roi recognizes a crop around the hand found in the previous frame instead of the full frame
+  # inference_stride runs recognition on every nth frame of each camera, filter_pose predicts the
+  # hand pose between results so inverse kinematics still runs at capture rate
+  # match_tolerance is the largest spread in seconds between the capture times of a matched set of results,
+  # one frame period of the source by default, free running cameras out of phase are up to a frame apart
+  # joint_deadband is the smallest change in radians of any joint that is sent to the simulator
+  # rectified computes depth from disparity in rectified images instead of solving the DLT per point
+  # num_hands is the number of hands recognized per camera, the robot follows the one tracked longest
+  # record is a directory where landmarks, poses and joint targets of every frame are recorded
+  # inference_cache is a directory where recognizer results are kept, frames seen before skip inference
+  # realtime False replays recorded sources as fast as possible instead of at their frame rate
+
+  # Import utility functions
+  from utils.draw_landmarks import draw_landmarks
+  from utils.write_gesture import write_gesture
+  from utils.inverse_kinematics import inverse_kinematics, start_joint_sender, stop_joint_sender
+  from utils.dlt import load_triangulator
+  from utils.frame_source import create_frame_source, create_camera_specs, DEFAULT_FPS
+  from utils.metrics import Metrics, MetricsExporter, InferenceTracker
+  from utils.result_store import ResultStore, has_hand, match_results, result_age
+  from utils.preview import PreviewWindow
+  from utils.inference_worker import InferenceWorkers
+  from utils.roi import RoiTracker
+  from utils.pose_filter import PoseFilter
+  from utils.hand_association import HandTracks
+  from utils.recorder import SessionRecorder, session_exists
+  from utils.roi import landmarks_to_xyz
+  from utils.inference_cache import InferenceCache, cache_path, cache_settings
+  from utils.recognizer_pool import get_recognizer_pool
+  from utils.startup import timed_import
+  from utils.config import get_config, THRESHOLD_SETTINGS, CAPTURE_SETTINGS
+  from utils.stereo_capture import StereoCapture
+
+  # MediaPipe takes seconds to import, it is only loaded once a session starts
+  mp = timed_import("mediapipe")
+
+  # Load settings, changes saved while the session runs are applied between frames
+  config = get_config()
+  FRAME_WIDTH, FRAME_HEIGHT = config.frame_size()
+
   # MediaPipe hand landmarker objects
-  BaseOptions = mp.tasks.BaseOptions
-  GestureRecognizer = mp.tasks.vision.GestureRecognizer
-  GestureRecognizerOptions = mp.tasks.vision.GestureRecognizerOptions
   GestureRecognizerResult = mp.tasks.vision.GestureRecognizerResult
-  VisionRunningMode = mp.tasks.vision.RunningMode
 
-  # Results dictionaries
-  results_0 = {
-    "hand_landmarks": None,
-    "gesture": None,
-  }
+  # Stage latencies and counters, readable in process through metrics.snapshot()
+  if metrics is None:
+    metrics = Metrics()
 
-  results_1 = {
-    "hand_landmarks": None,
-    "gesture": None
-  }
+  print("========== Running Hand Tracking ==========")
 
-  # Callback functions
-  def result_callback_0(result: GestureRecognizerResult, output_image: mp.Image, timestamp_ms: int): # type: ignore
-    # If a hand is detected assing hand landmarker result to results dictionary
-    if len(result.hand_landmarks) > 0 and len(result.gestures) > 0:
-      results_0["hand_landmarks"] = result.hand_landmarks[0]
-      results_0["gesture"] = result.gestures[0]
+  # Every session is recorded to its own directory
+  if record is not None and session_exists(record):
+    print(f"{record} already holds a recorded session, choose another directory")
+    print("========== Exiting Hand Tracking ==========")
+    return
+
+  # Load projection matrices once for the whole session
+  triangulator = load_triangulator(rectified)
+
+  if triangulator is None:
+    print("========== Exiting Hand Tracking ==========")
+    return
+
+  if mode == "process":
+    specs = create_camera_specs(source)
+
+    if specs is None:
+      print("========== Exiting Hand Tracking ==========")
+      return
+
+    cameras = len(specs)
+  else:
+    # Open frame source, live cameras from the .env file by default
+    capture = create_frame_source(source, realtime)
+    cameras = capture.cameras
+
+  # Every camera of the rig needs its projection matrix
+  if cameras > len(triangulator.P):
+    print(f"Camera parameters hold {len(triangulator.P)} cameras but the rig has {cameras}, calibrate the cameras again")
+
+    if mode != "process":
+      capture.release()
+    print("========== Exiting Hand Tracking ==========")
+    return
+
+  # One frame period lets cameras that are out of phase still pair every frame, without pairing frames a whole period apart
+  if match_tolerance is None:
+    if mode == "process":
+      fps = min(spec[2] if spec[0] == "images" else DEFAULT_FPS for spec in specs)
     else:
-      results_0["hand_landmarks"] = None
-      results_0["gesture"] = None
-
-  def result_callback_1(result: GestureRecognizerResult, output_image: mp.Image, timestamp_ms: int): # type: ignore
-    # If a hand is detected assing hand landmarker result to results dictionary
-    if len(result.hand_landmarks) > 0 and len(result.gestures) > 0:
-      results_1["hand_landmarks"] = result.hand_landmarks[0]
-      results_1["gesture"] = result.gestures[0]
+      fps = capture.fps
+
+    match_tolerance = 1.0 / fps
+
+  # Follow every submitted frame until its result arrives
+  trackers = [InferenceTracker(metrics) for _ in range(cameras)]
+
+  # Double buffered results, written by MediaPipe threads or worker messages and read by the main loop
+  stores = [ResultStore() for _ in range(cameras)]
+
+  # Regions of interest around the hand, results are mapped back to full frame coordinates
+  rois = [RoiTracker(FRAME_WIDTH, FRAME_HEIGHT) if roi else None for _ in range(cameras)]
+
+  # Recognizer options, everything but the model also keys cached results
+  options = recognizer_options(num_hands, roi)
+
+  # Worker processes open their own caches
+  caches = [None] * cameras
+  if inference_cache is not None and mode != "process":
+    caches = [InferenceCache(cache_path(inference_cache, camera), options["model_path"], cache_settings(options)) for camera in range(cameras)]
+
+  # Cache keys of the frames waiting for their results, by timestamp
+  cache_keys = [OrderedDict() for _ in range(cameras)]
+
+  def store_result(camera: int, result, timestamp_ms: int):
+    capture_time = trackers[camera].arrived(timestamp_ms)
+    hand_landmarks = result.hand_landmarks
+
+    # Landmarks are normalized to the region the frame was cropped to
+    if rois[camera] is not None:
+      hand_landmarks = rois[camera].to_frame(hand_landmarks, rois[camera].region_of(timestamp_ms))
+      rois[camera].update(hand_landmarks)
+
+    key = cache_keys[camera].pop(timestamp_ms, None)
+    if key is not None:
+      caches[camera].put(key, landmarks_to_xyz(hand_landmarks), result.gestures)
+
+    stores[camera].put(timestamp_ms, capture_time, hand_landmarks, result.gestures)
+
+  # Callback functions
+  def result_callback(camera: int):
+    def callback(result: GestureRecognizerResult, output_image: mp.Image, timestamp_ms: int): # type: ignore
+      # Keep the whole result together with the capture time of its frame
+      store_result(camera, result, timestamp_ms)
+
+    return callback
+
+  if mode == "process":
+    # Worker processes open the cameras and load their own recognizers
+    worker_options = dict(options, inference_stride=inference_stride, inference_cache=inference_cache)
+    workers = InferenceWorkers(specs, worker_options, realtime)
+
+    if not workers.start():
+      print(workers.error)
+      workers.release()
+      print("========== Exiting Hand Tracking ==========")
+      return
+
+    print("Inference workers are running")
+  else:
+    # If any of the cameras is not detected, terminate program
+    for camera in range(cameras):
+      if not capture.isOpened(camera):
+        print(f"Can't open camera {camera}")
+        capture.release()
+        exit()
+
+    for camera in range(cameras):
+      print(f"Camera {camera} is working")
+
+    # Hand landmarker instances are kept between sessions, usually they were built while the menu was idle
+    recognizer_pool = get_recognizer_pool()
+    callbacks = [result_callback(camera) for camera in range(cameras)]
+    landmarkers = recognizer_pool.acquire(options, callbacks)
+
+  # Live cameras the session was started with, a changed id or frame size reopens only that camera
+  live_ids = config.camera_ids() if mode != "process" and isinstance(capture, StereoCapture) else None
+  live_size = (FRAME_WIDTH, FRAME_HEIGHT)
+
+  def apply_settings(changed: set) -> bool:
+    # Rebuild only what the changed settings affect, returns False when the session can't go on
+    nonlocal options, landmarkers, live_ids, live_size
+
+    if mode == "process":
+      print("Worker processes keep their settings until the next session")
+      return True
+
+    if changed & THRESHOLD_SETTINGS:
+      # Recognizers are rebuilt with the new thresholds, their cached results no longer apply
+      options = recognizer_options(num_hands, roi)
+      landmarkers = recognizer_pool.acquire(options, callbacks)
+
+      for camera in range(cameras):
+        cache_keys[camera].clear()
+
+        if caches[camera] is not None:
+          caches[camera].close()
+          caches[camera] = InferenceCache(cache_path(inference_cache, camera), options["model_path"], cache_settings(options))
+
+      print("Recognizers rebuilt with the new confidence thresholds")
+
+    if changed & CAPTURE_SETTINGS and live_ids is not None:
+      camera_ids = config.camera_ids()
+      frame_size = config.frame_size()
+
+      if len(camera_ids) != cameras:
+        print("Number of cameras changed, it applies to the next session")
+        return True
+
+      # Intrinsics and rectification only hold for the calibrated frame size, other sizes wait for a new calibration
+      if frame_size != live_size and frame_size != triangulator.calibration.image_size:
+        print(f"Frame size {frame_size[0]}x{frame_size[1]} does not match the calibration, calibrate the cameras again, it applies to the next session")
+        frame_size = live_size
+
+      for camera in range(cameras):
+        if camera_ids[camera] == live_ids[camera] and frame_size == live_size:
+          continue
+
+        if not capture.reopen(camera, camera_ids[camera], *frame_size):
+          print(capture.error)
+          return False
+
+        print(f"Camera {camera} reopened with the new settings")
+
+      live_ids = camera_ids
+      live_size = frame_size
+
+    return True
+
+  # Changed keys of every settings change, subscribers are called from the thread that saved them
+  settings_changes = queue.SimpleQueue()
+  config.subscribe(settings_changes.put)
+  last_reload = time.monotonic()
+
+  # Threads and devices are released in the finally block, also when the loop raises
+  exporter = None
+  preview = None
+  recorder = None
+
+  try:
+    # Periodically write metrics to a file when requested
+    if metrics_export is not None:
+      exporter = MetricsExporter(metrics, metrics_export)
+      exporter.start()
+
+    # Preview windows are handled by their own thread
+    window_names = [f"Camera {camera}" for camera in range(cameras)]
+
+    if display == "preview":
+      preview = PreviewWindow(window_names, preview_fps, preview_scale)
+      preview.start()
+
+    # Joint targets go to the simulator from a background thread
+    start_joint_sender(joint_deadband, metrics)
+
+    # Every frame is written to disk from a background thread when recording
+    if record is not None:
+      recorder = SessionRecorder(record, cameras, num_hands, metrics=metrics)
+      recorder.start()
+
+    # Start grabbing frames
+    if mode != "process":
+      capture.start()
+
+    # Frame timestamps initialization
+    frame_timestamps = [0] * cameras
+
+    # Timestamps of the last set of results used for inverse kinematics
+    last_set_timestamps = None
+
+    # Hand pose between results, predicted from the previous ones
+    pose_filter = PoseFilter() if filter_pose else None
+
+    # Persistent ids of the triangulated hands, and the id of the hand the robot follows
+    tracks = HandTracks()
+    followed_id = None
+
+    # Capture time of the oldest frame of the last set that moved the robot
+    set_capture_time = None
+
+    # Frames read so far, only every inference_stride frame is recognized
+    frame_index = 0
+
+    while stop_event is None or not stop_event.is_set():
+      # Edits of the .env file made outside the GUI are checked once per second
+      if time.monotonic() - last_reload >= 1.0:
+        config.reload()
+        last_reload = time.monotonic()
+
+      changed = set()
+      while not settings_changes.empty():
+        changed |= settings_changes.get()
+
+      if changed and not apply_settings(changed):
+        break
+
+      if mode == "process":
+        # Wait for new results from the workers
+        with metrics.time("capture"):
+          ret = workers.poll(stores, metrics)
+
+        if not ret:
+          print(workers.error)
+          break
+
+        # Frames only leave shared memory when they are going to be shown
+        frames = [None] * cameras
+        if display != "headless":
+          frames = [workers.frame(camera) for camera in range(cameras)]
+
+        frame_size = workers.frame_size(0)
+        if frame_size is None:
+          continue
+
+        frame_width, frame_height = frame_size
+      else:
+        # Capture closest in time set of frames
+        with metrics.time("capture"):
+          ret, frames = capture.read_all()
+
+        # If a frame is not read correctly, terminate program
+        if not ret:
+          print(capture.error)
+          break
+
+        metrics.record("skew", abs(capture.skew))
+
+        # Update timestamp with capture time in ms, MediaPipe needs them strictly increasing
+        frame_timestamps = [max(int(timestamp * 1000), frame_timestamp + 1) for timestamp, frame_timestamp in zip(capture.timestamps, frame_timestamps)]
+
+        # Recorded sources may have a different size than the one set in the .env file
+        frame_height, frame_width = frames[0].shape[:2]
+
+        # Only every inference_stride frame goes to the recognizers
+        if frame_index % inference_stride == 0:
+          with metrics.time("inference_submit"):
+            for camera in range(cameras):
+              # Frames recognized in an earlier run take their results from the cache
+              if caches[camera] is not None:
+                key = caches[camera].key(frames[camera])
+                cached = caches[camera].get(key)
+
+                if cached is not None:
+                  landmarks, gestures = cached
+
+                  if roi:
+                    rois[camera].update(landmarks)
+
+                  stores[camera].put(frame_timestamps[camera], capture.timestamps[camera], landmarks, gestures)
+                  metrics.increment("inference_cache_hits")
+                  continue
+
+                metrics.increment("inference_cache_misses")
+
+                # Frames dropped by the recognizer never get a result, only the newest keys are kept
+                cache_keys[camera][frame_timestamps[camera]] = key
+                if len(cache_keys[camera]) > 64:
+                  cache_keys[camera].popitem(last=False)
+
+              image = frames[camera]
+
+              # Crop around the tracked hand, or downscale the full frame while it is lost
+              if roi:
+                rois[camera].resize(frame_width, frame_height)
+                image, _ = rois[camera].prepare(frames[camera], frame_timestamps[camera])
+
+              # Convert frames to MediaPipe image object
+              mp_image = mp.Image(image_format = mp.ImageFormat.SRGB, data = image)
+
+              # Detect hand ladmarks
+              trackers[camera].submit(frame_timestamps[camera], capture.timestamps[camera])
+              landmarkers[camera].recognize_async(mp_image, frame_timestamps[camera])
+
+        frame_index += 1
+
+      # Newest results of every camera taken from frames captured at the same moment
+      results = match_results(stores, match_tolerance)
+
+      # Only a set that has not been used yet produces a new joint command
+      new_set = results is not None and tuple(result.timestamp_ms for result in results) != last_set_timestamps
+
+      if results is None and sum(has_hand(store.latest()) for store in stores) >= 2:
+        metrics.increment("unmatched_results")
+
+      if new_set:
+        last_set_timestamps = tuple(result.timestamp_ms for result in results)
+        metrics.record("result_age", result_age(results))
+
+        # Workers capture independently, their skew shows in the matched results
+        if mode == "process":
+          capture_times = [result.capture_time for result in results]
+          metrics.record("skew", max(capture_times) - min(capture_times))
+
+      # Ids of the hands triangulated from a new set, and joint targets of this frame
+      hand_ids = []
+      poses = None
+      joints = None
+
+      # If landmarks are detected by two cameras or more in a new set, compute the pose of the hands
+      if new_set and sum(has_hand(result) for result in results) >= 2:
+        # Every frame of the set describes the hands at about the same moment
+        set_time = sum(result.capture_time for result in results) / cameras
+
+        fallback_points = triangulator.fallback_points
+
+        with metrics.time("triangulation"):
+          hands_coords, hands_rotation, hands_landmarks, _ = hand_poses([result.hand_landmarks for result in results], frame_width, frame_height, triangulator)
+          hand_ids = tracks.update(hands_coords, set_time)
+
+        # Landmarks off the epipolar lines went through the DLT, many of them point to a stale calibration
+        if triangulator.fallback_points > fallback_points:
+          metrics.increment("triangulation_fallbacks", triangulator.fallback_points - fallback_points)
+
+        poses = (hands_coords, hands_rotation, hands_landmarks)
+
+        if len(hand_ids) == 0:
+          metrics.increment("unassociated_hands")
+
+      if len(hand_ids) > 0:
+        # The robot keeps following the same hand while it is tracked
+        lead = int(np.argmin(hand_ids))
+        if hand_ids[lead] != followed_id:
+          followed_id = hand_ids[lead]
+
+          if pose_filter is not None:
+            pose_filter.reset()
+
+        hand_coords = hands_coords[lead]
+        hand_rotation = list(hands_rotation[lead])
+
+        # Oldest frame behind the joint commands, the sender records motion to output once they are sent
+        set_capture_time = min(result.capture_time for result in results)
+
+        if pose_filter is None:
+          # Inverse kinematics
+          with metrics.time("ik"):
+            joints = inverse_kinematics(hand_coords, hand_rotation, set_capture_time)
+        else:
+          pose_filter.update(hand_coords, hand_rotation, set_time)
+
+        if result_age(results) > stale_after:
+          metrics.increment("stale_results")
+
+      # Every frame commands the pose expected right now, until results stop for too long
+      if pose_filter is not None:
+        with metrics.time("filter"):
+          pose = pose_filter.predict(time.monotonic())
+
+        if pose is not None:
+          # Inverse kinematics
+          with metrics.time("ik"):
+            joints = inverse_kinematics(*pose, set_capture_time)
+
+      if recorder is not None:
+        with metrics.time("record"):
+          recorder.append(time.monotonic(), results if new_set else None, poses, hand_ids if poses is not None else None, joints)
+
+      # Latest results of each camera for display
+      latest = [store.latest() for store in stores]
+
+      if display == "window":
+        with metrics.time("render"):
+          # If landmarks are detected, draw the latest ones of every hand into frame
+          for name, frame, result in zip(window_names, frames, latest):
+            if frame is None:
+              continue
+
+            if has_hand(result):
+              draw_landmarks(frame, frame_width, frame_height, result.hand_landmarks)
+              write_gesture(frame, result.gestures[0])
+
+            cv.imshow(name, frame)
+
+          # Get pressed key
+          pressed_key = cv.waitKey(1) & 0xFF
+
+        metrics.frame()
+
+        # Condition to exit loop
+        if pressed_key == ord('q') or pressed_key == ord('Q'):
+          break
+      elif display == "preview":
+        # Hand frames and results over, drawing happens in the preview thread
+        with metrics.time("render"):
+          for name, frame, result in zip(window_names, frames, latest):
+            if frame is not None:
+              preview.submit(name, frame, result.hand_landmarks if has_hand(result) else None, result.gestures[0] if has_hand(result) else None)
+
+        metrics.frame()
+
+        # Condition to exit loop
+        if preview.quit_event.is_set():
+          break
+      else:
+        metrics.frame()
+  finally:
+    config.unsubscribe(settings_changes.put)
+
+    # Release captures and recognizers and destroy windows
+    if mode == "process":
+      workers.release()
     else:
-      results_1["hand_landmarks"] = None
-      results_1["gesture"] = None
-
-  # Hand landmarker options
-  options_0 = GestureRecognizerOptions(
-    base_options = BaseOptions(model_asset_path = model_path),
-    running_mode = VisionRunningMode.LIVE_STREAM,
-    num_hands = 1,
-    min_hand_detection_confidence = MIN_HAND_DETECTION_CONFIDENCE,
-    min_hand_presence_confidence = MIN_HAND_PRESENCE_CONFIDENCE,
-    min_tracking_confidence = MIN_TRACKING_CONFIDENCE,
-    result_callback = result_callback_0
-  )
-
-  options_1 = GestureRecognizerOptions(
-    base_options = BaseOptions(model_asset_path = model_path),
-    running_mode = VisionRunningMode.LIVE_STREAM,
-    num_hands = 1,
-    min_hand_detection_confidence = MIN_HAND_DETECTION_CONFIDENCE,
-    min_hand_presence_confidence = MIN_HAND_PRESENCE_CONFIDENCE,
-    min_tracking_confidence = MIN_TRACKING_CONFIDENCE,
-    result_callback = result_callback_1
-  )
+      capture.release()
+      recognizer_pool.release()
 
-  print("========== Running Hand Tracking ==========")
-  
-  # Set webcam capture
-  capture_0 = cv.VideoCapture(CAMERA_0_ID, cv.CAP_DSHOW)
-  capture_1 = cv.VideoCapture(CAMERA_1_ID, cv.CAP_DSHOW)
-
-  # Set frame width and height
-  capture_0.set(cv.CAP_PROP_FRAME_WIDTH, FRAME_WIDTH)
-  capture_0.set(cv.CAP_PROP_FRAME_HEIGHT, FRAME_HEIGHT)
-  capture_1.set(cv.CAP_PROP_FRAME_WIDTH, FRAME_WIDTH)
-  capture_1.set(cv.CAP_PROP_FRAME_HEIGHT, FRAME_HEIGHT)
-
-  # If either of the cameras is not detected, terminate program
-  if not capture_0.isOpened():
-    print("Can't open camera 0")
-    exit()
-  if not capture_1.isOpened():
-    print("Can't open camera 1")
-    exit()
-
-  print("Camera 0 is working")
-  print("Camera 1 is working")
-
-  # Create hand landmarker instances
-  landmarker_0 = GestureRecognizer.create_from_options(options_0)
-  landmarker_1 = GestureRecognizer.create_from_options(options_1)
-
-  # Frame timestamps initialization
-  frame_timestamp_0 = 0
-  frame_timestamp_1= 0
-
-  while True:
-    # Capture frame
-    ret_0, frame_0 = capture_0.read()
-    ret_1, frame_1 = capture_1.read()
-
-    # Update timestamp
-    frame_timestamp_0 += 1
-    frame_timestamp_1 += 1    
-
-    # If a frame is not read correctly, terminate program
-    if not ret_0:
-      print("Can't receive frame from camera 0")
-      break
-    if not ret_1:
-      print("Can't receive frame from camera 1")
-      break
-
-    # Convert frames to MediaPipe image object    
-    mp_image_0 = mp.Image(image_format = mp.ImageFormat.SRGB, data = frame_0)
-    mp_image_1 = mp.Image(image_format = mp.ImageFormat.SRGB, data = frame_1)
-
-    # Detect hand ladmarks
-    landmarker_0.recognize_async(mp_image_0, frame_timestamp_0)
-    landmarker_1.recognize_async(mp_image_1, frame_timestamp_1)
-
-    # If landmarks are detected, draw them into frame
-    if results_0["hand_landmarks"] and results_0["gesture"]:
-      draw_landmarks(frame_0, FRAME_WIDTH, FRAME_HEIGHT, results_0["hand_landmarks"])
-      write_gesture(frame_0, results_0["gesture"])
-
-    if results_1["hand_landmarks"] and results_1["gesture"]:
-      draw_landmarks(frame_1, FRAME_WIDTH, FRAME_HEIGHT, results_1["hand_landmarks"])
-      write_gesture(frame_1, results_1["gesture"])
-
-    # If both landmarks are detected, triangulate position of center point
-    if results_0["hand_landmarks"] and results_1["hand_landmarks"]:
-      center_0_x = int(((results_0["hand_landmarks"][0].x + results_0["hand_landmarks"][9].x) / 2) * FRAME_WIDTH)
-      center_0_y = int(((results_0["hand_landmarks"][0].y + results_0["hand_landmarks"][9].y) / 2) * FRAME_HEIGHT)
-      center_0 = [center_0_x, center_0_y]
-
-      center_1_x = int(((results_1["hand_landmarks"][0].x + results_1["hand_landmarks"][9].x) / 2) * FRAME_WIDTH)
-      center_1_y = int(((results_1["hand_landmarks"][0].y + results_1["hand_landmarks"][9].y) / 2) * FRAME_HEIGHT)
-      center_1 = [center_1_x, center_1_y]
-
-      # Get rotation of hand in Z coordinate
-      point_0 = [int(results_0["hand_landmarks"][0].x * FRAME_WIDTH), int(results_0["hand_landmarks"][0].y * FRAME_HEIGHT)]
-      point_9 = [int(results_0["hand_landmarks"][9].x * FRAME_WIDTH), int(results_0["hand_landmarks"][9].y * FRAME_HEIGHT)]
-      z_rotation = hand_orientation(point_0, point_9)
-
-      # Get rotation of hand in Y coordinate
-      point_5_0 = [int(results_0["hand_landmarks"][5].x * FRAME_WIDTH), int(results_0["hand_landmarks"][5].y * FRAME_HEIGHT)]
-      point_5_1 = [int(results_1["hand_landmarks"][5].x * FRAME_WIDTH), int(results_1["hand_landmarks"][5].y * FRAME_HEIGHT)]
-
-      point_17_0 = [int(results_0["hand_landmarks"][17].x * FRAME_WIDTH), int(results_0["hand_landmarks"][17].y * FRAME_HEIGHT)]
-      point_17_1 = [int(results_1["hand_landmarks"][17].x * FRAME_WIDTH), int(results_1["hand_landmarks"][17].y * FRAME_HEIGHT)]
-
-      point_5_coords = DLT(point_5_0, point_5_1)
-      point_17_coords = DLT(point_17_0, point_17_1)
-      y_rotation = hand_orientation([point_5_coords[2], point_5_coords[0]], [point_17_coords[2], point_17_coords[0]]) # atan2(Z, X)
-
-      # Get rotation of hand in X coordinate
-      point_0_0 = [int(results_0["hand_landmarks"][0].x * FRAME_WIDTH), int(results_0["hand_landmarks"][0].y * FRAME_HEIGHT)]
-      point_0_1 = [int(results_1["hand_landmarks"][0].x * FRAME_WIDTH), int(results_1["hand_landmarks"][0].y * FRAME_HEIGHT)]
-
-      point_9_0 = [int(results_0["hand_landmarks"][9].x * FRAME_WIDTH), int(results_0["hand_landmarks"][9].y * FRAME_HEIGHT)]
-      point_9_1 = [int(results_1["hand_landmarks"][9].x * FRAME_WIDTH), int(results_1["hand_landmarks"][9].y * FRAME_HEIGHT)]
-      
-      point_0_coords = DLT(point_0_0, point_0_1)
-      point_9_coords = DLT(point_9_0, point_9_1) 
-      x_rotation = hand_orientation([point_0_coords[2], point_0_coords[1]], [point_9_coords[2], point_9_coords[1]]) # atan2(Z, Y)
-
-      # Inverse kinematics
-      hand_coords = DLT(center_0, center_1)
-      inverse_kinematics(hand_coords, [x_rotation, y_rotation, z_rotation])
-
-    cv.imshow("Camera 0", frame_0)
-    cv.imshow("Camera 1", frame_1)
-
-    # Get pressed key
-    pressed_key = cv.waitKey(1) & 0xFF
-
-    # Condition to exit loop
-    if pressed_key == ord('q') or pressed_key == ord('Q'):
-      break
-
-  # Release captures and destroy windows
-  capture_0.release()
-  capture_1.release()
-  cv.destroyAllWindows()
-
-  print("========== Exiting Hand Tracking ==========")  
\ No newline at end of file
+      for cache in caches:
+        if cache is not None:
+          cache.close()
+
+    if display == "window":
+      cv.destroyAllWindows()
+    elif preview is not None:
+      preview.stop()
+
+    if exporter is not None:
+      exporter.stop()
+
+    # Simulator connection stays open for the next session
+    stop_joint_sender()
+
+    if recorder is not None:
+      recorder.stop()
+
+  print(f"Average FPS: {metrics.snapshot()['fps']:.1f}")
+
+  print("========== Exiting Hand Tracking ==========")
\ No newline at end of file
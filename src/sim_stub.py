@@ -0,0 +1,94 @@
+import re
+import time
+import argparse
+
+import zmq
+
+try:
+  import cbor2 as cbor
+except ModuleNotFoundError:
+  import cbor
+
+# Functions and constants of the "sim" object the tracking code uses
+SIM_INFO = {
+  "getObject": {"func": ""},
+  "getScript": {"func": ""},
+  "executeScriptString": {"func": ""},
+  "setJointTargetPosition": {"func": ""},
+  "scripttype_sandbox": {"const": 6}
+}
+
+# Lua expressions used for numbers without a literal
+LUA_NUMBERS = {"0/0": float("nan"), "math.huge": float("inf"), "-math.huge": float("-inf")}
+
+# Object handles of the robot joints
+JOINT_HANDLES = {f"./joint_{joint}": 10 + joint for joint in range(6)}
+
+def sim_stub(host: str = "127.0.0.1", port: int = 23000, delay: float = 0.0, batch: bool = True):
+  # Stand-in for the CoppeliaSim ZMQ Remote API server, prints the joint targets it receives
+  context = zmq.Context()
+  socket = context.socket(zmq.REP)
+  socket.bind(f"tcp://{host}:{port}")
+
+  # Joint handle -> target position
+  targets = {}
+  round_trips = 0
+
+  print(f"========== Simulator stand-in on {host}:{port} ==========")
+
+  try:
+    while True:
+      request = cbor.loads(socket.recv())
+      function = request.get("func")
+      args = request.get("args") or []
+      round_trips += 1
+
+      # Simulated round-trip latency of the real simulator
+      if delay > 0:
+        time.sleep(delay)
+
+      response = {"success": True, "ret": []}
+
+      if function == "zmqRemoteApi.info":
+        response["ret"] = [SIM_INFO]
+      elif function == "sim.getObject":
+        if args[0] in JOINT_HANDLES:
+          response["ret"] = [JOINT_HANDLES[args[0]]]
+        else:
+          response = {"success": False, "err": f"object does not exist: {args[0]}"}
+      elif function == "sim.getScript":
+        if batch:
+          response["ret"] = [1]
+        else:
+          response = {"success": False, "err": "no sandbox script"}
+      elif function == "sim.executeScriptString":
+        # Only the batched joint command script is understood
+        handles = re.search(r"local h = \{(.*?)\}", args[0])
+        values = re.search(r"local v = \{(.*?)\}", args[0])
+        for handle, value in zip(handles.group(1).split(","), values.group(1).split(",")):
+          targets[int(handle)] = LUA_NUMBERS[value.strip()] if value.strip() in LUA_NUMBERS else float(value)
+        print(f"[{round_trips}] batch {[round(targets[handle], 3) for handle in sorted(targets)]}")
+      elif function == "sim.setJointTargetPosition":
+        targets[args[0]] = args[1]
+        print(f"[{round_trips}] joint {args[0]} {args[1]:.3f}")
+      elif function != "zmqRemoteApi.require":
+        response = {"success": False, "err": f"unknown function: {function}"}
+
+      socket.send(cbor.dumps(response))
+  except KeyboardInterrupt:
+    pass
+  finally:
+    socket.close()
+    context.term()
+
+  print("========== Exiting Simulator stand-in ==========")
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Stand-in CoppeliaSim ZMQ Remote API server for joint commands")
+  parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+  parser.add_argument("--port", type=int, default=23000, help="port to listen on")
+  parser.add_argument("--delay", type=float, default=0.0, help="seconds added to every round-trip")
+  parser.add_argument("--no-batch", action="store_true", help="refuse batched commands to exercise the per joint fallback")
+  args = parser.parse_args()
+
+  sim_stub(args.host, args.port, args.delay, not args.no_batch)
\ No newline at end of file
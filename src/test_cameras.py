@@ -1,68 +1,50 @@
-import os
-
-import dotenv
 import cv2 as cv
 
-def test_cameras():
-  print("========== Running Test Cameras ==========")
-
-  # Load .env file
-  dotenv_file = dotenv.find_dotenv()
-  dotenv.load_dotenv(dotenv_file)
-
-  # Load environment variables
-  CAMERA_0_ID = int(os.getenv("CAMERA_0_ID"))
-  CAMERA_1_ID = int(os.getenv("CAMERA_1_ID"))
-  FRAME_WIDTH = int(os.getenv("FRAME_WIDTH"))
-  FRAME_HEIGHT = int(os.getenv("FRAME_HEIGHT"))  
-  
-  # Set webcam capture
-  capture_0 = cv.VideoCapture(CAMERA_0_ID, cv.CAP_DSHOW)
-  capture_1 = cv.VideoCapture(CAMERA_1_ID, cv.CAP_DSHOW)
-
-  # Set frame width and height
-  capture_0.set(cv.CAP_PROP_FRAME_WIDTH, FRAME_WIDTH)
-  capture_0.set(cv.CAP_PROP_FRAME_HEIGHT, FRAME_HEIGHT)
-  capture_1.set(cv.CAP_PROP_FRAME_WIDTH, FRAME_WIDTH)
-  capture_1.set(cv.CAP_PROP_FRAME_HEIGHT, FRAME_HEIGHT)
-
-  # If either of the cameras is not detected, terminate program
-  if not capture_0.isOpened():
-    print("Can't open camera 0")
-    exit()
-  if not capture_1.isOpened():
-    print("Can't open camera 1")
-    exit()
+from utils.frame_source import create_frame_source
 
-  print("Camera 0 is working")
-  print("Camera 1 is working")    
-
-  while True:
-    # Capture frame
-    ret_0, frame_0 = capture_0.read()
-    ret_1, frame_1 = capture_1.read()
-
-    # If a frame is not read correctly, terminate program
-    if not ret_0:
-      print("Can't receive frame from camera 0")
-      break
-    if not ret_1:
-      print("Can't receive frame from camera 1")
-      break
-      
-    cv.imshow("Camera 0", frame_0)
-    cv.imshow("Camera 1", frame_1)
-
-    # Get pressed key
-    pressed_key = cv.waitKey(1) & 0xFF
-
-    # Condition to exit loop
-    if pressed_key == ord('q') or pressed_key == ord('Q'):
-      break
+def test_cameras(source=None, stop_event=None):
+  print("========== Running Test Cameras ==========")
 
-  # Release captures and destroy windows
-  capture_0.release()
-  capture_1.release()
-  cv.destroyAllWindows()
+  # Open frame source, live cameras from the .env file by default
+  capture = create_frame_source(source)
+
+  # If any of the cameras is not detected, terminate program
+  for camera in range(capture.cameras):
+    if not capture.isOpened(camera):
+      print(f"Can't open camera {camera}")
+      capture.release()
+      exit()
+
+  for camera in range(capture.cameras):
+    print(f"Camera {camera} is working")
+
+  # Start grabbing frames
+  capture.start()
+
+  # Cameras and windows are released even when the loop raises
+  try:
+    # stop_event ends the loop when run from the GUI
+    while stop_event is None or not stop_event.is_set():
+      # Capture closest in time set of frames
+      ret, frames = capture.read_all()
+
+      # If a frame is not read correctly, terminate program
+      if not ret:
+        print(capture.error)
+        break
+
+      for camera, frame in enumerate(frames):
+        cv.imshow(f"Camera {camera}", frame)
+
+      # Get pressed key
+      pressed_key = cv.waitKey(1) & 0xFF
+
+      # Condition to exit loop
+      if pressed_key == ord('q') or pressed_key == ord('Q'):
+        break
+  finally:
+    # Release captures and destroy windows
+    capture.release()
+    cv.destroyAllWindows()
 
   print("========== Exiting Test Cameras ==========")
\ No newline at end of file
@@ -0,0 +1,193 @@
+import os
+
+import cv2 as cv
+import numpy as np
+
+# Version of the calibration bundle layout, bumped whenever its arrays change
+# 2 stores any number of cameras, each with its pose relative to camera 0
+CALIBRATION_VERSION = 2
+
+# Path for camera parameters
+dirname = os.path.dirname(__file__)
+camera_parameters_path = os.path.join(dirname, "../camera_parameters")
+calibration_path = os.path.join(camera_parameters_path, "calibration.npz")
+
+# Calibration shared by every caller of the process
+_calibration = None
+
+def projection_matrix(mtx, R, T):
+  # Projection matrix of a camera whose pose relative to camera 0 is R, T
+  RT = np.concatenate([R, np.reshape(T, (3, 1))], axis = -1)
+
+  return mtx @ RT
+
+def fundamental_matrix(mtx_0, mtx_1, R, T):
+  # F = K_1^-T [T]x R K_0^-1
+  t = np.asarray(T, dtype=np.float64).ravel()
+  T_x = np.array([[0, -t[2], t[1]], [t[2], 0, -t[0]], [-t[1], t[0], 0]])
+  F = np.linalg.inv(mtx_1).T @ T_x @ R @ np.linalg.inv(mtx_0)
+
+  # F[2, 2] is zero on an ideally rectified rig, epipolar distances do not depend on the scale of F
+  return F / np.linalg.norm(F)
+
+def relative_pose(R_i, T_i, R_j, T_j):
+  # Pose of camera j relative to camera i, from the poses of both relative to camera 0
+  R = R_j @ R_i.T
+  T = np.reshape(T_j, (3, 1)) - R @ np.reshape(T_i, (3, 1))
+
+  return R, T
+
+class Calibration():
+  # Calibration of every camera of the rig with everything the runtime needs precomputed
+  def __init__(self, arrays):
+    self.version = int(arrays["version"])
+    self.image_size = tuple(int(size) for size in arrays["image_size"])
+
+    # Bundles before version 2 only hold two cameras and the pose of camera 1 as R, T
+    self.cameras = int(arrays["cameras"]) if "cameras" in arrays else 2
+    cameras = range(self.cameras)
+
+    self.mtx = [arrays[f"mtx_{camera}"] for camera in cameras]
+    self.dist = [arrays[f"dist_{camera}"] for camera in cameras]
+    self.P = [arrays[f"P_{camera}"] for camera in cameras]
+
+    # Pose of every camera relative to camera 0, camera 0 itself is the identity
+    self.rotations = [np.eye(3)] + [arrays.get(f"R_{camera}", arrays["R"]) for camera in cameras[1:]]
+    self.translations = [np.zeros((3, 1))] + [arrays.get(f"T_{camera}", arrays["T"]) for camera in cameras[1:]]
+
+    # Pose of camera 1 and fundamental matrix of the pair 0, 1
+    # F is computed again, bundles saved before it was scaled by its norm may hold NaN for rectified rigs
+    self.R = arrays["R"]
+    self.T = arrays["T"]
+    self.F = fundamental_matrix(self.mtx[0], self.mtx[1], self.R, self.T)
+
+    # Rectification rotations, rectified projection matrices and disparity to depth matrix of the pair 0, 1
+    self.R_rect = [arrays.get("R_0_rect"), arrays.get("R_1_rect")]
+    self.P_rect = [arrays.get("P_0_rect"), arrays.get("P_1_rect")]
+    self.Q = arrays.get("Q")
+
+    # Corners of the views used by the calibration, an incremental calibration starts from them
+    # Cameras that did not see the board in a view are stored as NaN and read back as None
+    self.corners = []
+    if "corners_0" in arrays:
+      columns = [arrays[f"corners_{camera}"] for camera in cameras]
+      self.corners = [tuple(None if np.isnan(corners).any() else corners for corners in view) for view in zip(*columns)]
+
+    # Fundamental matrices between cameras are computed on demand
+    self.fundamentals = {(0, 1): self.F}
+
+  def fundamental(self, camera_i: int, camera_j: int):
+    # F such that x_j^T F x_i = 0 for lens corrected pixels of the same point in cameras i and j
+    if (camera_i, camera_j) not in self.fundamentals:
+      R, T = relative_pose(self.rotations[camera_i], self.translations[camera_i], self.rotations[camera_j], self.translations[camera_j])
+      self.fundamentals[(camera_i, camera_j)] = fundamental_matrix(self.mtx[camera_i], self.mtx[camera_j], R, T)
+
+    return self.fundamentals[(camera_i, camera_j)]
+
+  def undistort_points(self, camera: int, points):
+    # Lens corrected pixel coordinates of any number of points, keeping their leading shape
+    points = np.asarray(points, dtype=np.float64)
+    leading_shape = points.shape[:-1]
+
+    # OpenCV returns None instead of an empty array, as for a camera that saw no hands
+    if points.size == 0:
+      return points.reshape(leading_shape + (2,))
+
+    undistorted = cv.undistortPoints(points.reshape(-1, 1, 2), self.mtx[camera], self.dist[camera], P=self.mtx[camera])
+
+    return undistorted.reshape(leading_shape + (2,))
+
+  def rectify_points(self, camera: int, points):
+    # Lens corrected pixel coordinates in the rectified image of a camera, for (N, 2) points
+    points = np.asarray(points, dtype=np.float64)
+    rectified = cv.undistortPoints(points.reshape(-1, 1, 2), self.mtx[camera], self.dist[camera], R=self.R_rect[camera], P=self.P_rect[camera])
+
+    return rectified.reshape(-1, 2)
+
+def build_calibration(mtx, dist, R, T, image_size, corners=None) -> dict:
+  # Arrays of a calibration bundle, with the rectification of the pair 0, 1 precomputed
+  # mtx and dist hold every camera, R and T the pose of every camera relative to camera 0
+  cameras = len(mtx)
+
+  arrays = {
+    "version": np.array(CALIBRATION_VERSION),
+    "image_size": np.array(image_size),
+    "cameras": np.array(cameras),
+    "R": R[1], "T": T[1],
+    "F": fundamental_matrix(mtx[0], mtx[1], R[1], T[1])
+  }
+
+  for camera in range(cameras):
+    arrays.update({
+      f"mtx_{camera}": mtx[camera], f"dist_{camera}": dist[camera],
+      f"R_{camera}": R[camera], f"T_{camera}": T[camera],
+      f"P_{camera}": projection_matrix(mtx[camera], R[camera], T[camera])
+    })
+
+  if image_size is not None:
+    R_0_rect, R_1_rect, P_0_rect, P_1_rect, Q, _, _ = cv.stereoRectify(mtx[0], dist[0], mtx[1], dist[1], tuple(image_size), R[1], T[1], alpha=0)
+
+    arrays.update({
+      "R_0_rect": R_0_rect, "R_1_rect": R_1_rect,
+      "P_0_rect": P_0_rect, "P_1_rect": P_1_rect,
+      "Q": Q
+    })
+
+  if corners:
+    # Views where a camera missed the board are padded with NaN to keep one array per camera
+    shape = next(view[0] for view in corners if view[0] is not None).shape
+
+    for camera in range(cameras):
+      arrays[f"corners_{camera}"] = np.array([np.full(shape, np.nan, np.float32) if view[camera] is None else view[camera] for view in corners])
+
+  return arrays
+
+def save_calibration(mtx, dist, R, T, image_size, corners=None):
+  arrays = build_calibration(mtx, dist, R, T, image_size, corners)
+
+  # Write next to the bundle and swap, a running session never reads a partial file
+  os.makedirs(camera_parameters_path, exist_ok=True)
+  temporary_path = calibration_path + ".tmp.npz"
+  np.savez(temporary_path, **arrays)
+  os.replace(temporary_path, calibration_path)
+
+  # Make sure the next session uses the new calibration
+  reset_calibration()
+
+def load_legacy_calibration():
+  # Separate .npy files written before the bundle existed, frame size and rectification are unknown
+  arrays = {name: np.load(f"{camera_parameters_path}/{name}.npy") for name in ["mtx_0", "dist_0", "mtx_1", "dist_1", "R", "T"]}
+  arrays = build_calibration(
+    [arrays["mtx_0"], arrays["mtx_1"]], [arrays["dist_0"], arrays["dist_1"]],
+    [np.eye(3), arrays["R"]], [np.zeros((3, 1)), arrays["T"]], None
+  )
+  arrays["image_size"] = np.array([0, 0])
+
+  return arrays
+
+def load_calibration() -> Calibration:
+  global _calibration
+
+  # Calibration is only read from disk once per process
+  if _calibration is None:
+    if os.path.exists(calibration_path):
+      with np.load(calibration_path, allow_pickle=False) as bundle:
+        arrays = {name: bundle[name] for name in bundle.files}
+
+      if int(arrays["version"]) > CALIBRATION_VERSION:
+        print("Camera parameters were saved by a newer version, calibrate the camera again")
+        return
+    elif os.path.exists(f"{camera_parameters_path}/mtx_0.npy"):
+      arrays = load_legacy_calibration()
+    else:
+      print("Could not find camera parameters, make sure to calibrate the camera first")
+      return
+
+    _calibration = Calibration(arrays)
+
+  return _calibration
+
+def reset_calibration():
+  # Force the calibration to be reloaded, e.g. after a new calibration
+  global _calibration
+  _calibration = None
\ No newline at end of file
@@ -0,0 +1,128 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2 as cv
+import numpy as np
+
+# Termination criteria
+criteria = (cv.TERM_CRITERIA_EPS + cv.TERM_CRITERIA_MAX_ITER, 30, 0.001)
+
+# Chessboard search is done on images no larger than this, corners are refined on the full image
+DETECTION_SIDE = 640
+
+def chessboard_points(rows: int, columns: int, square_size: float):
+  # Object points of the chessboard corners, in the units of square_size
+  obj_point = np.zeros((rows * columns, 3), np.float32)
+  obj_point[:,:2] = np.mgrid[0:rows, 0:columns].T.reshape(-1, 2)
+
+  return obj_point * square_size
+
+def find_corners(gray, pattern_size):
+  # Refined chessboard corners of a gray scale image, or None if the board is not found
+  scale = min(1.0, DETECTION_SIDE / max(gray.shape))
+  small = gray if scale == 1.0 else cv.resize(gray, None, fx=scale, fy=scale, interpolation=cv.INTER_AREA)
+
+  # Fast check rejects images without a board before the full search
+  ret, corners = cv.findChessboardCorners(small, pattern_size, cv.CALIB_CB_ADAPTIVE_THRESH + cv.CALIB_CB_NORMALIZE_IMAGE + cv.CALIB_CB_FAST_CHECK)
+
+  if not ret:
+    return None
+
+  # Back to full image pixels, taking pixel centers into account
+  corners = ((corners + 0.5) / scale - 0.5).astype(np.float32)
+
+  return cv.cornerSubPix(gray, corners, (11, 11), (-1, -1), criteria)
+
+def check_frames(frames, pattern_size, spill_paths=None):
+  # Corners of every frame of a set, None for cameras that missed the board
+  # The set is only kept when camera 0 and at least one other camera found the board
+  views = [find_corners(cv.cvtColor(frame, cv.COLOR_BGR2GRAY), pattern_size) for frame in frames]
+
+  if views[0] is None or all(corners is None for corners in views[1:]):
+    return None
+
+  # Accepted frames can be kept on disk to calibrate again later
+  if spill_paths is not None:
+    for frame, path in zip(frames, spill_paths):
+      cv.imwrite(path, frame)
+
+  return tuple(views)
+
+def single_thread():
+  # Pool workers already run in parallel, OpenCV threads would compete with them
+  cv.setNumThreads(1)
+
+class CornerCollector():
+  # Checks captured sets of frames for the chessboard in background processes, only corners are kept
+  def __init__(self, pattern_size, spill_directory: str = None, processes: int = 2):
+    self.pattern_size = pattern_size
+
+    # Accepted sets are written to camera_0, camera_1, ... subdirectories, readable as an image source
+    self.spill_directory = spill_directory
+
+    context = multiprocessing.get_context("spawn")
+    self.pool = ProcessPoolExecutor(max_workers=processes, mp_context=context, initializer=single_thread)
+
+    # Sets still being checked as (index, future)
+    self.pending = []
+
+    # (corners_0, corners_1, ...) of every accepted set, None where a camera missed the board
+    self.views = []
+    self.rejected = 0
+    self.submitted = 0
+    self.image_size = None
+    self.cameras = None
+
+  def submit(self, frames) -> int:
+    # Frames are sent to a worker right away, nothing is kept once they are checked
+    index = self.submitted
+    self.submitted += 1
+    self.image_size = frames[0].shape[1::-1]
+    self.cameras = len(frames)
+
+    spill_paths = None
+    if self.spill_directory is not None:
+      spill_paths = [os.path.join(self.spill_directory, f"camera_{camera}", f"{index}.png") for camera in range(len(frames))]
+
+      for path in spill_paths:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    self.pending.append((index, self.pool.submit(check_frames, tuple(frames), self.pattern_size, spill_paths)))
+
+    return index
+
+  def poll(self):
+    # (index, accepted) of every set checked since the last call
+    finished = []
+    pending = []
+
+    for index, future in self.pending:
+      if not future.done():
+        pending.append((index, future))
+        continue
+
+      corners = future.result()
+      if corners is None:
+        self.rejected += 1
+      else:
+        self.views.append(corners)
+
+      finished.append((index, corners is not None))
+
+    self.pending = pending
+
+    return finished
+
+  def status(self) -> str:
+    return f"accepted {len(self.views)}, rejected {self.rejected}, checking {len(self.pending)}"
+
+  def close(self):
+    # Wait for the sets still being checked
+    for _, future in self.pending:
+      future.result()
+
+    finished = self.poll()
+    self.pool.shutdown()
+
+    return finished
\ No newline at end of file
@@ -0,0 +1,244 @@
+import os
+import threading
+
+import dotenv
+
+from utils.validate_input import validate_input
+
+# Type of every setting and whether it must lie between 0 and 1, the rules the settings view validates with
+SETTINGS = {
+  "CAMERA_0_ID": ("int", False),
+  "CAMERA_1_ID": ("int", False),
+  "CAMERA_IDS": ("ids", False),
+  "FRAME_WIDTH": ("int", False),
+  "FRAME_HEIGHT": ("int", False),
+  "CHESSBOARD_ROWS": ("int", False),
+  "CHESSBOARD_COLUMNS": ("int", False),
+  "CHESSBOARD_SQUARE_SIZE": ("int", False),
+  "MIN_HAND_DETECTION_CONFIDENCE": ("float", True),
+  "MIN_HAND_PRESENCE_CONFIDENCE": ("float", True),
+  "MIN_TRACKING_CONFIDENCE": ("float", True)
+}
+
+# CAMERA_IDS is only set for rigs of more than two cameras
+OPTIONAL_SETTINGS = {"CAMERA_IDS"}
+
+# Settings a running session applies by rebuilding its recognizers or its captures
+THRESHOLD_SETTINGS = {"MIN_HAND_DETECTION_CONFIDENCE", "MIN_HAND_PRESENCE_CONFIDENCE", "MIN_TRACKING_CONFIDENCE"}
+CAPTURE_SETTINGS = {"CAMERA_0_ID", "CAMERA_1_ID", "CAMERA_IDS", "FRAME_WIDTH", "FRAME_HEIGHT"}
+
+# Configuration shared by every module of the process
+_config = None
+
+def parse_setting(key: str, value: str):
+  # Typed value of a setting, None when it does not follow its rule
+  type, in_range = SETTINGS[key]
+
+  if type == "ids":
+    ids = value.split(",")
+    if not all(validate_input(input=camera_id.strip(), type="int", range=False) for camera_id in ids):
+      return None
+
+    return [int(camera_id) for camera_id in ids]
+
+  if not validate_input(input=value, type=type, range=in_range):
+    return None
+
+  return int(value) if type == "int" else float(value)
+
+class Config():
+  # Typed settings of the .env file, read once and written back in a single replace of the file
+  def __init__(self, path: str):
+    self.path = path
+    self.lock = threading.Lock()
+
+    # Typed values and the strings they were parsed from
+    self.values = {}
+    self.strings = {}
+
+    # Called with the set of changed keys after every change
+    self.subscribers = []
+
+    # Modification time of the file when it was last read or written
+    self.mtime = None
+
+    self.load()
+
+  def load(self) -> set:
+    # Read the file again, returns the keys whose values changed
+    strings = dotenv.dotenv_values(self.path) if os.path.exists(self.path) else {}
+
+    with self.lock:
+      self.mtime = os.path.getmtime(self.path) if os.path.exists(self.path) else None
+      changed = set()
+
+      for key in SETTINGS:
+        # Keys missing from the file may still come from the environment
+        value = strings.get(key, os.getenv(key))
+
+        if value is None or value == "":
+          if key not in OPTIONAL_SETTINGS:
+            print(f"Missing {key} setting")
+          elif key in self.values:
+            changed.add(key)
+            del self.values[key]
+            del self.strings[key]
+          continue
+
+        parsed = parse_setting(key, value)
+
+        # A wrong value keeps the previous one
+        if parsed is None:
+          print(f"Error in {key} setting, {value} is not valid")
+          continue
+
+        if self.values.get(key) != parsed:
+          changed.add(key)
+
+        self.values[key] = parsed
+        self.strings[key] = value
+
+    return changed
+
+  def get(self, key: str, default=None):
+    with self.lock:
+      return self.values.get(key, default)
+
+  def __getitem__(self, key: str):
+    with self.lock:
+      return self.values[key]
+
+  def camera_ids(self):
+    # CAMERA_IDS lists every camera of a larger rig, otherwise the pair CAMERA_0_ID and CAMERA_1_ID is used
+    with self.lock:
+      if "CAMERA_IDS" in self.values:
+        return list(self.values["CAMERA_IDS"])
+
+      return [self.values["CAMERA_0_ID"], self.values["CAMERA_1_ID"]]
+
+  def frame_size(self):
+    with self.lock:
+      return self.values["FRAME_WIDTH"], self.values["FRAME_HEIGHT"]
+
+  def update(self, settings: dict):
+    # Apply the valid settings of a dict of strings and write them at once, returns the keys with errors
+    errors = []
+    changed = set()
+
+    with self.lock:
+      for key, value in settings.items():
+        # An empty optional setting removes it
+        if value == "" and key in OPTIONAL_SETTINGS:
+          if key in self.values:
+            changed.add(key)
+            del self.values[key]
+            del self.strings[key]
+          continue
+
+        parsed = parse_setting(key, value)
+
+        if parsed is None:
+          errors.append(key)
+          continue
+
+        if self.values.get(key) != parsed:
+          changed.add(key)
+
+        self.values[key] = parsed
+        self.strings[key] = value
+
+      if changed:
+        self.save()
+
+    if changed:
+      self.notify(changed)
+
+    return errors
+
+  def save(self):
+    # Replace the values in place so comments and order of the file are kept, called with the lock held
+    lines = []
+    if os.path.exists(self.path):
+      with open(self.path) as file:
+        lines = file.read().split("\n")
+
+    # Line of every setting, a commented out line is used when the setting has no active one
+    active = {}
+    commented = {}
+    for index, line in enumerate(lines):
+      is_comment = line.lstrip().startswith("#")
+      key = line.lstrip().lstrip("#").split("=", 1)[0].strip()
+
+      if "=" not in line or key not in SETTINGS:
+        continue
+
+      slots = commented if is_comment else active
+      slots.setdefault(key, index)
+
+    for key in SETTINGS:
+      if key in self.strings:
+        line = f"{key}='{self.strings[key]}'"
+        index = active.get(key, commented.get(key))
+
+        if index is None:
+          lines.append(line)
+        else:
+          lines[index] = line
+      elif key in active:
+        # A removed setting is commented out where it was
+        lines[active[key]] = f"# {key}=''"
+
+    # Write next to the file and swap it in, readers never see a partial file
+    with open(f"{self.path}.tmp", "w") as file:
+      file.write("\n".join(lines))
+    os.replace(f"{self.path}.tmp", self.path)
+
+    self.mtime = os.path.getmtime(self.path)
+
+  def reload(self) -> set:
+    # Pick up edits made to the file outside of this process, cheap when nothing changed
+    mtime = os.path.getmtime(self.path) if os.path.exists(self.path) else None
+
+    if mtime == self.mtime:
+      return set()
+
+    changed = self.load()
+
+    if changed:
+      self.notify(changed)
+
+    return changed
+
+  def subscribe(self, callback):
+    # callback is called with the set of changed keys, from the thread that made the change
+    with self.lock:
+      self.subscribers.append(callback)
+
+  def unsubscribe(self, callback):
+    with self.lock:
+      if callback in self.subscribers:
+        self.subscribers.remove(callback)
+
+  def notify(self, changed: set):
+    with self.lock:
+      subscribers = list(self.subscribers)
+
+    for callback in subscribers:
+      callback(set(changed))
+
+def config_path() -> str:
+  # The .env file next to the entry scripts
+  path = dotenv.find_dotenv()
+
+  if path == "":
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".env")
+
+  return path
+
+def get_config() -> Config:
+  global _config
+
+  if _config is None:
+    _config = Config(config_path())
+
+  return _config
\ No newline at end of file
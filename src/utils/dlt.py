@@ -1,30 +1,157 @@
-import os
-
 import numpy as np
-import scipy.linalg
 
-def DLT(point_0, point_1):
-  # Load camera parameters
-  dirname = os.path.dirname(__file__)
-  camera_parameters_path = os.path.join(dirname, "../camera_parameters")
+from utils.calibration import load_calibration, reset_calibration
 
-  if not os.path.exists(camera_parameters_path):
-    print("Could not find camera parameters, make sure to calibrate the camera first")
-    return
+# Triangulator shared by every caller of the process
+_triangulator = None
+
+class Triangulator():
+  def __init__(self, P, calibration=None, rectified: bool = False, max_residual: float = 2.0):
+    # Projection matrices of every camera, (V, 3, 4)
+    self.P = np.asarray(P, dtype=np.float64)
+    self.P_0 = self.P[0]
+    self.P_1 = self.P[1]
+
+    # Points are lens corrected before triangulation when a calibration is given
+    self.calibration = calibration
+
+    # Rectified mode computes depth from disparity, it needs the rectification of the calibration
+    self.rectified = rectified and calibration is not None and calibration.Q is not None
+
+    # Points whose rectified rows differ more than max_residual pixels use the DLT instead
+    self.max_residual = max_residual
+    self.fallback_points = 0
+
+    if self.rectified:
+      # Cameras side by side have horizontal disparity, stacked cameras vertical disparity
+      P_1_rect = calibration.P_rect[1]
+      self.disparity_axis = 0 if abs(P_1_rect[0, 3]) >= abs(P_1_rect[1, 3]) else 1
+
+  def triangulate(self, points_0, points_1):
+    # Accept any leading shape, e.g. (2,), (N, 2) or (N, 21, 2)
+    points_0 = np.asarray(points_0, dtype=np.float64)
+    points_1 = np.asarray(points_1, dtype=np.float64)
+    leading_shape = points_0.shape[:-1]
+
+    points_0 = points_0.reshape(-1, 2)
+    points_1 = points_1.reshape(-1, 2)
+
+    if self.rectified:
+      coords = self.triangulate_rectified(points_0, points_1)
+    else:
+      if self.calibration is not None:
+        points_0 = self.calibration.undistort_points(0, points_0)
+        points_1 = self.calibration.undistort_points(1, points_1)
+
+      coords = self.triangulate_dlt(points_0, points_1)
+
+    return coords.reshape(leading_shape + (3,))
+
+  def triangulate_dlt(self, points_0, points_1):
+    # Build the 4x4 DLT system of every point at once
+    A = np.empty((points_0.shape[0], 4, 4))
+    A[:, 0] = points_0[:, 1, None] * self.P_0[2] - self.P_0[1]
+    A[:, 1] = self.P_0[0] - points_0[:, 0, None] * self.P_0[2]
+    A[:, 2] = points_1[:, 1, None] * self.P_1[2] - self.P_1[1]
+    A[:, 3] = self.P_1[0] - points_1[:, 0, None] * self.P_1[2]
+
+    # Solution of each system is its right singular vector with the smallest singular value
+    _, _, Vh = np.linalg.svd(A)
+    X = Vh[:, 3]
+
+    return X[:, 0:3] / X[:, 3, None]
+
+  def triangulate_views(self, points, mask=None):
+    # Points of every camera as (V, ..., 2), mask (V, ...) tells which views saw each point
+    points = np.asarray(points, dtype=np.float64)
+    views = points.shape[0]
+    leading_shape = points.shape[1:-1]
+
+    points = points.reshape(views, -1, 2)
+
+    if mask is None:
+      mask = np.ones(points.shape[:2], dtype=bool)
+    else:
+      mask = np.asarray(mask, dtype=bool).reshape(views, -1)
+
+    # Views without a usable point never enter the solution
+    mask = mask & np.isfinite(points).all(axis=-1)
 
-  P_0 = np.load(f"{camera_parameters_path}/P_0.npy")
-  P_1 = np.load(f"{camera_parameters_path}/P_1.npy")
+    if self.calibration is not None:
+      points = np.stack([self.calibration.undistort_points(view, points[view]) for view in range(views)])
+
+    coords = self.triangulate_masked(points, mask)
+
+    return coords.reshape(leading_shape + (3,))
+
+  def triangulate_masked(self, points, mask):
+    # Least squares DLT over the views of each point selected by mask, (V, N, 2) and (V, N)
+    P = self.P[:len(points), None]
+
+    # Two rows per view, rows of views that did not see the point are zero and drop out of the system
+    rows_y = points[..., 1, None] * P[..., 2, :] - P[..., 1, :]
+    rows_x = P[..., 0, :] - points[..., 0, None] * P[..., 2, :]
+    rows = np.where(mask[..., None, None], np.stack([rows_y, rows_x], axis=2), 0.0)
+
+    # (N, 2V, 4) systems of every point, solved at once, cost grows linearly with the views
+    A = rows.transpose(1, 0, 2, 3).reshape(points.shape[1], -1, 4)
+    _, _, Vh = np.linalg.svd(A)
+    X = Vh[:, 3]
+
+    # Systems of points seen by less than two cameras may divide by zero, they have no depth
+    with np.errstate(divide="ignore", invalid="ignore"):
+      coords = X[:, 0:3] / X[:, 3, None]
+
+    coords[mask.sum(axis=0) < 2] = np.nan
+
+    return coords
+
+  def triangulate_rectified(self, points_0, points_1):
+    # Lens corrected points in rectified images, where matching points share a row
+    rectified_0 = self.calibration.rectify_points(0, points_0)
+    rectified_1 = self.calibration.rectify_points(1, points_1)
+
+    axis = self.disparity_axis
+    disparity = rectified_0[:, axis] - rectified_1[:, axis]
+    residual = np.abs(rectified_0[:, 1 - axis] - rectified_1[:, 1 - axis])
+
+    # Reproject (x, y, disparity) to 3D in the rectified frame of camera 0
+    homogeneous = np.column_stack([rectified_0, disparity, np.ones(len(disparity))]) @ self.calibration.Q.T
+    coords_rect = homogeneous[:, 0:3] / homogeneous[:, 3, None]
+
+    # Back to the frame of camera 0 used by the projection matrices
+    coords = coords_rect @ self.calibration.R_rect[0]
+
+    # Points that do not agree with the epipolar geometry are triangulated in general
+    fallback = (residual > self.max_residual) | (np.abs(homogeneous[:, 3]) < 1e-12)
+
+    if fallback.any():
+      self.fallback_points += int(fallback.sum())
+      coords[fallback] = self.triangulate_dlt(
+        self.calibration.undistort_points(0, points_0[fallback]),
+        self.calibration.undistort_points(1, points_1[fallback])
+      )
+
+    return coords
+
+def load_triangulator(rectified: bool = True):
+  # Rectified mode is used when the calibration has rectification, legacy calibrations use the DLT
+  global _triangulator
+
+  # Calibration is only read from disk once per process
+  calibration = load_calibration()
+
+  if calibration is None:
+    return
 
-  A = [point_0[1] * P_0[2, :] - P_0[1, :],
-        P_0[0, :] - point_0[0] * P_0[2, :],
-        point_1[1] * P_1[2, :] - P_1[1, :],
-        P_1[0, :] - point_1[0] * P_1[2, :]
-      ]
-  
-  A = np.array(A).reshape((4,4))
-  B = A.transpose() @ A
+  # Rebuild when the calibration was reloaded or the mode changed since
+  if _triangulator is None or _triangulator.calibration is not calibration or _triangulator.rectified != (rectified and calibration.Q is not None):
+    _triangulator = Triangulator(calibration.P, calibration, rectified)
 
-  U, s, Vh = scipy.linalg.svd(B, full_matrices = False)
-  coords = Vh[3, 0:3] / Vh[3, 3]
+  return _triangulator
 
-  return coords
\ No newline at end of file
+def reset_triangulator():
+  # Force projection matrices to be reloaded, e.g. after a new calibration
+  global _triangulator
+  _triangulator = None
+  reset_calibration()
\ No newline at end of file
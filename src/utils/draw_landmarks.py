@@ -1,36 +1,63 @@
 import cv2 as cv
+import numpy as np
+
+# Landmark connections of the hand skeleton
+HAND_CONNECTIONS = np.array([
+  [0, 1], [1, 2], [2, 3], [3, 4],
+  [0, 5], [5, 6], [6, 7], [7, 8],
+  [5, 9], [9, 10], [10, 11], [11, 12],
+  [9, 13], [13, 14], [14, 15], [15, 16],
+  [13, 17], [17, 18], [18, 19], [19, 20],
+  [17, 0]
+])
+
+def landmarks_to_array(landmarks) -> np.ndarray:
+  # Normalized (x, y) coordinates of one hand as a (21, 2) array
+  if isinstance(landmarks, np.ndarray):
+    return landmarks[..., :2]
+
+  return np.array([[landmark.x, landmark.y] for landmark in landmarks])
+
+def hands_to_array(hands) -> np.ndarray:
+  # Accepts one hand or a list of hands, as MediaPipe landmarks or arrays, returns (H, 21, 2)
+  if isinstance(hands, np.ndarray):
+    return hands[..., :2].reshape(-1, 21, 2)
+
+  if len(hands) > 0 and hasattr(hands[0], "x"):
+    hands = [hands]
+
+  if len(hands) == 0:
+    return np.empty((0, 21, 2))
+
+  return np.stack([landmarks_to_array(landmarks) for landmarks in hands])
 
 def draw_landmarks(frame: cv.typing.MatLike, frame_width: int, frame_height: int, landmarks):
-  # Draw landmark connections
-  cv.line(frame, (int(landmarks[0].x * frame_width), int(landmarks[0].y * frame_height)), (int(landmarks[1].x * frame_width), int(landmarks[1].y * frame_height)), (0, 0, 0), 2) # 0 - 1
-  cv.line(frame, (int(landmarks[1].x * frame_width), int(landmarks[1].y * frame_height)), (int(landmarks[2].x * frame_width), int(landmarks[2].y * frame_height)), (0, 0, 0), 2) # 1 - 2
-  cv.line(frame, (int(landmarks[2].x * frame_width), int(landmarks[2].y * frame_height)), (int(landmarks[3].x * frame_width), int(landmarks[3].y * frame_height)), (0, 0, 0), 2) # 2 - 3
-  cv.line(frame, (int(landmarks[3].x * frame_width), int(landmarks[3].y * frame_height)), (int(landmarks[4].x * frame_width), int(landmarks[4].y * frame_height)), (0, 0, 0), 2) # 3 - 4
-  cv.line(frame, (int(landmarks[0].x * frame_width), int(landmarks[0].y * frame_height)), (int(landmarks[5].x * frame_width), int(landmarks[5].y * frame_height)), (0, 0, 0), 2) # 0 - 5
-  cv.line(frame, (int(landmarks[5].x * frame_width), int(landmarks[5].y * frame_height)), (int(landmarks[6].x * frame_width), int(landmarks[6].y * frame_height)), (0, 0, 0), 2) # 5 - 6
-  cv.line(frame, (int(landmarks[6].x * frame_width), int(landmarks[6].y * frame_height)), (int(landmarks[7].x * frame_width), int(landmarks[7].y * frame_height)), (0, 0, 0), 2) # 6 - 7
-  cv.line(frame, (int(landmarks[7].x * frame_width), int(landmarks[7].y * frame_height)), (int(landmarks[8].x * frame_width), int(landmarks[8].y * frame_height)), (0, 0, 0), 2) # 7 - 8
-  cv.line(frame, (int(landmarks[5].x * frame_width), int(landmarks[5].y * frame_height)), (int(landmarks[9].x * frame_width), int(landmarks[9].y * frame_height)), (0, 0, 0), 2) # 5 - 9
-  cv.line(frame, (int(landmarks[9].x * frame_width), int(landmarks[9].y * frame_height)), (int(landmarks[10].x * frame_width), int(landmarks[10].y * frame_height)), (0, 0, 0), 2) # 9 - 10
-  cv.line(frame, (int(landmarks[10].x * frame_width), int(landmarks[10].y * frame_height)), (int(landmarks[11].x * frame_width), int(landmarks[11].y * frame_height)), (0, 0, 0), 2) # 10 - 11
-  cv.line(frame, (int(landmarks[11].x * frame_width), int(landmarks[11].y * frame_height)), (int(landmarks[12].x * frame_width), int(landmarks[12].y * frame_height)), (0, 0, 0), 2) # 11 - 12
-  cv.line(frame, (int(landmarks[9].x * frame_width), int(landmarks[9].y * frame_height)), (int(landmarks[13].x * frame_width), int(landmarks[13].y * frame_height)), (0, 0, 0), 2) # 9 - 13
-  cv.line(frame, (int(landmarks[13].x * frame_width), int(landmarks[13].y * frame_height)), (int(landmarks[14].x * frame_width), int(landmarks[14].y * frame_height)), (0, 0, 0), 2) # 13 - 14
-  cv.line(frame, (int(landmarks[14].x * frame_width), int(landmarks[14].y * frame_height)), (int(landmarks[15].x * frame_width), int(landmarks[15].y * frame_height)), (0, 0, 0), 2) # 14 - 15
-  cv.line(frame, (int(landmarks[15].x * frame_width), int(landmarks[15].y * frame_height)), (int(landmarks[16].x * frame_width), int(landmarks[16].y * frame_height)), (0, 0, 0), 2) # 15 - 16
-  cv.line(frame, (int(landmarks[13].x * frame_width), int(landmarks[13].y * frame_height)), (int(landmarks[17].x * frame_width), int(landmarks[17].y * frame_height)), (0, 0, 0), 2) # 13 - 17
-  cv.line(frame, (int(landmarks[17].x * frame_width), int(landmarks[17].y * frame_height)), (int(landmarks[18].x * frame_width), int(landmarks[18].y * frame_height)), (0, 0, 0), 2) # 17 - 18
-  cv.line(frame, (int(landmarks[18].x * frame_width), int(landmarks[18].y * frame_height)), (int(landmarks[19].x * frame_width), int(landmarks[19].y * frame_height)), (0, 0, 0), 2) # 18 - 19
-  cv.line(frame, (int(landmarks[19].x * frame_width), int(landmarks[19].y * frame_height)), (int(landmarks[20].x * frame_width), int(landmarks[20].y * frame_height)), (0, 0, 0), 2) # 19 - 20
-  cv.line(frame, (int(landmarks[17].x * frame_width), int(landmarks[17].y * frame_height)), (int(landmarks[0].x * frame_width), int(landmarks[0].y * frame_height)), (0, 0, 0), 2) # 17 - 0
-
-  # Draw center of hand
-  center_x = int(((landmarks[0].x + landmarks[9].x) / 2) * frame_width)
-  center_y = int(((landmarks[0].y + landmarks[9].y) / 2) * frame_height)
-  cv.circle(frame, (center_x, center_y), 6, (255, 255, 255), -1)
-  cv.circle(frame, (center_x, center_y), 4, (0, 0, 0), -1)
-
-  # Draw landmark points
-  for landmark in landmarks:
-    cv.circle(frame, (int(landmark.x * frame_width), int(landmark.y * frame_height)), 6, (255, 255, 255), -1)
-    cv.circle(frame, (int(landmark.x * frame_width), int(landmark.y * frame_height)), 4, (0, 0, 0), -1)
\ No newline at end of file
+  hands = hands_to_array(landmarks)
+
+  if hands.shape[0] == 0:
+    return
+
+  # Pixel coordinates of every landmark, computed once
+  pixels = np.rint(hands * (frame_width, frame_height)).astype(np.int32)
+
+  # Draw landmark connections of all hands in one call
+  segments = pixels[:, HAND_CONNECTIONS].reshape(-1, 2, 2)
+  cv.polylines(frame, segments, False, (0, 0, 0), 2)
+
+  # Center of each hand followed by its landmark points
+  centers = np.rint((hands[:, 0] + hands[:, 9]) / 2 * (frame_width, frame_height)).astype(np.int32)
+  points = np.concatenate([centers, pixels.reshape(-1, 2)])
+
+  # A zero length thick line is a filled circle of diameter equal to its thickness
+  dots = np.repeat(points[:, None, :], 2, axis=1)
+  cv.polylines(frame, dots, False, (255, 255, 255), 12)
+  cv.polylines(frame, dots, False, (0, 0, 0), 8)
+
+def draw_preview(frame: cv.typing.MatLike, landmarks, scale: float = 0.5) -> cv.typing.MatLike:
+  # Draw onto a downscaled copy of the frame, the capture frame is left untouched
+  preview = cv.resize(frame, None, fx=scale, fy=scale, interpolation=cv.INTER_AREA)
+  preview_height, preview_width = preview.shape[:2]
+
+  draw_landmarks(preview, preview_width, preview_height, landmarks)
+
+  return preview
\ No newline at end of file
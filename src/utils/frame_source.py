@@ -0,0 +1,224 @@
+import os
+import re
+import time
+
+import cv2 as cv
+
+from utils.config import get_config
+
+# Frame rate assumed when a camera or file does not report one
+DEFAULT_FPS = 30.0
+
+class FrameSource():
+  # Common interface of every multi camera frame source, mirrors cv.VideoCapture
+  def __init__(self, cameras: int = 2, realtime: bool = True):
+    # When realtime is False frames are delivered as fast as possible
+    self.realtime = realtime
+    self.cameras = cameras
+
+    # Capture time of the last set in time.monotonic() seconds and spread between its cameras
+    self.timestamps = [None] * cameras
+    self.timestamp = None
+    self.skew = None
+
+    # Frames per second of the slowest camera
+    self.fps = DEFAULT_FPS
+
+    self.error = None
+
+  def isOpened(self, camera: int) -> bool:
+    raise NotImplementedError
+
+  def start(self):
+    pass
+
+  def read_all(self):
+    # Returns (ret, frames) with one frame per camera
+    raise NotImplementedError
+
+  def read(self):
+    # Returns (ret, frame_0, frame_1), the first two cameras of the rig
+    ret, frames = self.read_all()
+
+    if not ret:
+      return False, None, None
+
+    return True, frames[0], frames[1]
+
+  def release(self):
+    pass
+
+class ReplaySource(FrameSource):
+  # Base class of sources reading recorded frames at a fixed frame rate
+  def __init__(self, fps: float, cameras: int = 2, realtime: bool = True):
+    super().__init__(cameras, realtime)
+    self.fps = fps
+    self.frame_index = 0
+    self.position = None
+    self.start_time = None
+
+  def start(self):
+    self.start_time = time.monotonic()
+
+  def read_all(self):
+    if self.start_time is None:
+      self.start()
+
+    ret, frames = self.read_frames()
+
+    if not ret:
+      return False, None
+
+    # Position of the frame in the recording
+    self.position = self.frame_index / self.fps
+    self.frame_index += 1
+
+    # Hold the frame until its time comes when pacing to wall clock
+    if self.realtime:
+      delay = self.start_time + self.position - time.monotonic()
+      if delay > 0:
+        time.sleep(delay)
+
+    # Recorded frames are stamped when they are delivered
+    timestamp = time.monotonic()
+    self.timestamps = [timestamp] * self.cameras
+    self.timestamp = timestamp
+    self.skew = 0.0
+
+    return True, frames
+
+  def read_frames(self):
+    # Returns (ret, frames) of the next recorded set
+    raise NotImplementedError
+
+class VideoFileSource(ReplaySource):
+  # Synchronized video files, one per camera
+  def __init__(self, paths, realtime: bool = True, fps: float = None):
+    self.captures = [cv.VideoCapture(path) for path in paths]
+
+    # Use the frame rate stored in the first video if none is given
+    if fps is None:
+      fps = self.captures[0].get(cv.CAP_PROP_FPS) or DEFAULT_FPS
+
+    super().__init__(fps, len(self.captures), realtime)
+
+  def isOpened(self, camera: int) -> bool:
+    return self.captures[camera].isOpened()
+
+  def read_frames(self):
+    frames = []
+    for camera, capture in enumerate(self.captures):
+      ret, frame = capture.read()
+
+      if not ret:
+        self.error = f"Can't receive frame from camera {camera}"
+        return False, None
+
+      frames.append(frame)
+
+    return True, frames
+
+  def release(self):
+    for capture in self.captures:
+      capture.release()
+
+class ImageSequenceSource(ReplaySource):
+  # Reads numbered images from the camera_0, camera_1, ... subdirectories of a directory
+  def __init__(self, directory: str, realtime: bool = True, fps: float = 30.0):
+    # Every camera_k subdirectory is a camera, at least two are expected
+    cameras = max(2, len(camera_directories(directory)))
+    super().__init__(fps, cameras, realtime)
+
+    self.directories = [os.path.join(directory, f"camera_{camera}") for camera in range(cameras)]
+    self.images = [numbered_images(path) for path in self.directories]
+
+    # Only numbers present for every camera form a set
+    self.numbers = sorted(set.intersection(*(set(images) for images in self.images)))
+
+  def isOpened(self, camera: int) -> bool:
+    return os.path.isdir(self.directories[camera]) and len(self.numbers) > 0
+
+  def read_frames(self):
+    if self.frame_index >= len(self.numbers):
+      self.error = "No more frames in image sequence"
+      return False, None
+
+    number = self.numbers[self.frame_index]
+
+    frames = []
+    for camera in range(self.cameras):
+      frame = cv.imread(self.images[camera][number])
+
+      if frame is None:
+        self.error = f"Can't receive frame from camera {camera}"
+        return False, None
+
+      frames.append(frame)
+
+    return True, frames
+
+def camera_directories(directory: str):
+  # camera_k subdirectories of a recording, numbered from 0 without gaps
+  if not os.path.isdir(directory):
+    return []
+
+  directories = []
+  while os.path.isdir(os.path.join(directory, f"camera_{len(directories)}")):
+    directories.append(os.path.join(directory, f"camera_{len(directories)}"))
+
+  return directories
+
+def numbered_images(directory: str):
+  # Map the first number in each image name to its path
+  images = {}
+
+  if not os.path.isdir(directory):
+    return images
+
+  for name in os.listdir(directory):
+    match = re.search(r"\d+", name)
+    if match and name.lower().endswith((".png", ".jpg", ".jpeg", ".bmp")):
+      images[int(match.group())] = os.path.join(directory, name)
+
+  return images
+
+def create_frame_source(source=None, realtime: bool = True) -> FrameSource:
+  # Already built sources are used as they are
+  if isinstance(source, FrameSource):
+    return source
+
+  # A directory replays an image sequence
+  if isinstance(source, str):
+    return ImageSequenceSource(source, realtime=realtime)
+
+  # A list of paths replays synchronized video files, one per camera
+  if isinstance(source, (tuple, list)):
+    return VideoFileSource(source, realtime=realtime)
+
+  # Otherwise use the live cameras set in the .env file
+  from utils.stereo_capture import StereoCapture
+
+  FRAME_WIDTH, FRAME_HEIGHT = get_config().frame_size()
+
+  return StereoCapture(camera_ids(), FRAME_WIDTH, FRAME_HEIGHT)
+
+def camera_ids():
+  # CAMERA_IDS lists every camera of a larger rig, otherwise the pair CAMERA_0_ID and CAMERA_1_ID is used
+  return get_config().camera_ids()
+
+def create_camera_specs(source=None):
+  # Per camera description of a source that worker processes can open on their own
+  if isinstance(source, str):
+    images = ImageSequenceSource(source)
+    return [("images", [images.images[camera][number] for number in images.numbers], images.fps) for camera in range(images.cameras)]
+
+  if isinstance(source, (tuple, list)):
+    return [("video", path) for path in source]
+
+  if source is not None:
+    print("Worker processes need a camera, video or image sequence source, not an opened one")
+    return
+
+  FRAME_WIDTH, FRAME_HEIGHT = get_config().frame_size()
+
+  return [("camera", camera_id, FRAME_WIDTH, FRAME_HEIGHT) for camera_id in camera_ids()]
\ No newline at end of file
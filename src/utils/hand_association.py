@@ -0,0 +1,76 @@
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+def homogeneous(points):
+  return np.concatenate([points, np.ones(points.shape[:-1] + (1,))], axis=-1)
+
+def epipolar_cost(hands_0, hands_1, F):
+  # Mean symmetric epipolar distance in pixels between every hand of camera 0 (H0, K, 2)
+  # and every hand of camera 1 (H1, K, 2), as an (H0, H1) matrix
+  points_0 = homogeneous(np.asarray(hands_0, dtype=np.float64))
+  points_1 = homogeneous(np.asarray(hands_1, dtype=np.float64))
+
+  # Epipolar lines of each landmark in the other image
+  lines_1 = points_0 @ F.T
+  lines_0 = points_1 @ F
+
+  # Distance of landmark k of hand j to the line of landmark k of hand i, for all i, j, k at once
+  distance_1 = np.abs(np.einsum("ikc,jkc->ijk", lines_1, points_1)) / np.linalg.norm(lines_1[:, None, :, :2], axis=-1)
+  distance_0 = np.abs(np.einsum("ikc,jkc->ijk", points_0, lines_0)) / np.linalg.norm(lines_0[None, :, :, :2], axis=-1)
+
+  return ((distance_0 + distance_1) / 2).mean(axis=-1)
+
+def associate_hands(hands_0, hands_1, F, max_cost: float = 25.0):
+  # (index_0, index_1) pairs of the same hand seen by both cameras
+  if len(hands_0) == 0 or len(hands_1) == 0:
+    return []
+
+  cost = epipolar_cost(hands_0, hands_1, F)
+  rows, columns = linear_sum_assignment(cost)
+
+  # Hands only seen by one camera end up assigned to the wrong one, their cost gives them away
+  return [(row, column) for row, column in zip(rows, columns) if cost[row, column] <= max_cost]
+
+class HandTracks():
+  # Persistent ids for triangulated hands, matched frame to frame by distance
+  def __init__(self, max_distance: float = 100.0, max_age: float = 0.5):
+    # Hands further than max_distance from a track start a new one, tracks unseen for max_age seconds end
+    self.max_distance = max_distance
+    self.max_age = max_age
+
+    self.ids = np.empty(0, dtype=np.int64)
+    self.positions = np.empty((0, 3))
+    self.last_seen = np.empty(0)
+    self.next_id = 0
+
+  def update(self, positions, timestamp: float):
+    # Ids of the given (M, 3) hand positions
+    positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+    ids = np.full(len(positions), -1, dtype=np.int64)
+
+    # Forget tracks that have not been seen for a while
+    alive = timestamp - self.last_seen <= self.max_age
+    self.ids = self.ids[alive]
+    self.positions = self.positions[alive]
+    self.last_seen = self.last_seen[alive]
+
+    if len(self.ids) > 0 and len(positions) > 0:
+      distance = np.linalg.norm(positions[:, None] - self.positions[None], axis=-1)
+      rows, columns = linear_sum_assignment(distance)
+
+      for row, column in zip(rows, columns):
+        if distance[row, column] <= self.max_distance:
+          ids[row] = self.ids[column]
+          self.positions[column] = positions[row]
+          self.last_seen[column] = timestamp
+
+    # Hands without a track start a new one
+    new = ids < 0
+    ids[new] = np.arange(self.next_id, self.next_id + new.sum())
+    self.next_id += int(new.sum())
+
+    self.ids = np.concatenate([self.ids, ids[new]])
+    self.positions = np.concatenate([self.positions, positions[new]])
+    self.last_seen = np.concatenate([self.last_seen, np.full(new.sum(), timestamp)])
+
+    return ids
\ No newline at end of file
@@ -0,0 +1,139 @@
+import os
+import json
+import sqlite3
+import hashlib
+import threading
+
+import numpy as np
+
+from utils.result_store import Category
+
+# Version of the cached entry layout, part of every key so old entries are never read back
+CACHE_VERSION = 1
+
+def file_digest(path: str) -> str:
+  # Hash of a file read in chunks, the model is hashed once per session
+  digest = hashlib.blake2b(digest_size=16)
+
+  with open(path, "rb") as file:
+    for chunk in iter(lambda: file.read(1 << 20), b""):
+      digest.update(chunk)
+
+  return digest.hexdigest()
+
+class InferenceCache():
+  # Recognizer results on disk, keyed by the frame contents, the model and every setting that changes its output
+  def __init__(self, path: str, model_path: str, settings: dict, max_bytes: int = 1 << 30, commit_every: int = 256):
+    # settings holds the confidence thresholds, num_hands and roi, anything that changes the results
+    # Each camera has its own file, so worker processes never wait for each other's writes
+    self.path = path
+    self.max_bytes = max_bytes
+    self.commit_every = commit_every
+    self.changes = 0
+
+    # Everything but the frame is hashed once, frame keys only add the frame hash to it
+    prefix = json.dumps({"version": CACHE_VERSION, "model": file_digest(model_path), "settings": settings}, sort_keys=True)
+    self.prefix = hashlib.blake2b(prefix.encode(), digest_size=16).digest()
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+
+    # Results are written from MediaPipe callback threads and read from the main loop
+    self.lock = threading.Lock()
+    self.connection = sqlite3.connect(path, timeout=30.0, check_same_thread=False)
+    self.connection.execute("PRAGMA journal_mode=WAL")
+    self.connection.execute("PRAGMA synchronous=NORMAL")
+    self.connection.execute("CREATE TABLE IF NOT EXISTS results (key BLOB PRIMARY KEY, landmarks BLOB, gestures TEXT, size INTEGER, used INTEGER)")
+    self.connection.execute("CREATE INDEX IF NOT EXISTS results_used ON results (used)")
+    self.connection.commit()
+
+    # Least recently used entries have the lowest use counter
+    self.used = self.connection.execute("SELECT COALESCE(MAX(used), 0) FROM results").fetchone()[0]
+    self.size = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+
+    self.hits = 0
+    self.misses = 0
+
+  def key(self, frame) -> bytes:
+    # Content address of a frame under the settings of this cache
+    digest = hashlib.blake2b(self.prefix, digest_size=16)
+    digest.update(np.ascontiguousarray(frame).data)
+
+    return digest.digest()
+
+  def get(self, key: bytes):
+    # (landmarks (H, 21, 3), gestures) of a frame, or None when it was never recognized
+    with self.lock:
+      row = self.connection.execute("SELECT landmarks, gestures FROM results WHERE key = ?", (key,)).fetchone()
+
+      if row is None:
+        self.misses += 1
+        return None
+
+      self.hits += 1
+      self.used += 1
+      self.connection.execute("UPDATE results SET used = ? WHERE key = ?", (self.used, key))
+      self.changed()
+
+    landmarks = np.frombuffer(row[0], dtype=np.float32).reshape(-1, 21, 3)
+    gestures = [[Category(name, score) for name, score in hand] for hand in json.loads(row[1])]
+
+    return landmarks, gestures
+
+  def put(self, key: bytes, landmarks, gestures):
+    # Landmarks are stored as raw float32, gestures as names and scores
+    landmarks = np.asarray(landmarks, dtype=np.float32).reshape(-1, 21, 3).tobytes()
+    gestures = json.dumps([[[category.category_name, round(float(category.score), 4)] for category in hand] for hand in gestures])
+    size = len(key) + len(landmarks) + len(gestures)
+
+    with self.lock:
+      self.used += 1
+      previous = self.connection.execute("SELECT size FROM results WHERE key = ?", (key,)).fetchone()
+      self.connection.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)", (key, landmarks, gestures, size, self.used))
+      self.size += size - (previous[0] if previous is not None else 0)
+
+      if self.size > self.max_bytes:
+        self.evict()
+
+      self.changed()
+
+  def evict(self):
+    # Drop least recently used entries until the cache is a tenth below its cap, called with the lock held
+    target = self.max_bytes * 0.9
+
+    while self.size > target:
+      rows = self.connection.execute("SELECT key, size FROM results ORDER BY used LIMIT 1024").fetchall()
+
+      if len(rows) == 0:
+        break
+
+      evicted = []
+      for key, size in rows:
+        if self.size <= target:
+          break
+
+        evicted.append((key,))
+        self.size -= size
+
+      self.connection.executemany("DELETE FROM results WHERE key = ?", evicted)
+
+  def changed(self):
+    # Writes are committed in batches, a crash loses at most the last commit_every of them
+    self.changes += 1
+
+    if self.changes >= self.commit_every:
+      self.connection.commit()
+      self.changes = 0
+
+  def close(self):
+    with self.lock:
+      self.connection.commit()
+      self.connection.close()
+
+def cache_path(directory: str, camera: int) -> str:
+  # File of the results of one camera in a cache directory
+  return os.path.join(directory, f"camera_{camera}.sqlite")
+
+def cache_settings(options: dict) -> dict:
+  # Recognizer options that change its results, part of the cache key
+  return {name: options[name] for name in ["num_hands", "min_hand_detection_confidence", "min_hand_presence_confidence", "min_tracking_confidence", "roi"]}
\ No newline at end of file
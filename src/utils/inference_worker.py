@@ -0,0 +1,373 @@
+import time
+import queue
+import multiprocessing
+from multiprocessing import shared_memory
+
+import cv2 as cv
+import numpy as np
+
+from utils.result_store import Category
+from utils.roi import RoiTracker, landmarks_to_xyz
+from utils.inference_cache import InferenceCache, cache_path, cache_settings
+
+class SharedFrameRing():
+  # Fixed number of frame slots in shared memory, each guarded by a sequence number
+  def __init__(self, shape, slots: int = 4, name: str = None):
+    self.shape = tuple(shape)
+    self.slots = slots
+    self.next_slot = 0
+
+    header_size = slots * np.dtype(np.int64).itemsize
+    frame_size = int(np.prod(self.shape))
+
+    # The writer creates the memory, readers attach to it by name
+    self.owner = name is None
+    if self.owner:
+      self.memory = shared_memory.SharedMemory(create=True, size=header_size + slots * frame_size)
+    else:
+      self.memory = shared_memory.SharedMemory(name=name)
+
+    self.name = self.memory.name
+    self.sequences = np.ndarray((slots,), dtype=np.int64, buffer=self.memory.buf)
+    self.frames = np.ndarray((slots,) + self.shape, dtype=np.uint8, buffer=self.memory.buf, offset=header_size)
+
+    if self.owner:
+      self.sequences[:] = 0
+
+  def write(self, frame, sequence: int) -> int:
+    slot = self.next_slot
+    self.next_slot = (slot + 1) % self.slots
+
+    # Mark the slot as being written while the frame is copied in
+    self.sequences[slot] = -1
+    self.frames[slot] = frame
+    self.sequences[slot] = sequence
+
+    return slot
+
+  def read(self, slot: int, sequence: int):
+    # Copy of the frame, or None if the writer reused the slot meanwhile
+    if self.sequences[slot] != sequence:
+      return None
+
+    frame = self.frames[slot].copy()
+
+    if self.sequences[slot] != sequence:
+      return None
+
+    return frame
+
+  def close(self):
+    # Views into the buffer have to go before the memory can be closed
+    del self.sequences
+    del self.frames
+
+    self.memory.close()
+    if self.owner:
+      self.memory.unlink()
+
+class CameraReader():
+  # Single camera of a source, opened inside the worker process
+  def __init__(self, spec, start_time: float, realtime: bool):
+    self.kind = spec[0]
+    self.start_time = start_time
+    self.realtime = realtime
+    self.frame_index = 0
+
+    if self.kind == "camera":
+      _, camera_id, frame_width, frame_height = spec
+      self.capture = cv.VideoCapture(camera_id, cv.CAP_DSHOW)
+      self.capture.set(cv.CAP_PROP_FRAME_WIDTH, frame_width)
+      self.capture.set(cv.CAP_PROP_FRAME_HEIGHT, frame_height)
+    elif self.kind == "video":
+      self.capture = cv.VideoCapture(spec[1])
+      self.fps = self.capture.get(cv.CAP_PROP_FPS) or 30.0
+    else:
+      self.images = spec[1]
+      self.fps = spec[2]
+
+  def isOpened(self) -> bool:
+    if self.kind == "images":
+      return len(self.images) > 0
+
+    return self.capture.isOpened()
+
+  def read(self):
+    # Returns (ret, frame, capture_time)
+    if self.kind == "camera":
+      ret = self.capture.grab()
+      capture_time = time.monotonic()
+
+      if not ret:
+        return False, None, None
+
+      ret, frame = self.capture.retrieve()
+      return ret, frame, capture_time
+
+    if self.kind == "video":
+      ret, frame = self.capture.read()
+    elif self.frame_index < len(self.images):
+      frame = cv.imread(self.images[self.frame_index])
+      ret = frame is not None
+    else:
+      ret, frame = False, None
+
+    if not ret:
+      return False, None, None
+
+    # Recorded frames of every worker share the same clock, so frames of the same index pair up
+    capture_time = self.start_time + self.frame_index / self.fps
+    self.frame_index += 1
+
+    if self.realtime:
+      delay = capture_time - time.monotonic()
+      if delay > 0:
+        time.sleep(delay)
+
+    return True, frame, capture_time
+
+  def release(self):
+    if self.kind != "images":
+      self.capture.release()
+
+def camera_worker(camera: int, spec, options: dict, result_queue, start_event, start_time, stop_event, realtime: bool, slots: int):
+  import mediapipe as mp
+
+  # Recognizer runs synchronously, this process only serves one camera
+  recognizer_options = mp.tasks.vision.GestureRecognizerOptions(
+    base_options = mp.tasks.BaseOptions(model_asset_path = options["model_path"]),
+    running_mode = mp.tasks.vision.RunningMode.VIDEO,
+    num_hands = options["num_hands"],
+    min_hand_detection_confidence = options["min_hand_detection_confidence"],
+    min_hand_presence_confidence = options["min_hand_presence_confidence"],
+    min_tracking_confidence = options["min_tracking_confidence"]
+  )
+  recognizer = mp.tasks.vision.GestureRecognizer.create_from_options(recognizer_options)
+
+  # Results of frames recognized before are read back instead of running the recognizer again
+  cache = None
+  if options.get("inference_cache") is not None:
+    cache = InferenceCache(cache_path(options["inference_cache"], camera), options["model_path"], cache_settings(options))
+
+  # Wait for every worker to be ready so replays start together
+  result_queue.put(("ready", camera))
+  start_event.wait()
+
+  reader = CameraReader(spec, start_time.value, realtime)
+  if not reader.isOpened():
+    result_queue.put(("end", camera, f"Can't open camera {camera}"))
+    recognizer.close()
+    return
+
+  ring = None
+  roi = None
+  sequence = 0
+  timestamp_ms = 0
+
+  while not stop_event.is_set():
+    ret, frame, capture_time = reader.read()
+
+    if not ret:
+      result_queue.put(("end", camera, f"Can't receive frame from camera {camera}"))
+      break
+
+    # Frame memory is created once the frame size is known
+    if ring is None:
+      ring = SharedFrameRing(frame.shape, slots)
+      result_queue.put(("open", camera, ring.name, frame.shape, slots))
+
+      # Regions of interest around the hand, results are mapped back to full frame coordinates
+      if options.get("roi", False):
+        roi = RoiTracker(frame.shape[1], frame.shape[0])
+
+    sequence += 1
+    slot = ring.write(frame, sequence)
+
+    # Frames between recognized ones are only announced, the coordinator predicts the pose for them
+    if (sequence - 1) % options.get("inference_stride", 1) != 0:
+      result_queue.put(("frame", camera, slot, sequence, capture_time))
+      continue
+
+    # MediaPipe needs strictly increasing timestamps
+    timestamp_ms = max(int(capture_time * 1000), timestamp_ms + 1)
+
+    start = time.perf_counter()
+
+    key = cached = None
+    if cache is not None:
+      key = cache.key(frame)
+      cached = cache.get(key)
+
+    if cached is not None:
+      landmarks, gestures = cached
+
+      # The region follows cached results the same way it follows recognized ones
+      if roi is not None:
+        roi.update(landmarks)
+    else:
+      # Crop around the tracked hand, or downscale the full frame while it is lost
+      image, region = (frame, None) if roi is None else roi.prepare(frame)
+      result = recognizer.recognize_for_video(mp.Image(image_format = mp.ImageFormat.SRGB, data = image), timestamp_ms)
+
+      # Only compact landmark arrays and gesture names go back to the coordinator
+      if roi is None:
+        landmarks = landmarks_to_xyz(result.hand_landmarks)
+      else:
+        landmarks = roi.to_frame(result.hand_landmarks, region)
+        roi.update(landmarks)
+
+      gestures = [[Category(category.category_name, category.score) for category in hand] for hand in result.gestures]
+
+      if cache is not None:
+        cache.put(key, landmarks, gestures)
+
+    inference_time = time.perf_counter() - start
+
+    # Whether the result came from the cache, None without a cache
+    hit = None if cache is None else cached is not None
+
+    result_queue.put(("result", camera, slot, sequence, capture_time, timestamp_ms, inference_time, landmarks, gestures, hit))
+
+  reader.release()
+  recognizer.close()
+
+  if cache is not None:
+    cache.close()
+
+  if ring is not None:
+    ring.close()
+
+class InferenceWorkers():
+  # One process per camera doing capture and recognition, results are gathered here
+  def __init__(self, specs, options: dict, realtime: bool = True, slots: int = 4):
+    # Spawned processes behave the same on every platform and do not inherit MediaPipe state
+    context = multiprocessing.get_context("spawn")
+
+    self.result_queue = context.Queue()
+    self.start_event = context.Event()
+    self.stop_event = context.Event()
+    self.start_time = context.Value("d", 0.0)
+
+    self.processes = [
+      context.Process(target=camera_worker, name=f"camera_{camera}_worker", args=(camera, spec, options, self.result_queue, self.start_event, self.start_time, self.stop_event, realtime, slots), daemon=True)
+      for camera, spec in enumerate(specs)
+    ]
+
+    self.rings = [None] * len(specs)
+    self.shapes = [None] * len(specs)
+    self.latest = [None] * len(specs)
+
+    self.error = None
+
+  def start(self, timeout: float = 60.0) -> bool:
+    for process in self.processes:
+      process.start()
+
+    # Wait until every recognizer is loaded, a worker that dies while starting is reported right away
+    ready = 0
+    deadline = time.monotonic() + timeout
+    while ready < len(self.processes):
+      try:
+        message = self.result_queue.get(timeout=0.25)
+      except queue.Empty:
+        message = None
+
+      if message is not None and message[0] == "ready":
+        ready += 1
+        continue
+
+      for camera, process in enumerate(self.processes):
+        if process.exitcode is not None:
+          self.error = f"Inference worker of camera {camera} exited with code {process.exitcode} while starting"
+          return False
+
+      if time.monotonic() > deadline:
+        self.error = "Inference workers did not start in time"
+        return False
+
+    self.start_time.value = time.monotonic()
+    self.start_event.set()
+
+    return True
+
+  def poll(self, stores, metrics=None, timeout: float = 1.0) -> bool:
+    # Wait for at least one message, then take everything that is queued
+    try:
+      messages = [self.result_queue.get(timeout=timeout)]
+    except queue.Empty:
+      self.error = "No results from inference workers"
+      return False
+
+    while True:
+      try:
+        messages.append(self.result_queue.get_nowait())
+      except queue.Empty:
+        break
+
+    for message in messages:
+      kind, camera = message[0], message[1]
+
+      if kind == "open":
+        _, _, name, shape, slots = message
+        self.rings[camera] = SharedFrameRing(shape, slots, name)
+        self.shapes[camera] = shape
+      elif kind == "frame":
+        self.latest[camera] = message[2:4]
+      elif kind == "result":
+        _, _, slot, sequence, capture_time, timestamp_ms, inference_time, landmarks, gestures, hit = message
+        stores[camera].put(timestamp_ms, capture_time, landmarks, gestures)
+        self.latest[camera] = (slot, sequence)
+
+        # Cache hits would hide the recognizer latency, they are only counted
+        if metrics is not None:
+          if hit:
+            metrics.increment("inference_cache_hits")
+          else:
+            metrics.record("inference", inference_time)
+
+          if hit is False:
+            metrics.increment("inference_cache_misses")
+      elif kind == "end":
+        self.error = message[2]
+        return False
+
+    return True
+
+  def frame_size(self, camera: int):
+    # (width, height) of the frames of a camera, once known
+    if self.shapes[camera] is None:
+      return None
+
+    return self.shapes[camera][1], self.shapes[camera][0]
+
+  def frame(self, camera: int):
+    # Copy of the newest frame of a camera, or None
+    if self.rings[camera] is None or self.latest[camera] is None:
+      return None
+
+    slot, sequence = self.latest[camera]
+
+    return self.rings[camera].read(slot, sequence)
+
+  def release(self, timeout: float = 5.0):
+    self.stop_event.set()
+    self.start_event.set()
+
+    # Keep the queue drained so workers can flush their last messages and exit
+    deadline = time.monotonic() + timeout
+    for process in self.processes:
+      while process.is_alive() and time.monotonic() < deadline:
+        try:
+          while True:
+            self.result_queue.get_nowait()
+        except queue.Empty:
+          pass
+
+        process.join(timeout=0.1)
+
+      if process.is_alive():
+        process.terminate()
+
+    for ring in self.rings:
+      if ring is not None:
+        ring.close()
\ No newline at end of file
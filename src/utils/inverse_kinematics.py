@@ -1,80 +1,124 @@
-from coppeliasim_zmqremoteapi_client import RemoteAPIClient
 import numpy as np
 
+from utils.simulator import get_simulator, reset_simulator
+from utils.joint_sender import JointCommandSender
+
 # Robot constants
 d_1 = 20
 d_4 = 20
 a_2 = 20
 
-# Theta and angles array
-theta = np.empty(6)
+# Offsets between the solved angles and the joint positions of the simulated robot
+JOINT_OFFSETS = np.array([0, -3*(np.pi * 0.25), 3*(np.pi * 0.25), 0, 0, np.pi * 0.5])
+
+# Sender of joint targets, started on first use
+_sender = None
+
+# Angle of joint 3 sent last by inverse_kinematics(), the next orientation is relative to it
+_previous_theta_3 = 0.0
+
+def start_joint_sender(deadband: float = 0.005, metrics=None) -> JointCommandSender:
+  # Connection to CoppeliaSim is opened lazily by the sender thread and reused across sessions
+  global _sender
+
+  if _sender is None:
+    _sender = JointCommandSender(get_simulator, deadband, metrics, reset=reset_simulator)
+    _sender.start()
 
-# Coppeliasim Remote API
-client = RemoteAPIClient()
-sim = client.require("sim")
+  return _sender
 
-# Robot joints
-joint_0_obj = sim.getObject("./joint_0")
-joint_1_obj = sim.getObject("./joint_1")
-joint_2_obj = sim.getObject("./joint_2")
-joint_3_obj = sim.getObject("./joint_3")
-joint_4_obj = sim.getObject("./joint_4")
-joint_5_obj = sim.getObject("./joint_5")
+def stop_joint_sender():
+  global _sender
 
-# Helper function to normalize coordinates
-def clamp(value, min_val, max_val):
-  return max(min_val, min(value, max_val))
+  if _sender is not None:
+    _sender.stop()
+    _sender = None
+
+def solve_inverse_kinematics(positions, orientations, previous_theta_3=0.0, trajectory: bool = False):
+  # Joint angles (N, 6) and reachability mask (N,) for (N, 3) hand positions and orientations
+  # Orientation of joint 3 depends on its previous angle, given by previous_theta_3 as a scalar or
+  # one value per pose, or taken from the previous row when the poses are a trajectory
+  positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+  orientations = np.asarray(orientations, dtype=float).reshape(-1, 3)
+  angles = np.empty((positions.shape[0], 6))
 
-def inverse_kinematics(coords, orientation):
   # Get coordinates
-  x = coords[1]
-  y = coords[0]
-  z = coords[2]
+  x = positions[:, 1]
+  y = positions[:, 0]
+  z = positions[:, 2]
 
   # Get hand orientation
-  alpha = orientation[0]
-  miu = orientation[1]
-  phi = orientation[2]
-  
-  # Normalize coordinates
-  x = -x + 25
-  x = clamp(x, 0, 25)
-
-  y = clamp(y, -25, 25)
+  alpha = orientations[:, 0]
+  miu = orientations[:, 1]
+  phi = orientations[:, 2]
 
-  z -= 50
-  z = clamp(z, 0, 25)
+  # Normalize coordinates
+  x = np.clip(-x + 25, 0, 25)
+  y = np.clip(y, -25, 25)
+  z = np.clip(z - 50, 0, 25)
 
   # Joint 0
-  theta[0] = np.atan2(y, x)
-  # Joint 2
-  theta[2] = -np.arccos(((np.sqrt(x**2 + y**2))**2 + (z - d_1)**2 - a_2**2 - d_4**2) / (2*a_2 * d_4))
+  angles[:, 0] = np.arctan2(y, x)
+  # Joint 2, positions out of reach have their arccos argument outside [-1, 1] and get the closest pose
+  cos_theta_2 = ((np.sqrt(x**2 + y**2))**2 + (z - d_1)**2 - a_2**2 - d_4**2) / (2*a_2 * d_4)
+  reachable = np.abs(cos_theta_2) <= 1
+  angles[:, 2] = -np.arccos(np.clip(cos_theta_2, -1, 1))
   # Joint 1
-  theta[1] = np.atan2((z - d_1), (np.sqrt(x**2 + y**2))) - np.atan2((d_4*np.sin(theta[2])), (a_2 + d_4*np.cos(theta[2])))
+  angles[:, 1] = np.arctan2((z - d_1), (np.sqrt(x**2 + y**2))) - np.arctan2((d_4*np.sin(angles[:, 2])), (a_2 + d_4*np.cos(angles[:, 2])))
 
   # Normalize angles
-  theta[1] = clamp(theta[1], -3*(np.pi * 0.25), 3*(np.pi * 0.25))
-  theta[2] = clamp(theta[2], -3*(np.pi * 0.25), 3*(np.pi * 0.25))
+  angles[:, 1] = np.clip(angles[:, 1], -3*(np.pi * 0.25), 3*(np.pi * 0.25))
+  angles[:, 2] = np.clip(angles[:, 2], -3*(np.pi * 0.25), 3*(np.pi * 0.25))
 
   # Orientation offsets
-  alpha = alpha - (theta[1] + theta[3])
-  phi = phi - theta[0]
+  alpha = alpha - angles[:, 1]
+  phi = phi - angles[:, 0]
+
+  if trajectory:
+    # Each pose is relative to joint 3 of the one before, only this recurrence runs row by row
+    theta_3 = np.empty(positions.shape[0])
+    previous = float(previous_theta_3)
+    cos_phi = np.cos(phi)
+    sin_phi = np.sin(phi)
+
+    for i in range(positions.shape[0]):
+      y2 = np.sin(alpha[i] - previous) * cos_phi[i]
+      sign = -1.0 if sin_phi[i] < 0 else 1.0
+      previous = np.arctan2(sign * y2, sign * sin_phi[i])
+      theta_3[i] = previous
+
+    previous_theta_3 = np.concatenate([[float(previous_theta_3)], theta_3[:-1]])
+
+  alpha = alpha - previous_theta_3
 
   # Rotation coordinates
   x2 = np.cos(alpha) * np.cos(phi)
   y2 = np.sin(alpha) * np.cos(phi)
   z2 = np.sin(phi)
 
-  # Joint 3
-  theta[3] = np.atan(y2 / z2)
-  # Joint 4
-  theta[4] = -np.atan(z2 / (np.sqrt(x2/y2)))
+  # Joint 3, atan(y2 / z2) without dividing by zero
+  sign = np.where(z2 < 0, -1.0, 1.0)
+  angles[:, 3] = np.arctan2(sign * y2, sign * z2)
+  # Joint 4, atan(z2 / sqrt(x2 / y2)) is only defined when x2 and y2 have the same sign
+  reachable &= x2 * y2 >= 0
+  angles[:, 4] = -np.arctan2(z2 * np.sqrt(np.abs(y2)), np.sqrt(np.abs(x2)))
   # Joint 5
-  theta[5] = -theta[3] + miu
-
-  sim.setJointTargetPosition(joint_5_obj, theta[5] + (np.pi * 0.5))
-  sim.setJointTargetPosition(joint_4_obj, theta[4] + 0)
-  sim.setJointTargetPosition(joint_3_obj, theta[3] + 0)
-  sim.setJointTargetPosition(joint_2_obj, theta[2] + 3*(np.pi * 0.25))
-  sim.setJointTargetPosition(joint_1_obj, theta[1] - 3*(np.pi * 0.25))
-  sim.setJointTargetPosition(joint_0_obj, theta[0] + 0)
\ No newline at end of file
+  angles[:, 5] = -angles[:, 3] + miu
+
+  return angles, reachable
+
+def inverse_kinematics(coords, orientation, capture_time: float = None):
+  # Solve a single pose, following the orientation of joint 3 from the previous call
+  # capture_time is the time.monotonic() capture time of the oldest frame behind the pose
+  global _previous_theta_3
+
+  angles, _ = solve_inverse_kinematics(coords, orientation, _previous_theta_3)
+  _previous_theta_3 = angles[0, 3]
+
+  # Joint targets in order from joint 0 to joint 5
+  targets = angles[0] + JOINT_OFFSETS
+
+  # Hand targets over to the sender thread
+  start_joint_sender().submit(targets, capture_time)
+
+  return targets
\ No newline at end of file
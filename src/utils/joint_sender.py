@@ -0,0 +1,97 @@
+import time
+import threading
+
+import numpy as np
+
+class JointCommandSender():
+  # Sends joint targets to the simulator from its own thread, only the latest target is kept
+  def __init__(self, connect, deadband: float = 0.005, metrics=None, retry_interval: float = 1.0, reset=None):
+    # connect returns an object with set_joint_targets(targets), it is only called from the sender thread
+    # reset drops that object after a failed send, so the next one connects again
+    self.connect = connect
+    self.reset = reset
+
+    # Targets that differ less than deadband radians in every joint from the last sent ones are dropped
+    self.deadband = deadband
+    self.metrics = metrics
+    self.retry_interval = retry_interval
+
+    self.target = None
+    self.last_sent = None
+
+    # Capture time of the oldest frame behind the pending target, motion to output is measured from it
+    self.capture_time = None
+
+    # Last failure to send, None once targets go through again
+    self.error = None
+    self.condition = threading.Condition()
+
+    self.stop_event = threading.Event()
+    self.thread = threading.Thread(target=self.run, name="joint_sender", daemon=True)
+
+  def start(self):
+    self.thread.start()
+
+  def submit(self, targets, capture_time: float = None):
+    # Replace the pending target, the tracking loop never waits for the simulator
+    with self.condition:
+      if self.target is not None and self.metrics is not None:
+        self.metrics.increment("joint_commands_coalesced")
+
+      self.target = np.array(targets, dtype=float)
+      self.capture_time = capture_time
+      self.condition.notify()
+
+  def run(self):
+    while not self.stop_event.is_set():
+      with self.condition:
+        self.condition.wait_for(lambda: self.target is not None or self.stop_event.is_set())
+        target = self.target
+        capture_time = self.capture_time
+        self.target = None
+
+      if target is None:
+        continue
+
+      if self.last_sent is not None and np.max(np.abs(target - self.last_sent)) < self.deadband:
+        if self.metrics is not None:
+          self.metrics.increment("joint_commands_deadband")
+        continue
+
+      try:
+        start = time.perf_counter()
+        self.connect().set_joint_targets(target)
+
+        if self.metrics is not None:
+          self.metrics.record("joint_command", time.perf_counter() - start)
+
+          # From the capture of the oldest frame behind the target until the simulator has it
+          if capture_time is not None:
+            self.metrics.record("motion_to_output", time.monotonic() - capture_time)
+      except Exception as error:
+        # Only the first failure of a streak is printed, the session sees all of them as a counter
+        if self.error is None:
+          print(f"Can't send joint targets: {error}")
+
+        self.error = str(error)
+        if self.metrics is not None:
+          self.metrics.increment("joint_command_errors")
+
+        if self.reset is not None:
+          self.reset()
+
+        self.stop_event.wait(self.retry_interval)
+        continue
+
+      self.error = None
+      self.last_sent = target
+
+  def stop(self, timeout: float = 1.0):
+    self.stop_event.set()
+
+    with self.condition:
+      self.condition.notify()
+
+    # A round-trip to a simulator that went away can block, the thread is a daemon
+    if self.thread.is_alive():
+      self.thread.join(timeout)
\ No newline at end of file
@@ -0,0 +1,10 @@
+import numpy as np
+
+from utils.draw_landmarks import landmarks_to_array
+
+def landmarks_to_points(landmarks, frame_width: int, frame_height: int):
+  # Pixel coordinates of the 21 landmarks followed by the center of the hand
+  points = landmarks_to_array(landmarks) * (frame_width, frame_height)
+  center = (points[0] + points[9]) / 2
+
+  return np.vstack([points, center])
\ No newline at end of file
@@ -0,0 +1,238 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+class RollingHistogram():
+  # Keeps the latest samples in a fixed size ring buffer
+  def __init__(self, size: int = 1024):
+    self.samples = np.zeros(size)
+    self.index = 0
+    self.count = 0
+
+  def add(self, value: float):
+    self.samples[self.index] = value
+    self.index = (self.index + 1) % self.samples.size
+    self.count += 1
+
+  def summary(self) -> dict:
+    window = self.samples[:min(self.count, self.samples.size)]
+
+    if window.size == 0:
+      return {"count": 0}
+
+    p50, p95, p99 = np.percentile(window, [50, 95, 99])
+
+    return {
+      "count": self.count,
+      "mean": float(window.mean()),
+      "p50": float(p50),
+      "p95": float(p95),
+      "p99": float(p99),
+      "max": float(window.max())
+    }
+
+class Metrics():
+  def __init__(self, window: int = 1024, publish_interval: float = 0.25):
+    self.window = window
+    self.histograms = {}
+    self.counters = {}
+    self.start_time = time.monotonic()
+    self.last_frame_time = None
+
+    # Stages are recorded from the main loop and from MediaPipe callback threads
+    self.lock = threading.Lock()
+
+    # Snapshot replaced every publish_interval seconds by the loop, readers take it without locking
+    self.publish_interval = publish_interval
+    self.published = None
+    self.last_publish_time = None
+
+  def record(self, stage: str, seconds: float):
+    with self.lock:
+      if stage not in self.histograms:
+        self.histograms[stage] = RollingHistogram(self.window)
+
+      self.histograms[stage].add(seconds)
+
+  @contextmanager
+  def time(self, stage: str):
+    start = time.perf_counter()
+    try:
+      yield
+    finally:
+      self.record(stage, time.perf_counter() - start)
+
+  def increment(self, counter: str, amount: int = 1):
+    with self.lock:
+      self.counters[counter] = self.counters.get(counter, 0) + amount
+
+  def frame(self):
+    # Mark the end of a loop iteration, the interval between marks gives the frame rate
+    now = time.monotonic()
+
+    if self.last_frame_time is not None:
+      self.record("frame", now - self.last_frame_time)
+
+    self.last_frame_time = now
+    self.increment("frames")
+
+    # A whole new dict is assigned, readers see either the previous snapshot or this one
+    if self.last_publish_time is None or now - self.last_publish_time >= self.publish_interval:
+      self.published = self.snapshot()
+      self.last_publish_time = now
+
+  def latest(self) -> dict:
+    # Last published snapshot, or None before the first one, never waits for the loop
+    return self.published
+
+  def snapshot(self) -> dict:
+    with self.lock:
+      stages = {stage: histogram.summary() for stage, histogram in self.histograms.items()}
+      counters = dict(self.counters)
+
+    frame = stages.get("frame", {})
+
+    return {
+      "time": time.time(),
+      "uptime": time.monotonic() - self.start_time,
+      "fps": 1 / frame["mean"] if frame.get("mean") else 0.0,
+      "stages": stages,
+      "counters": counters
+    }
+
+def prometheus_text(snapshot: dict, prefix: str = "hand_tracking") -> str:
+  lines = [
+    f"# TYPE {prefix}_fps gauge",
+    f"{prefix}_fps {snapshot['fps']}",
+    f"# TYPE {prefix}_uptime_seconds gauge",
+    f"{prefix}_uptime_seconds {snapshot['uptime']}",
+    f"# TYPE {prefix}_stage_seconds summary"
+  ]
+
+  for stage, summary in snapshot["stages"].items():
+    if summary["count"] == 0:
+      continue
+
+    for quantile in ["p50", "p95", "p99"]:
+      lines.append(f"{prefix}_stage_seconds{{stage=\"{stage}\",quantile=\"0.{quantile[1:]}\"}} {summary[quantile]}")
+
+    lines.append(f"{prefix}_stage_seconds_count{{stage=\"{stage}\"}} {summary['count']}")
+
+  lines.append(f"# TYPE {prefix}_events_total counter")
+  for counter, value in snapshot["counters"].items():
+    lines.append(f"{prefix}_events_total{{event=\"{counter}\"}} {value}")
+
+  return "\n".join(lines) + "\n"
+
+def dashboard_text(snapshot: dict) -> str:
+  # Plain text summary of a snapshot for the GUI, fixed width so columns line up
+  if snapshot is None:
+    return "Waiting for the first frames"
+
+  counters = snapshot["counters"]
+  submitted = counters.get("inference_submitted", 0)
+  dropped = counters.get("inference_dropped", 0)
+  skew = snapshot["stages"].get("skew", {"count": 0})
+  skew_text = f"{skew['p50'] * 1000:.1f} / {skew['p95'] * 1000:.1f}" if skew["count"] else "-"
+
+  lines = [
+    f"{'FPS':<22}{snapshot['fps']:>10.1f}",
+    f"{'Inference drop rate':<22}{(dropped / submitted if submitted else 0.0):>10.1%}",
+    f"{'Skew p50 / p95 ms':<22}{skew_text:>10}",
+    f"{'Simulator errors':<22}{counters.get('joint_command_errors', 0):>10}",
+    f"{'DLT fallback points':<22}{counters.get('triangulation_fallbacks', 0):>10}",
+    "",
+    f"{'stage':<22}{'p50 ms':>10}{'p95 ms':>10}"
+  ]
+
+  for stage, summary in snapshot["stages"].items():
+    if stage in ["frame", "skew"] or summary["count"] == 0:
+      continue
+
+    lines.append(f"{stage:<22}{summary['p50'] * 1000:>10.2f}{summary['p95'] * 1000:>10.2f}")
+
+  return "\n".join(lines)
+
+class MetricsExporter():
+  # Periodically writes snapshots as JSON lines, or as a Prometheus text file when the path ends in .prom
+  def __init__(self, metrics: Metrics, path: str, interval: float = 1.0):
+    self.metrics = metrics
+    self.path = path
+    self.interval = interval
+    self.prometheus = path.endswith(".prom")
+
+    self.stop_event = threading.Event()
+    self.thread = threading.Thread(target=self.run, name="metrics_exporter", daemon=True)
+
+  def start(self):
+    self.thread.start()
+
+  def run(self):
+    while not self.stop_event.wait(self.interval):
+      self.export()
+
+  def export(self):
+    snapshot = self.metrics.snapshot()
+
+    if self.prometheus:
+      # Replace the whole file at once so scrapers never read a partial file
+      temporary_path = f"{self.path}.tmp"
+      with open(temporary_path, "w") as file:
+        file.write(prometheus_text(snapshot))
+      os.replace(temporary_path, self.path)
+    else:
+      with open(self.path, "a") as file:
+        file.write(json.dumps(snapshot) + "\n")
+
+  def stop(self):
+    self.stop_event.set()
+
+    if self.thread.is_alive():
+      self.thread.join()
+
+    # Final snapshot with the complete session
+    self.export()
+
+class InferenceTracker():
+  # Follows frames submitted to a live stream recognizer until their result arrives
+  def __init__(self, metrics: Metrics, stage: str = "inference"):
+    self.metrics = metrics
+    self.stage = stage
+
+    # Timestamp in ms -> (capture time, submit time)
+    self.pending = {}
+    self.lock = threading.Lock()
+
+  def submit(self, timestamp_ms: int, capture_time: float):
+    with self.lock:
+      self.pending[timestamp_ms] = (capture_time, time.monotonic())
+
+    # Submitted and dropped frames give the drop rate
+    self.metrics.increment("inference_submitted")
+
+  def arrived(self, timestamp_ms: int):
+    # Returns the capture time of the frame the result belongs to
+    now = time.monotonic()
+
+    with self.lock:
+      entry = self.pending.pop(timestamp_ms, None)
+
+      # Frames submitted before this one will never get a result
+      dropped = [timestamp for timestamp in self.pending if timestamp < timestamp_ms]
+      for timestamp in dropped:
+        del self.pending[timestamp]
+
+    if dropped:
+      self.metrics.increment("inference_dropped", len(dropped))
+
+    if entry is None:
+      return None
+
+    capture_time, submit_time = entry
+    self.metrics.record(self.stage, now - submit_time)
+
+    return capture_time
\ No newline at end of file
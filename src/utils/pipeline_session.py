@@ -0,0 +1,44 @@
+import threading
+import traceback
+
+from utils.metrics import Metrics
+
+class PipelineSession():
+  # Runs one pipeline function in a worker thread, it is stopped through its stop_event argument
+  def __init__(self, name: str, function, with_metrics: bool = False, **kwargs):
+    self.name = name
+    self.stop_event = threading.Event()
+
+    # Pipelines that report metrics get their own, readable through metrics.latest() while they run
+    self.metrics = Metrics() if with_metrics else None
+    if with_metrics:
+      kwargs["metrics"] = self.metrics
+
+    self.function = function
+    self.kwargs = kwargs
+    self.error = None
+
+    self.thread = threading.Thread(target=self.run, name=f"{name}_session", daemon=True)
+
+  def start(self):
+    self.thread.start()
+
+  def run(self):
+    try:
+      self.function(stop_event=self.stop_event, **self.kwargs)
+    except SystemExit:
+      # Pipelines exit when a camera can't be opened, that only ends this session
+      self.error = "Session ended early, see the console for details"
+    except Exception as error:
+      traceback.print_exc()
+      self.error = str(error)
+
+  def stop(self):
+    # The pipeline checks the event once per frame and releases its cameras and windows
+    self.stop_event.set()
+
+  def is_running(self) -> bool:
+    return self.thread.is_alive()
+
+  def join(self, timeout: float = None):
+    self.thread.join(timeout)
\ No newline at end of file
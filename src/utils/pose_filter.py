@@ -0,0 +1,98 @@
+import numpy as np
+
+def wrap_angle(angle):
+  # Angle in [-pi, pi)
+  return (angle + np.pi) % (2 * np.pi) - np.pi
+
+class PoseFilter():
+  # Constant velocity Kalman filter over the hand position (x, y, z) and rotation (x, y, z)
+  def __init__(self, position_noise: float = 2e4, rotation_noise: float = 50.0, position_measurement_noise: float = 4.0, rotation_measurement_noise: float = 3e-3, max_prediction: float = 0.25):
+    # Process noise is the variance of the acceleration, measurement noise the variance of a reading
+    self.process_noise = np.array([position_noise] * 3 + [rotation_noise] * 3)
+    self.measurement_noise = np.array([position_measurement_noise] * 3 + [rotation_measurement_noise] * 3)
+
+    # Poses are not predicted further than max_prediction seconds past the last measurement
+    self.max_prediction = max_prediction
+
+    self.reset()
+
+  def reset(self):
+    # Value and velocity of each of the 6 dimensions, with their 2x2 covariance stored as (pp, pv, vv)
+    self.value = np.zeros(6)
+    self.velocity = np.zeros(6)
+    self.covariance = np.zeros((3, 6))
+
+    self.timestamp = None
+    self.last_update = None
+
+  def propagate(self, timestamp: float):
+    # Move the state forward to timestamp
+    dt = timestamp - self.timestamp
+    if dt <= 0:
+      return
+
+    pp, pv, vv = self.covariance
+    q = self.process_noise
+
+    self.value = self.value + self.velocity * dt
+    self.value[3:] = wrap_angle(self.value[3:])
+
+    # F P F' + Q for F = [[1, dt], [0, 1]] and white noise acceleration
+    self.covariance = np.array([
+      pp + 2 * dt * pv + dt * dt * vv + q * dt ** 3 / 3,
+      pv + dt * vv + q * dt ** 2 / 2,
+      vv + q * dt
+    ])
+
+    self.timestamp = timestamp
+
+  def update(self, position, rotation, timestamp: float):
+    measurement = np.concatenate([np.asarray(position, dtype=float), np.asarray(rotation, dtype=float)])
+
+    # Start from the first measurement, or again after a long gap without hands
+    if self.last_update is None or timestamp - self.last_update > self.max_prediction:
+      self.value = measurement
+      self.velocity = np.zeros(6)
+      self.covariance = np.array([self.measurement_noise, np.zeros(6), self.process_noise * self.max_prediction])
+      self.timestamp = timestamp
+      self.last_update = timestamp
+      return
+
+    # Measurements can arrive out of order when cameras lag, older ones are ignored
+    if timestamp < self.timestamp:
+      return
+
+    self.propagate(timestamp)
+
+    pp, pv, vv = self.covariance
+
+    innovation = measurement - self.value
+    innovation[3:] = wrap_angle(innovation[3:])
+
+    # Kalman gain for H = [1, 0]
+    s = pp + self.measurement_noise
+    gain_value = pp / s
+    gain_velocity = pv / s
+
+    self.value = self.value + gain_value * innovation
+    self.value[3:] = wrap_angle(self.value[3:])
+    self.velocity = self.velocity + gain_velocity * innovation
+
+    self.covariance = np.array([
+      (1 - gain_value) * pp,
+      (1 - gain_value) * pv,
+      vv - gain_velocity * pv
+    ])
+
+    self.last_update = timestamp
+
+  def predict(self, timestamp: float):
+    # Returns (position, rotation) expected at timestamp, or None if there is no recent measurement
+    if self.last_update is None or timestamp - self.last_update > self.max_prediction:
+      return None
+
+    dt = max(0.0, timestamp - self.timestamp)
+    value = self.value + self.velocity * dt
+    value[3:] = wrap_angle(value[3:])
+
+    return value[:3], list(value[3:])
\ No newline at end of file
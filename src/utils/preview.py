@@ -0,0 +1,66 @@
+import time
+import threading
+
+import cv2 as cv
+
+from utils.draw_landmarks import draw_preview
+from utils.write_gesture import write_gesture
+
+class PreviewWindow():
+  # Shows the latest frames of each window from its own thread at a capped rate
+  def __init__(self, names, fps: float = 15.0, scale: float = 0.5):
+    self.interval = 1 / fps
+    self.scale = scale
+
+    # Window name -> (frame, hands, gesture) waiting to be shown
+    self.slots = {name: None for name in names}
+    self.lock = threading.Lock()
+
+    # Set when Q is pressed in any of the windows
+    self.quit_event = threading.Event()
+
+    self.stop_event = threading.Event()
+    self.thread = threading.Thread(target=self.run, name="preview", daemon=True)
+
+  def start(self):
+    self.thread.start()
+
+  def submit(self, name: str, frame, hands=None, gesture=None):
+    # Replace whatever was waiting, the tracking loop never blocks on the display
+    with self.lock:
+      self.slots[name] = (frame, hands, gesture)
+
+  def run(self):
+    while not self.stop_event.is_set():
+      start = time.monotonic()
+
+      with self.lock:
+        slots = self.slots
+        self.slots = {name: None for name in slots}
+
+      # Annotate downscaled copies, capture frames are never modified
+      for name, entry in slots.items():
+        if entry is None:
+          continue
+
+        frame, hands, gesture = entry
+        preview = draw_preview(frame, hands if hands is not None else [], self.scale)
+        write_gesture(preview, gesture)
+        cv.imshow(name, preview)
+
+      # Get pressed key
+      pressed_key = cv.waitKey(1) & 0xFF
+
+      if pressed_key == ord('q') or pressed_key == ord('Q'):
+        self.quit_event.set()
+
+      # Sleep for the rest of the frame period
+      self.stop_event.wait(max(0.0, self.interval - (time.monotonic() - start)))
+
+    cv.destroyAllWindows()
+
+  def stop(self):
+    self.stop_event.set()
+
+    if self.thread.is_alive():
+      self.thread.join()
\ No newline at end of file
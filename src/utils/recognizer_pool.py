@@ -0,0 +1,112 @@
+import os
+import time
+import threading
+
+from utils.startup import timed_import, record_startup
+
+# Recognizers shared by every session of the process
+_pool = None
+
+def recognizer_key(options: dict) -> tuple:
+  # Options a recognizer is built with, a different key needs new recognizers
+  return (
+    options["model_path"],
+    os.path.getmtime(options["model_path"]),
+    options["num_hands"],
+    options["min_hand_detection_confidence"],
+    options["min_hand_presence_confidence"],
+    options["min_tracking_confidence"]
+  )
+
+class RecognizerPool():
+  # Live stream gesture recognizers kept between sessions, rebuilt only when their options change
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.key = None
+    self.recognizers = []
+
+    # Result callback of the session using each recognizer, None while no session runs
+    self.callbacks = []
+
+  def prepare(self, options: dict, cameras: int):
+    # Recognizers for the first cameras, created on demand
+    key = recognizer_key(options)
+
+    with self.lock:
+      if key != self.key:
+        self.close_recognizers()
+        self.key = key
+
+      while len(self.recognizers) < cameras:
+        self.recognizers.append(self.create(options, len(self.recognizers)))
+        self.callbacks.append(None)
+
+      return self.recognizers[:cameras]
+
+  def create(self, options: dict, camera: int):
+    mp = timed_import("mediapipe")
+    start = time.perf_counter()
+
+    # Results go through the pool, so a new session only swaps the callback
+    def result_callback(result, output_image, timestamp_ms: int):
+      callback = self.callbacks[camera]
+
+      if callback is not None:
+        callback(result, output_image, timestamp_ms)
+
+    recognizer_options = mp.tasks.vision.GestureRecognizerOptions(
+      base_options = mp.tasks.BaseOptions(model_asset_path = options["model_path"]),
+      running_mode = mp.tasks.vision.RunningMode.LIVE_STREAM,
+      num_hands = options["num_hands"],
+      min_hand_detection_confidence = options["min_hand_detection_confidence"],
+      min_hand_presence_confidence = options["min_hand_presence_confidence"],
+      min_tracking_confidence = options["min_tracking_confidence"],
+      result_callback = result_callback
+    )
+    recognizer = mp.tasks.vision.GestureRecognizer.create_from_options(recognizer_options)
+
+    record_startup(f"recognizer {camera}", time.perf_counter() - start)
+
+    return recognizer
+
+  def acquire(self, options: dict, callbacks):
+    # Recognizers of a session, one per callback, results are delivered to the callbacks until release
+    recognizers = self.prepare(options, len(callbacks))
+
+    with self.lock:
+      self.callbacks[:len(callbacks)] = callbacks
+
+    return recognizers
+
+  def release(self):
+    # Recognizers stay loaded for the next session, late results are dropped
+    with self.lock:
+      self.callbacks = [None] * len(self.callbacks)
+
+  def close_recognizers(self):
+    # Called with the lock held
+    for recognizer in self.recognizers:
+      recognizer.close()
+
+    self.recognizers = []
+    self.callbacks = []
+
+  def close(self):
+    with self.lock:
+      self.close_recognizers()
+      self.key = None
+
+def get_recognizer_pool() -> RecognizerPool:
+  global _pool
+
+  if _pool is None:
+    _pool = RecognizerPool()
+
+  return _pool
+
+def close_recognizer_pool():
+  global _pool
+
+  if _pool is not None:
+    _pool.close()
+    _pool = None
\ No newline at end of file
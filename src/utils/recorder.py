@@ -0,0 +1,209 @@
+import os
+import json
+import queue
+import threading
+
+import numpy as np
+
+from utils.roi import landmarks_to_xyz
+
+# Version of the session layout, bumped whenever the record fields change
+RECORDING_VERSION = 1
+
+# Name of the session index, segments are listed in it in order
+INDEX_NAME = "session.json"
+
+def record_dtype(cameras: int = 2, hands: int = 1):
+  # One record per frame of the tracking loop, missing values are NaN
+  return np.dtype([
+    # time.monotonic() seconds of the loop iteration and capture times of the matched results
+    ("timestamp", np.float64),
+    ("capture_times", np.float64, (cameras,)),
+    # True when the frame produced a new set of results
+    ("new_set", np.bool_),
+    # Normalized landmarks and top gesture of every hand seen by every camera
+    ("landmarks", np.float32, (cameras, hands, 21, 3)),
+    ("gestures", "S24", (cameras, hands)),
+    ("confidences", np.float32, (cameras, hands)),
+    # Triangulated landmarks, position, rotation and track id of every hand
+    ("landmarks_3d", np.float32, (hands, 21, 3)),
+    ("positions", np.float64, (hands, 3)),
+    ("rotations", np.float64, (hands, 3)),
+    ("hand_ids", np.int64, (hands,)),
+    # Joint targets sent to the robot this frame
+    ("joints", np.float64, (6,))
+  ])
+
+class SessionRecorder():
+  # Appends one record per frame to memory mapped segment files from a background thread
+  def __init__(self, directory: str, cameras: int = 2, hands: int = 1, segment_records: int = 36000, queue_size: int = 1024, flush_interval: float = 1.0, metrics=None):
+    # segment_records is 20 minutes at 30 frames per second, segments are preallocated at that size
+    self.directory = directory
+    self.cameras = cameras
+    self.hands = hands
+    self.dtype = record_dtype(cameras, hands)
+    self.segment_records = segment_records
+    self.flush_interval = flush_interval
+    self.metrics = metrics
+
+    # Segment names start over for every recorder, an earlier session would be overwritten
+    if session_exists(directory):
+      raise FileExistsError(f"{directory} already holds a recorded session")
+
+    os.makedirs(directory, exist_ok=True)
+
+    # Frames waiting for the writer, the tracking thread drops frames instead of waiting
+    self.queue = queue.Queue(maxsize=queue_size)
+
+    # (file name, records written) of every segment, the last one is being written
+    self.segments = []
+    self.segment = None
+    self.position = 0
+
+    self.stop_event = threading.Event()
+    self.thread = threading.Thread(target=self.run, name="session_recorder", daemon=True)
+
+  def start(self):
+    self.thread.start()
+
+  def append(self, timestamp: float, results=None, poses=None, hand_ids=None, joints=None):
+    # Only references are queued, conversion to the record happens on the writer thread
+    # results is the matched set of recognition results, poses is (positions, rotations, landmarks_3d)
+    try:
+      self.queue.put_nowait((timestamp, results, poses, hand_ids, joints))
+    except queue.Full:
+      if self.metrics is not None:
+        self.metrics.increment("recorder_dropped")
+
+  def run(self):
+    last_flush = 0.0
+
+    while not (self.stop_event.is_set() and self.queue.empty()):
+      try:
+        frame = self.queue.get(timeout=self.flush_interval)
+      except queue.Empty:
+        frame = None
+
+      if frame is not None:
+        self.write(*frame)
+
+      # Make the records written so far visible to readers every flush_interval seconds
+      if frame is None or frame[0] - last_flush >= self.flush_interval:
+        self.flush()
+        last_flush = frame[0] if frame is not None else last_flush
+
+    self.flush()
+
+  def write(self, timestamp: float, results, poses, hand_ids, joints):
+    if self.segment is None or self.position == self.segment_records:
+      self.rotate()
+
+    record = self.segment[self.position]
+    record["timestamp"] = timestamp
+
+    if results is not None:
+      record["new_set"] = True
+      record["capture_times"] = [result.capture_time for result in results][:self.cameras]
+
+      for camera, result in enumerate(results[:self.cameras]):
+        landmarks = landmarks_to_xyz(result.hand_landmarks)[:self.hands]
+        record["landmarks"][camera, :len(landmarks)] = landmarks
+
+        for hand, gestures in enumerate(result.gestures[:self.hands]):
+          if len(gestures) > 0:
+            record["gestures"][camera, hand] = gestures[0].category_name.encode()[:24]
+            record["confidences"][camera, hand] = gestures[0].score
+
+    if poses is not None:
+      positions, rotations, landmarks_3d = (np.asarray(values)[:self.hands] for values in poses)
+      record["positions"][:len(positions)] = positions
+      record["rotations"][:len(rotations)] = rotations
+      record["landmarks_3d"][:len(landmarks_3d)] = landmarks_3d
+
+    if hand_ids is not None:
+      hand_ids = np.asarray(hand_ids)[:self.hands]
+      record["hand_ids"][:len(hand_ids)] = hand_ids
+
+    if joints is not None:
+      record["joints"] = joints
+
+    self.position += 1
+
+  def rotate(self):
+    # Close the current segment and preallocate the next one
+    if self.segment is not None:
+      self.flush()
+      del self.segment
+
+    name = f"segment_{len(self.segments):05d}.npy"
+    self.segment = np.lib.format.open_memmap(os.path.join(self.directory, name), mode="w+", dtype=self.dtype, shape=(self.segment_records,))
+
+    # Unwritten fields read as missing, the header is already final so readers can open the file right away
+    self.segment[:] = empty_record(self.dtype)
+    self.segments.append([name, 0])
+    self.position = 0
+
+  def flush(self):
+    if self.segment is None:
+      return
+
+    self.segment.flush()
+    self.segments[-1][1] = self.position
+
+    # Replace the index at once so readers never see a partial one
+    index = {
+      "version": RECORDING_VERSION,
+      "cameras": self.cameras,
+      "hands": self.hands,
+      "segment_records": self.segment_records,
+      "segments": [{"file": name, "records": records} for name, records in self.segments]
+    }
+
+    index_path = os.path.join(self.directory, INDEX_NAME)
+    with open(f"{index_path}.tmp", "w") as file:
+      json.dump(index, file)
+    os.replace(f"{index_path}.tmp", index_path)
+
+  def stop(self, timeout: float = 5.0):
+    # Write the frames still queued and close the last segment
+    self.stop_event.set()
+
+    if self.thread.is_alive():
+      self.thread.join(timeout)
+
+def empty_record(dtype):
+  # Record with every value missing
+  record = np.zeros((), dtype=dtype)
+
+  for name in dtype.names:
+    if np.issubdtype(dtype[name].base, np.floating):
+      record[name] = np.nan
+    elif np.issubdtype(dtype[name].base, np.integer):
+      record[name] = -1
+
+  return record
+
+def session_exists(directory: str) -> bool:
+  # True when a session was already recorded to the directory
+  return os.path.exists(os.path.join(directory, INDEX_NAME))
+
+def open_session(directory: str):
+  # Records of every segment of a session as read only memory mapped arrays, nothing is copied
+  index_path = os.path.join(directory, INDEX_NAME)
+
+  if not os.path.exists(index_path):
+    print(f"Could not find a recorded session in {directory}")
+    return
+
+  with open(index_path) as file:
+    index = json.load(file)
+
+  if index["version"] > RECORDING_VERSION:
+    print("Session was recorded by a newer version")
+    return
+
+  return [np.load(os.path.join(directory, segment["file"]), mmap_mode="r")[:segment["records"]] for segment in index["segments"]]
+
+def session_field(segments, name: str):
+  # One field of the whole session as a single array, only that field is copied
+  return np.concatenate([segment[name] for segment in segments])
\ No newline at end of file
@@ -0,0 +1,60 @@
+import time
+import itertools
+import threading
+from collections import namedtuple
+
+# Gesture category sent back by inference worker processes, same fields MediaPipe uses
+Category = namedtuple("Category", ["category_name", "score"])
+
+# Everything a recognizer produced for one frame, never modified after creation
+RecognitionResult = namedtuple("RecognitionResult", ["timestamp_ms", "capture_time", "arrival_time", "hand_landmarks", "gestures"])
+
+class ResultStore():
+  # Double buffered results of one recognizer, written from MediaPipe callback threads
+  def __init__(self):
+    self.buffers = [None, None]
+    self.front = 0
+    self.lock = threading.Lock()
+
+  def put(self, timestamp_ms: int, capture_time: float, hand_landmarks, gestures):
+    result = RecognitionResult(timestamp_ms, capture_time, time.monotonic(), hand_landmarks, gestures)
+
+    # Fill the back buffer and flip, readers always see a complete result
+    with self.lock:
+      back = 1 - self.front
+      self.buffers[back] = result
+      self.front = back
+
+  def latest(self) -> RecognitionResult:
+    with self.lock:
+      return self.buffers[self.front]
+
+  def entries(self):
+    # Newest result first, followed by the previous one
+    with self.lock:
+      buffers = [self.buffers[self.front], self.buffers[1 - self.front]]
+
+    return [result for result in buffers if result is not None and result.capture_time is not None]
+
+def has_hand(result: RecognitionResult) -> bool:
+  return result is not None and len(result.hand_landmarks) > 0 and len(result.gestures) > 0
+
+def match_results(stores, tolerance: float):
+  # Newest set of results, one per camera, whose frames were all captured within tolerance seconds
+  best = None
+
+  # Every store keeps two results, so there are 2^N combinations to check
+  for results in itertools.product(*(store.entries() for store in stores)):
+    capture_times = [result.capture_time for result in results]
+
+    if max(capture_times) - min(capture_times) > tolerance:
+      continue
+
+    if best is None or min(capture_times) > min(result.capture_time for result in best):
+      best = results
+
+  return best
+
+def result_age(results) -> float:
+  # Seconds since the oldest frame of the set was captured
+  return time.monotonic() - min(result.capture_time for result in results)
\ No newline at end of file
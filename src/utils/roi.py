@@ -0,0 +1,118 @@
+import threading
+
+import cv2 as cv
+import numpy as np
+
+def landmarks_to_xyz(hands) -> np.ndarray:
+  # MediaPipe landmarks of every hand as a (H, 21, 3) float32 array
+  if isinstance(hands, np.ndarray):
+    return hands.reshape(-1, 21, 3).astype(np.float32)
+
+  return np.array([[[landmark.x, landmark.y, landmark.z] for landmark in hand] for hand in hands], dtype=np.float32).reshape(-1, 21, 3)
+
+class RoiTracker():
+  # Chooses the region of the frame that goes to the recognizer, based on the last landmarks
+  def __init__(self, frame_width: int, frame_height: int, margin: float = 1.8, min_size: int = 192, max_size: int = 320, fallback_scale: float = 0.5):
+    self.frame_width = frame_width
+    self.frame_height = frame_height
+
+    # Crop side is the largest side of the hand bounding box times margin
+    self.margin = margin
+    self.min_size = min_size
+
+    # Crops larger than max_size pixels are downscaled before recognition
+    self.max_size = max_size
+
+    # Scale of the full frame used while no hand is being tracked
+    self.fallback_scale = fallback_scale
+
+    # Next region as (x, y, width, height) in frame pixels, None when tracking is lost
+    self.region = None
+
+    # Timestamp in ms -> region used for the frame, results arrive on other threads
+    self.pending = {}
+    self.lock = threading.Lock()
+
+  def resize(self, frame_width: int, frame_height: int):
+    # Recorded sources may have a different size than the one set in the .env file
+    if (frame_width, frame_height) != (self.frame_width, self.frame_height):
+      self.frame_width = frame_width
+      self.frame_height = frame_height
+      self.reset()
+
+  def reset(self):
+    with self.lock:
+      self.region = None
+
+  def prepare(self, frame: cv.typing.MatLike, timestamp_ms: int = None) -> cv.typing.MatLike:
+    # Returns the image to recognize, the crop around the hand or a downscaled full frame
+    with self.lock:
+      region = self.region
+
+      if region is None:
+        region = (0, 0, self.frame_width, self.frame_height)
+
+      if timestamp_ms is not None:
+        self.pending[timestamp_ms] = region
+
+    x, y, width, height = region
+
+    if region == (0, 0, self.frame_width, self.frame_height):
+      scale = self.fallback_scale
+    else:
+      scale = min(1.0, self.max_size / max(width, height))
+
+    image = frame[y:y + height, x:x + width]
+
+    if scale < 1.0:
+      image = cv.resize(image, None, fx=scale, fy=scale, interpolation=cv.INTER_AREA)
+
+    # MediaPipe images need contiguous memory, a crop is a strided view
+    return np.ascontiguousarray(image), region
+
+  def region_of(self, timestamp_ms: int):
+    # Region a submitted frame was cropped to, frames submitted before it will never get a result
+    with self.lock:
+      region = self.pending.pop(timestamp_ms, None)
+
+      for timestamp in [timestamp for timestamp in self.pending if timestamp < timestamp_ms]:
+        del self.pending[timestamp]
+
+    return region
+
+  def to_frame(self, hands, region) -> np.ndarray:
+    # Map landmarks normalized to the region back to full frame normalized coordinates
+    landmarks = landmarks_to_xyz(hands)
+
+    if region is None:
+      return landmarks
+
+    x, y, width, height = region
+
+    landmarks[..., 0] = (x + landmarks[..., 0] * width) / self.frame_width
+    landmarks[..., 1] = (y + landmarks[..., 1] * height) / self.frame_height
+    # Depth uses the same scale as x
+    landmarks[..., 2] *= width / self.frame_width
+
+    return landmarks
+
+  def update(self, landmarks: np.ndarray):
+    # Region for the next frame from full frame landmarks, tracking is lost without a hand
+    if len(landmarks) == 0:
+      self.reset()
+      return
+
+    pixels = landmarks[..., :2].reshape(-1, 2) * (self.frame_width, self.frame_height)
+    low = pixels.min(axis=0)
+    high = pixels.max(axis=0)
+
+    # Square crop centered on every tracked hand
+    center = (low + high) / 2
+    size = max(self.min_size, int(max(high - low) * self.margin))
+    size = min(size, self.frame_width, self.frame_height)
+
+    x = int(np.clip(center[0] - size / 2, 0, self.frame_width - size))
+    y = int(np.clip(center[1] - size / 2, 0, self.frame_height - size))
+
+    with self.lock:
+      self.region = (x, y, size, size)
\ No newline at end of file
@@ -0,0 +1,111 @@
+import os
+import math
+import time
+import threading
+
+# Connection shared by every session of the process
+_simulator = None
+
+# One connection attempt at a time, senders of later sessions wait for it instead of starting their own
+_connect_lock = threading.Lock()
+
+# Error of the last failed attempt and when it happened, attempts are spaced by RETRY_INTERVAL seconds
+_last_error = None
+_last_attempt = 0.0
+RETRY_INTERVAL = 1.0
+
+# Sets the target of every joint in one script call on the simulator side
+BATCH_SCRIPT = "local h = {{{handles}}} local v = {{{targets}}} for i = 1, #h do sim.setJointTargetPosition(h[i], v[i]) end"
+
+def lua_number(value) -> str:
+  # Lua has no literals for NaN and infinity
+  value = float(value)
+
+  if math.isnan(value):
+    return "0/0"
+  if math.isinf(value):
+    return "math.huge" if value > 0 else "-math.huge"
+
+  return repr(value)
+
+class Simulator():
+  # CoppeliaSim Remote API client with the handles of the robot joints
+  def __init__(self, host: str = "localhost", port: int = 23000, timeout: float = 2.0):
+    # Every round-trip fails after timeout seconds instead of blocking while the simulator is not running
+    import zmq
+    from coppeliasim_zmqremoteapi_client import RemoteAPIClient
+
+    self.client = RemoteAPIClient(host, port)
+    self.client.socket.setsockopt(zmq.RCVTIMEO, int(timeout * 1000))
+    self.client.socket.setsockopt(zmq.SNDTIMEO, int(timeout * 1000))
+    self.client.socket.setsockopt(zmq.LINGER, 0)
+
+    try:
+      self.connect()
+    except Exception:
+      self.close()
+      raise
+
+  def connect(self):
+    self.sim = self.client.require("sim")
+
+    # Robot joints
+    self.joints = [self.sim.getObject(f"./joint_{joint}") for joint in range(6)]
+
+    # Sandbox script used to run batched commands, None if the simulator does not provide one
+    try:
+      self.script = self.sim.getScript(self.sim.scripttype_sandbox)
+    except Exception:
+      self.script = None
+
+  def set_joint_targets(self, targets):
+    # One round-trip for all joints when possible, one per joint otherwise
+    if self.script is not None:
+      code = BATCH_SCRIPT.format(handles=", ".join(str(joint) for joint in self.joints), targets=", ".join(lua_number(target) for target in targets))
+
+      try:
+        self.sim.executeScriptString(code, self.script)
+        return
+      except Exception:
+        self.script = None
+
+    for joint, target in zip(self.joints, targets):
+      self.sim.setJointTargetPosition(joint, float(target))
+
+  def close(self):
+    # A request that timed out leaves the socket waiting for its reply, it can't be used again
+    self.client.socket.close(linger=0)
+
+def get_simulator() -> Simulator:
+  # Connect on first use and keep the connection for later sessions
+  # A failed attempt raises its error again until RETRY_INTERVAL seconds have passed
+  global _simulator, _last_error, _last_attempt
+
+  with _connect_lock:
+    if _simulator is not None:
+      return _simulator
+
+    if _last_error is not None and time.monotonic() - _last_attempt < RETRY_INTERVAL:
+      raise _last_error
+
+    _last_attempt = time.monotonic()
+
+    try:
+      _simulator = Simulator(os.getenv("COPPELIASIM_HOST", "localhost"), int(os.getenv("COPPELIASIM_PORT", "23000")))
+    except Exception as error:
+      _last_error = ConnectionError(f"Can't connect to CoppeliaSim: {error or 'no reply'}")
+      raise _last_error
+
+    _last_error = None
+
+    return _simulator
+
+def reset_simulator():
+  # Next get_simulator() call connects again, e.g. after the simulator was restarted or a round-trip timed out
+  global _simulator
+
+  with _connect_lock:
+    if _simulator is not None:
+      _simulator.close()
+
+    _simulator = None
\ No newline at end of file
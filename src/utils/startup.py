@@ -0,0 +1,32 @@
+import sys
+import time
+import importlib
+import threading
+
+# Seconds each heavy step took the first time, in the order they ran
+startup_times = {}
+lock = threading.Lock()
+
+def record_startup(name: str, seconds: float):
+  with lock:
+    startup_times.setdefault(name, seconds)
+
+def timed_import(name: str):
+  # Import a module on first use and remember how long it took, later calls return it right away
+  module = sys.modules.get(name)
+  if module is not None:
+    return module
+
+  start = time.perf_counter()
+  module = importlib.import_module(name)
+  record_startup(f"import {name}", time.perf_counter() - start)
+
+  return module
+
+def startup_report() -> str:
+  with lock:
+    times = dict(startup_times)
+
+  lines = [f"{name:<32}{seconds * 1000:>10.1f} ms" for name, seconds in times.items()]
+
+  return "\n".join(["Startup times"] + lines)
\ No newline at end of file
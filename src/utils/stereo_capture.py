@@ -0,0 +1,143 @@
+import time
+import threading
+from collections import deque
+
+import cv2 as cv
+
+from utils.frame_source import FrameSource, DEFAULT_FPS
+
+class CameraGrabber():
+  def __init__(self, camera_id: int, frame_width: int, frame_height: int, history: int = 2):
+    self.camera_id = camera_id
+
+    # Set webcam capture
+    self.capture = cv.VideoCapture(camera_id, cv.CAP_DSHOW)
+
+    # Set frame width and height
+    self.capture.set(cv.CAP_PROP_FRAME_WIDTH, frame_width)
+    self.capture.set(cv.CAP_PROP_FRAME_HEIGHT, frame_height)
+
+    # Newest frames as (sequence, timestamp, frame), older ones are dropped
+    self.frames = deque(maxlen=history)
+    self.sequence = 0
+    self.failed = False
+
+    # Slot lock, consumers wait on it for new frames
+    self.lock = threading.Lock()
+    self.new_frame = threading.Condition(self.lock)
+
+    self.running = False
+    self.thread = threading.Thread(target=self.run, name=f"camera_{camera_id}_grabber", daemon=True)
+
+  def isOpened(self) -> bool:
+    return self.capture.isOpened()
+
+  def start(self):
+    self.running = True
+    self.thread.start()
+
+  def run(self):
+    while self.running:
+      # Grab first and stamp right away, decoding happens afterwards
+      ret = self.capture.grab()
+      timestamp = time.monotonic()
+
+      if ret:
+        ret, frame = self.capture.retrieve()
+
+      with self.new_frame:
+        if not ret:
+          self.failed = True
+          self.new_frame.notify_all()
+          break
+
+        self.sequence += 1
+        self.frames.append((self.sequence, timestamp, frame))
+        self.new_frame.notify_all()
+
+  def wait_newer(self, sequence: int, timeout: float):
+    # Block until there is a frame newer than sequence
+    with self.new_frame:
+      return self.new_frame.wait_for(lambda: self.failed or self.sequence > sequence, timeout=timeout)
+
+  def snapshot(self):
+    # Copy of the slot, frames themselves are never modified by the grabber
+    with self.lock:
+      return list(self.frames)
+
+  def release(self):
+    self.running = False
+
+    if self.thread.is_alive():
+      self.thread.join()
+
+    self.capture.release()
+
+class StereoCapture(FrameSource):
+  # Any number of live cameras read as time aligned sets, camera 0 is the reference of the rig
+  def __init__(self, camera_ids, frame_width: int, frame_height: int, timeout: float = 1.0):
+    # Live cameras are always paced by the cameras themselves
+    super().__init__(len(camera_ids), realtime=True)
+
+    self.grabbers = [CameraGrabber(camera_id, frame_width, frame_height) for camera_id in camera_ids]
+    self.timeout = timeout
+
+    # Sets come at the rate of the slowest camera
+    self.fps = min(grabber.capture.get(cv.CAP_PROP_FPS) or DEFAULT_FPS for grabber in self.grabbers)
+
+    # Sequence of the last frame handed out per camera
+    self.last_sequences = [0] * self.cameras
+
+  def isOpened(self, camera: int) -> bool:
+    return self.grabbers[camera].isOpened()
+
+  def start(self):
+    for grabber in self.grabbers:
+      grabber.start()
+
+  def reopen(self, camera: int, camera_id: int, frame_width: int, frame_height: int) -> bool:
+    # Replace one camera of the rig with new settings, the others keep grabbing
+    self.grabbers[camera].release()
+
+    grabber = CameraGrabber(camera_id, frame_width, frame_height)
+    self.grabbers[camera] = grabber
+    self.last_sequences[camera] = 0
+
+    if not grabber.isOpened():
+      self.error = f"Can't open camera {camera}"
+      return False
+
+    grabber.start()
+
+    return True
+
+  def read_all(self):
+    # Wait until every camera has produced a frame that has not been used yet
+    for camera, grabber in enumerate(self.grabbers):
+      grabber.wait_newer(self.last_sequences[camera], self.timeout)
+
+    # Take the slots once all are ready, so faster cameras offer their newest frames
+    slots = []
+    for camera, grabber in enumerate(self.grabbers):
+      frames = [entry for entry in grabber.snapshot() if entry[0] > self.last_sequences[camera]]
+
+      if grabber.failed or len(frames) == 0:
+        self.error = f"Can't receive frame from camera {camera}"
+        return False, None
+
+      slots.append(frames)
+
+    # Anchor on the oldest newest frame, every other camera picks its closest frame to it
+    anchor_time = min(frames[-1][1] for frames in slots)
+    entries = [min(frames, key=lambda entry: abs(entry[1] - anchor_time)) for frames in slots]
+
+    self.last_sequences = [entry[0] for entry in entries]
+    self.timestamps = [entry[1] for entry in entries]
+    self.timestamp = max(self.timestamps)
+    self.skew = self.timestamp - min(self.timestamps)
+
+    return True, [entry[2] for entry in entries]
+
+  def release(self):
+    for grabber in self.grabbers:
+      grabber.release()
\ No newline at end of file
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Modules import each other as top level packages from src, as when the entry scripts run
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
\ No newline at end of file
@@ -0,0 +1,80 @@
+import pytest
+
+from utils.config import Config, SETTINGS
+
+ENV = """# Ids of both cameras
+CAMERA_0_ID='0'
+CAMERA_1_ID='1'
+# CAMERA_IDS='0,1,2'
+
+FRAME_WIDTH='640'
+FRAME_HEIGHT='480'
+CHESSBOARD_ROWS='4'
+CHESSBOARD_COLUMNS='7'
+CHESSBOARD_SQUARE_SIZE='3'
+MIN_HAND_DETECTION_CONFIDENCE='0.35'
+MIN_HAND_PRESENCE_CONFIDENCE='0.35'
+MIN_TRACKING_CONFIDENCE='0.35'"""
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+  # Settings of the environment would fill in keys missing from the file
+  for key in SETTINGS:
+    monkeypatch.delenv(key, raising=False)
+
+  path = tmp_path / ".env"
+  path.write_text(ENV)
+
+  return Config(str(path))
+
+def test_update_writes_valid_settings(config):
+  changes = []
+  config.subscribe(changes.append)
+
+  errors = config.update({"FRAME_WIDTH": "1280", "FRAME_HEIGHT": "720", "MIN_TRACKING_CONFIDENCE": "0.5"})
+
+  assert errors == []
+  assert config.frame_size() == (1280, 720)
+  assert config["MIN_TRACKING_CONFIDENCE"] == 0.5
+  assert changes == [{"FRAME_WIDTH", "FRAME_HEIGHT", "MIN_TRACKING_CONFIDENCE"}]
+
+  # Values are replaced in place, comments and order are kept
+  lines = open(config.path).read().split("\n")
+  assert lines[0] == "# Ids of both cameras"
+  assert lines[5] == "FRAME_WIDTH='1280'"
+  assert lines[6] == "FRAME_HEIGHT='720'"
+
+  # A new object reads back what was written
+  assert Config(config.path).frame_size() == (1280, 720)
+
+def test_update_reports_invalid_settings(config):
+  errors = config.update({"FRAME_WIDTH": "wide", "MIN_HAND_DETECTION_CONFIDENCE": "1.5", "CHESSBOARD_ROWS": "5"})
+
+  assert sorted(errors) == ["FRAME_WIDTH", "MIN_HAND_DETECTION_CONFIDENCE"]
+  assert config["FRAME_WIDTH"] == 640
+  assert config["MIN_HAND_DETECTION_CONFIDENCE"] == 0.35
+  assert config["CHESSBOARD_ROWS"] == 5
+
+def test_update_without_changes(config):
+  changes = []
+  config.subscribe(changes.append)
+  mtime = config.mtime
+
+  assert config.update({"FRAME_WIDTH": "640"}) == []
+  assert changes == []
+  assert config.mtime == mtime
+
+def test_update_camera_ids(config):
+  assert config.camera_ids() == [0, 1]
+
+  # Setting and removing the list again and again keeps a single line for it
+  for _ in range(3):
+    config.update({"CAMERA_IDS": "0,1,2"})
+    assert config.camera_ids() == [0, 1, 2]
+
+    config.update({"CAMERA_IDS": ""})
+    assert config.camera_ids() == [0, 1]
+
+  text = open(config.path).read()
+  assert text.count("CAMERA_IDS") == 1
+  assert Config(config.path).camera_ids() == [0, 1]
\ No newline at end of file
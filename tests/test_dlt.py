@@ -0,0 +1,79 @@
+import numpy as np
+import cv2 as cv
+
+from utils.dlt import Triangulator
+from utils.calibration import build_calibration, Calibration
+
+K = np.array([[600.0, 0.0, 320.0], [0.0, 600.0, 240.0], [0.0, 0.0, 1.0]])
+
+# Camera 1 beside camera 0, camera 2 above and slightly turned
+ROTATIONS = [np.eye(3), np.eye(3), cv.Rodrigues(np.array([0.1, 0.05, 0.0]))[0]]
+TRANSLATIONS = [np.zeros((3, 1)), np.array([[-60.0], [0.0], [0.0]]), np.array([[10.0], [-50.0], [5.0]])]
+
+def rig(cameras: int = 2) -> Calibration:
+  dist = [np.zeros(5)] * cameras
+  arrays = build_calibration([K] * cameras, dist, ROTATIONS[:cameras], TRANSLATIONS[:cameras], (640, 480))
+
+  return Calibration(arrays)
+
+def project(P, coords):
+  homogeneous = coords @ np.asarray(P)[:, :3].T + np.asarray(P)[:, 3]
+
+  return homogeneous[:, :2] / homogeneous[:, 2, None]
+
+def hand_points(count: int = 21):
+  return np.random.default_rng(0).uniform([-40, -40, 450], [40, 40, 550], (count, 3))
+
+def test_triangulate_keeps_leading_shape():
+  calibration = rig()
+  triangulator = Triangulator(calibration.P)
+  coords = hand_points()
+  points_0, points_1 = (project(P, coords) for P in calibration.P)
+
+  np.testing.assert_allclose(triangulator.triangulate(points_0, points_1), coords, atol=1e-6)
+  np.testing.assert_allclose(triangulator.triangulate(points_0[0], points_1[0]), coords[0], atol=1e-6)
+
+  batch = triangulator.triangulate(np.stack([points_0, points_0]), np.stack([points_1, points_1]))
+  assert batch.shape == (2, 21, 3)
+
+def test_triangulate_rectified():
+  calibration = rig()
+  triangulator = Triangulator(calibration.P, calibration, rectified=True)
+  coords = hand_points()
+  points_0, points_1 = (project(P, coords) for P in calibration.P)
+
+  assert triangulator.rectified
+  np.testing.assert_allclose(triangulator.triangulate(points_0, points_1), coords, atol=1e-3)
+  assert triangulator.fallback_points == 0
+
+def test_triangulate_rectified_falls_back_off_epipolar_lines():
+  calibration = rig()
+  triangulator = Triangulator(calibration.P, calibration, rectified=True)
+  coords = hand_points()
+  points_0, points_1 = (project(P, coords) for P in calibration.P)
+
+  # Points a few rows apart do not agree with the rig, they go through the DLT
+  points_1[:3, 1] += 10
+  result = triangulator.triangulate(points_0, points_1)
+
+  assert triangulator.fallback_points == 3
+  assert np.isfinite(result).all()
+  np.testing.assert_allclose(result[3:], coords[3:], atol=1e-3)
+
+def test_triangulate_views():
+  calibration = rig(3)
+  triangulator = Triangulator(calibration.P, calibration)
+  coords = hand_points()
+  points = np.stack([project(P, coords) for P in calibration.P])
+
+  np.testing.assert_allclose(triangulator.triangulate_views(points), coords, atol=1e-6)
+
+  # Points missed by a camera use the others, points seen by less than two cameras have no depth
+  mask = np.ones((3, 21), dtype=bool)
+  mask[2, :5] = False
+  mask[1:, 5] = False
+  points[0, 6] = np.nan
+  result = triangulator.triangulate_views(points, mask)
+
+  np.testing.assert_allclose(np.delete(result, 5, axis=0), np.delete(coords, 5, axis=0), atol=1e-6)
+  assert np.isnan(result[5]).all()
\ No newline at end of file
@@ -0,0 +1,52 @@
+import numpy as np
+
+from utils.inverse_kinematics import solve_inverse_kinematics
+
+def poses(count: int = 16):
+  rng = np.random.default_rng(0)
+  positions = rng.uniform([-10, 0, 55], [10, 15, 70], (count, 3))
+  orientations = rng.uniform(-np.pi * 0.5, np.pi * 0.5, (count, 3))
+
+  return positions, orientations
+
+def test_batch_matches_single_poses():
+  positions, orientations = poses()
+  angles, reachable = solve_inverse_kinematics(positions, orientations, 0.3)
+
+  assert angles.shape == (16, 6)
+  assert reachable.shape == (16,)
+
+  for i in range(16):
+    single, single_reachable = solve_inverse_kinematics(positions[i], orientations[i], 0.3)
+
+    np.testing.assert_allclose(single[0], angles[i])
+    assert single_reachable[0] == reachable[i]
+
+def test_trajectory_chains_joint_3():
+  positions, orientations = poses()
+  angles, _ = solve_inverse_kinematics(positions, orientations, 0.3, trajectory=True)
+
+  # Each pose is solved relative to joint 3 of the pose before
+  previous = 0.3
+  for i in range(16):
+    single, _ = solve_inverse_kinematics(positions[i], orientations[i], previous)
+
+    np.testing.assert_allclose(single[0], angles[i])
+    previous = single[0, 3]
+
+def test_reachability():
+  # Far corner of the workspace, a reachable pose, and the same position with a wrist orientation out of reach
+  positions = [[25, 0, 50], [0, 5, 60], [0, 5, 60]]
+  orientations = [[1.5, 0, 0.5], [1.5, 0, 0.5], [0, 0, 0.5]]
+  angles, reachable = solve_inverse_kinematics(positions, orientations)
+
+  # Poses out of reach still get the closest angles
+  assert np.isfinite(angles).all()
+  assert reachable.tolist() == [False, True, False]
+
+def test_joint_limits():
+  positions, orientations = poses(256)
+  angles, _ = solve_inverse_kinematics(positions * 3 - 50, orientations)
+
+  assert np.isfinite(angles).all()
+  assert (np.abs(angles[:, 1:3]) <= 3 * (np.pi * 0.25) + 1e-12).all()
\ No newline at end of file
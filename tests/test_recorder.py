@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from utils.metrics import Metrics
+from utils.result_store import RecognitionResult, Category
+from utils.recorder import SessionRecorder, open_session, session_field
+
+def result(capture_time: float, hands: int = 1):
+  landmarks = np.full((hands, 21, 3), capture_time, dtype=np.float32)
+  gestures = [[Category("Open_Palm", 0.75)] for _ in range(hands)]
+
+  return RecognitionResult(0, capture_time, capture_time, landmarks, gestures)
+
+def test_record_and_open_session(tmp_path):
+  directory = str(tmp_path / "session")
+  recorder = SessionRecorder(directory, segment_records=2)
+  recorder.start()
+
+  poses = (np.ones((1, 3)), np.zeros((1, 3)), np.ones((1, 21, 3)))
+  recorder.append(1.0, [result(0.9), result(0.95)], poses, [7], np.arange(6.0))
+  recorder.append(2.0)
+  # A set where no camera saw a hand is still a new set
+  recorder.append(3.0, [result(2.9, 0), result(2.95, 0)])
+  recorder.append(4.0)
+  recorder.append(5.0, [result(4.9), result(4.95)])
+  recorder.stop()
+
+  # Five records in segments of two
+  segments = open_session(directory)
+  assert [len(segment) for segment in segments] == [2, 2, 1]
+
+  assert session_field(segments, "timestamp").tolist() == [1.0, 2.0, 3.0, 4.0, 5.0]
+  assert session_field(segments, "new_set").tolist() == [True, False, True, False, True]
+  np.testing.assert_allclose(session_field(segments, "capture_times")[0], [0.9, 0.95])
+
+  first = segments[0][0]
+  assert first["gestures"][0, 0] == b"Open_Palm"
+  assert first["confidences"][1, 0] == pytest.approx(0.75)
+  np.testing.assert_allclose(first["landmarks"][0, 0], np.full((21, 3), 0.9), rtol=1e-6)
+  np.testing.assert_allclose(first["positions"][0], [1, 1, 1])
+  assert first["hand_ids"][0] == 7
+  np.testing.assert_allclose(first["joints"], np.arange(6.0))
+
+  # Values a frame did not have read as missing
+  second = segments[0][1]
+  assert np.isnan(second["capture_times"]).all()
+  assert np.isnan(second["positions"]).all()
+  assert second["hand_ids"][0] == -1
+  assert np.isnan(segments[1][0]["landmarks"]).all()
+
+def test_existing_session_is_kept(tmp_path):
+  directory = str(tmp_path / "session")
+  recorder = SessionRecorder(directory)
+  recorder.start()
+  recorder.append(1.0)
+  recorder.stop()
+
+  with pytest.raises(FileExistsError):
+    SessionRecorder(directory)
+
+  assert len(open_session(directory)[0]) == 1
+
+def test_full_queue_drops_frames(tmp_path):
+  metrics = Metrics()
+  recorder = SessionRecorder(str(tmp_path / "session"), queue_size=1, metrics=metrics)
+
+  # The writer is not running, the second frame finds the queue full
+  recorder.append(1.0)
+  recorder.append(2.0)
+
+  assert metrics.counters["recorder_dropped"] == 1
\ No newline at end of file
@@ -0,0 +1,39 @@
+from utils.result_store import ResultStore, match_results
+
+def store(*capture_times):
+  # Results put in order, the store keeps the last two
+  result_store = ResultStore()
+
+  for timestamp_ms, capture_time in enumerate(capture_times):
+    result_store.put(timestamp_ms, capture_time, [], [])
+
+  return result_store
+
+def capture_times(results):
+  return None if results is None else [result.capture_time for result in results]
+
+def test_newest_results_match():
+  stores = [store(1.0, 2.0), store(1.01, 2.01)]
+
+  assert capture_times(match_results(stores, 0.02)) == [2.0, 2.01]
+
+def test_older_results_match_when_the_newest_do_not():
+  # Camera 1 already has a result for a newer frame than camera 0
+  stores = [store(1.0, 2.0), store(2.01, 3.0)]
+
+  assert capture_times(match_results(stores, 0.02)) == [2.0, 2.01]
+
+def test_no_match_within_tolerance():
+  stores = [store(1.0, 2.0), store(1.5, 2.5)]
+
+  assert match_results(stores, 0.02) is None
+  assert capture_times(match_results(stores, 0.5)) == [2.0, 2.5]
+
+def test_every_camera_must_match():
+  stores = [store(1.0, 2.0), store(2.0), store(1.0)]
+
+  assert match_results(stores, 0.02) is None
+  assert capture_times(match_results([stores[0], stores[2]], 0.02)) == [1.0, 1.0]
+
+def test_empty_store():
+  assert match_results([store(1.0), ResultStore()], 1.0) is None
\ No newline at end of file